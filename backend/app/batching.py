@@ -0,0 +1,166 @@
+import asyncio
+import queue
+import threading
+import time
+from collections import Counter
+from concurrent.futures import Future
+
+import numpy as np
+import torch
+import torch.nn.functional as F
+
+
+class MicroBatcher:
+    """
+    Gom các request suy luận đồng thời thành 1 batch cho LSTMClassifier.
+
+    Một thread nền lấy request đầu tiên trong hàng đợi, chờ thêm tối đa
+    `max_wait_ms` hoặc tới khi đủ `max_batch_size`, rồi pad các chuỗi (T khác
+    nhau) và chạy 1 lần forward với `lengths` (pack_padded_sequence + mask
+    attention) nên kết quả mỗi chuỗi giống như chạy riêng lẻ.
+
+    Backend không nhận `lengths` (supports_lengths=False, vd. TorchScript/ONNX)
+    thì batch được chia theo độ dài, mỗi nhóm cùng T chạy 1 lần forward.
+    """
+
+    def __init__(self, model, device="cpu", max_batch_size=8, max_wait_ms=5.0):
+        if max_batch_size < 1:
+            raise ValueError("max_batch_size must be >= 1")
+        self.model = model
+        self.device = device
+        self._supports_lengths = getattr(model, "supports_lengths", True)
+        self.max_batch_size = max_batch_size
+        self.max_wait_ms = max_wait_ms
+
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._closed = False
+        self._histogram = Counter()  # batch size -> số batch
+        self._requests = 0
+        self._forward_seconds = 0.0
+
+        self._thread = threading.Thread(target=self._loop, name="micro-batcher", daemon=True)
+        self._thread.start()
+
+    def submit(self, seq_np):
+        """Đưa (T, F) float32 vào hàng đợi, trả về Future với xác suất softmax (num_classes,)"""
+        future = Future()
+        with self._lock:
+            if self._closed:
+                future.set_exception(RuntimeError("MicroBatcher is closed"))
+                return future
+            self._queue.put((seq_np, future))
+        return future
+
+    def predict(self, seq_np):
+        return self.submit(seq_np).result()
+
+    async def apredict(self, seq_np):
+        return await asyncio.wrap_future(self.submit(seq_np))
+
+    def _collect(self):
+        batch = [self._queue.get()]
+        if batch[0] is None:
+            return None
+        deadline = time.perf_counter() + self.max_wait_ms / 1000.0
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            try:
+                item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is None:
+                # Cho vòng lặp ngoài thấy tín hiệu dừng sau batch này
+                self._queue.put(None)
+                break
+            batch.append(item)
+        return batch
+
+    def _loop(self):
+        while True:
+            batch = self._collect()
+            if batch is None:
+                return
+            batch = [(s, f) for s, f in batch if f.set_running_or_notify_cancel()]
+            if not batch:
+                continue
+            try:
+                probs = self._run_batch([s for s, _ in batch])
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            for row, (_, future) in zip(probs, batch):
+                future.set_result(row)
+
+    def _forward(self, sequences):
+        lengths = [len(s) for s in sequences]
+        x = np.zeros((len(sequences), max(lengths), sequences[0].shape[1]), dtype=np.float32)
+        for i, s in enumerate(sequences):
+            x[i, : len(s)] = s
+        x = torch.from_numpy(x).to(self.device)
+
+        with torch.no_grad():
+            if len(set(lengths)) == 1:
+                # Không có padding: khỏi pack
+                logits = self.model(x)
+            else:
+                logits = self.model(x, lengths=torch.tensor(lengths))
+            return F.softmax(logits, dim=1).cpu().numpy()
+
+    def _run_batch(self, sequences):
+        start = time.perf_counter()
+        if self._supports_lengths:
+            probs = self._forward(sequences)
+        else:
+            groups = {}
+            for i, s in enumerate(sequences):
+                groups.setdefault(len(s), []).append(i)
+            probs = [None] * len(sequences)
+            for idxs in groups.values():
+                for i, row in zip(idxs, self._forward([sequences[i] for i in idxs])):
+                    probs[i] = row
+
+        with self._lock:
+            self._histogram[len(sequences)] += 1
+            self._requests += len(sequences)
+            self._forward_seconds += time.perf_counter() - start
+        return probs
+
+    def stats(self):
+        with self._lock:
+            batches = sum(self._histogram.values())
+            return {
+                "max_batch_size": self.max_batch_size,
+                "max_wait_ms": self.max_wait_ms,
+                "queued": self._queue.qsize(),
+                "requests": self._requests,
+                "batches": batches,
+                "mean_batch_size": self._requests / batches if batches else 0.0,
+                "batch_size_histogram": dict(sorted(self._histogram.items())),
+                "forward_seconds_total": self._forward_seconds,
+            }
+
+    def close(self):
+        """
+        Dừng nhận request mới; request đã vào hàng đợi trước đó vẫn được chạy nốt.
+        Request còn kẹt lại sau khi thread dừng (hoặc quá hạn join) bị báo lỗi
+        thay vì để Future treo mãi.
+        """
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._queue.put(None)
+        self._thread.join(timeout=5)
+
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is not None and item[1].set_running_or_notify_cancel():
+                item[1].set_exception(RuntimeError("MicroBatcher closed before the request ran"))
+        if self._thread.is_alive():
+            # Thread còn đang chạy batch cuối: vẫn cần tín hiệu dừng sau khi xong
+            self._queue.put(None)
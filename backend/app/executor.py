@@ -0,0 +1,122 @@
+import asyncio
+import math
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+
+class ExecutorBusy(Exception):
+    """Hàng đợi nhận diện đã đầy, client nên thử lại sau `retry_after` giây"""
+
+    def __init__(self, message, retry_after=1):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class RecognitionExecutor:
+    """
+    Executor riêng cho việc nhận diện nặng CPU (decode, Holistic, smoothing),
+    để event loop của uvicorn (và health check `/`) không bị chặn.
+
+    - Tối đa `max_workers` job chạy đồng thời.
+    - Tối đa `max_queue` job chờ; vượt quá thì submit ném ExecutorBusy ngay
+      (load shedding) thay vì để latency dồn lên.
+    """
+
+    def __init__(self, max_workers=2, max_queue=16):
+        if max_workers < 1:
+            raise ValueError("max_workers must be >= 1")
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="recognition")
+
+        self._lock = threading.Lock()
+        self._queued = 0
+        self._running = 0
+        self._stats = {
+            "submitted": 0,
+            "completed": 0,
+            "rejected": 0,
+            "cancelled": 0,
+            "wait_time_total": 0.0,
+            "wait_time_max": 0.0,
+            "run_time_total": 0.0,
+        }
+
+    def _retry_after(self):
+        """Ước lượng số giây tới khi hàng đợi hiện tại chạy xong (đang giữ lock)"""
+        completed = self._stats["completed"]
+        mean_run = self._stats["run_time_total"] / completed if completed else 1.0
+        return max(1, math.ceil(mean_run * (self._queued + self._running) / self.max_workers))
+
+    def retry_after(self):
+        """Retry-After (giây) cho các 503 do quá tải khác, vd. hết graph Holistic"""
+        with self._lock:
+            return self._retry_after()
+
+    def submit(self, fn, *args):
+        """Đưa job vào hàng đợi, trả về concurrent.futures.Future"""
+        with self._lock:
+            if self._queued + self._running >= self.max_workers + self.max_queue:
+                self._stats["rejected"] += 1
+                raise ExecutorBusy(
+                    f"Recognition queue is full ({self.max_queue} waiting)",
+                    retry_after=self._retry_after(),
+                )
+            self._queued += 1
+            self._stats["submitted"] += 1
+        enqueued = time.perf_counter()
+
+        def run():
+            started = time.perf_counter()
+            with self._lock:
+                self._queued -= 1
+                self._running += 1
+                wait_time = started - enqueued
+                self._stats["wait_time_total"] += wait_time
+                self._stats["wait_time_max"] = max(self._stats["wait_time_max"], wait_time)
+            try:
+                return fn(*args)
+            finally:
+                with self._lock:
+                    self._running -= 1
+                    self._stats["completed"] += 1
+                    self._stats["run_time_total"] += time.perf_counter() - started
+
+        def on_done(future):
+            # Huỷ khi còn trong hàng đợi (client ngắt, timeout) thì run() không
+            # bao giờ chạy → trả lại chỗ trong hàng đợi ở đây
+            if future.cancelled():
+                with self._lock:
+                    self._queued -= 1
+                    self._stats["cancelled"] += 1
+
+        try:
+            future = self._executor.submit(run)
+        except RuntimeError:
+            # Executor đã shutdown
+            with self._lock:
+                self._queued -= 1
+            raise
+        future.add_done_callback(on_done)
+        return future
+
+    async def run(self, fn, *args):
+        return await asyncio.wrap_future(self.submit(fn, *args))
+
+    def stats(self):
+        with self._lock:
+            completed = self._stats["completed"]
+            started = self._stats["submitted"] - self._queued - self._stats["cancelled"]
+            return {
+                "max_workers": self.max_workers,
+                "max_queue": self.max_queue,
+                "queued": self._queued,
+                "running": self._running,
+                **self._stats,
+                "wait_time_mean": self._stats["wait_time_total"] / started if started else 0.0,
+                "run_time_mean": self._stats["run_time_total"] / completed if completed else 0.0,
+            }
+
+    def close(self):
+        self._executor.shutdown(wait=True, cancel_futures=True)
@@ -0,0 +1,116 @@
+import threading
+
+import cv2
+import numpy as np
+
+# Kích thước ảnh xám thu nhỏ dùng để so sánh frame
+SIGNATURE_SIZE = (64, 48)
+# Lưới vùng khi so sánh: chuyển động nhỏ (bàn tay) vẫn làm 1 vùng thay đổi rõ
+DIFF_GRID = (8, 6)
+
+
+def frame_signature(img_bytes):
+    """
+    Ảnh xám 64x48 uint8 của 1 frame JPEG. IMREAD_REDUCED_GRAYSCALE_8 để libjpeg
+    giải mã thẳng ở 1/8 độ phân giải, rẻ hơn nhiều so với decode đầy đủ.
+    """
+    buf = np.frombuffer(img_bytes, np.uint8)
+    if not len(buf):
+        raise ValueError("Empty frame")
+    gray = cv2.imdecode(buf, cv2.IMREAD_REDUCED_GRAYSCALE_8)
+    if gray is None:
+        raise ValueError("Cannot decode frame")
+    return cv2.resize(gray, SIGNATURE_SIZE, interpolation=cv2.INTER_AREA)
+
+
+def frame_difference(a, b):
+    """Max theo vùng (lưới 8x6) của trung bình |a - b| (thang 0–255) giữa 2 signature"""
+    diff = cv2.absdiff(a, b).astype(np.float32)
+    return float(cv2.resize(diff, DIFF_GRID, interpolation=cv2.INTER_AREA).max())
+
+
+class FrameSampler:
+    """
+    Lọc frame theo thứ tự cho 1 clip (dùng cho stream): frame gần giống frame
+    được landmark gần nhất (diff < diff_threshold) thì bỏ qua; đã landmark đủ
+    max_frames (0 = không giới hạn) thì bỏ qua phần còn lại.
+    """
+
+    def __init__(self, diff_threshold=3.0, max_frames=0):
+        self.diff_threshold = diff_threshold
+        self.max_frames = max_frames
+        self.landmarked = 0
+        self._last = None
+
+    def accept(self, signature):
+        if self.max_frames and self.landmarked >= self.max_frames:
+            return False
+        if self._last is not None and frame_difference(signature, self._last) < self.diff_threshold:
+            return False
+        self._last = signature
+        self.landmarked += 1
+        return True
+
+
+def select_frames(signatures, diff_threshold=3.0, max_frames=0):
+    """
+    Chọn frame cần chạy Holistic cho cả clip → list bool (T,).
+    Frame đầu luôn được chọn. Bỏ frame trùng như FrameSampler; nếu còn nhiều hơn
+    max_frames thì lấy đều theo thời gian trong số frame còn lại.
+    """
+    sampler = FrameSampler(diff_threshold=diff_threshold)
+    keep = [sampler.accept(sig) for sig in signatures]
+    if max_frames and sampler.landmarked > max_frames:
+        kept = np.flatnonzero(keep)
+        chosen = set(kept[np.linspace(0, len(kept) - 1, max_frames).round().astype(int)].tolist())
+        keep = [i in chosen for i in range(len(keep))]
+    return keep
+
+
+class FrameSelection:
+    """Cấu hình lọc frame dùng chung cho các endpoint + đếm số frame đã bỏ qua"""
+
+    def __init__(self, diff_threshold=3.0, max_frames=0):
+        self.diff_threshold = diff_threshold
+        self.max_frames = max_frames
+        self.enabled = diff_threshold > 0 or max_frames > 0
+        self._lock = threading.Lock()
+        self._frames = 0
+        self._landmarked = 0
+
+    def select(self, frames_bytes):
+        """list bytes JPEG → list bool, hoặc None nếu tắt lọc (landmark mọi frame)"""
+        if not self.enabled:
+            self.record(len(frames_bytes), len(frames_bytes))
+            return None
+        signatures = []
+        for i, b in enumerate(frames_bytes):
+            try:
+                signatures.append(frame_signature(b))
+            except ValueError as e:
+                raise ValueError(f"Frame {i}: {e}") from e
+        keep = select_frames(
+            signatures,
+            diff_threshold=self.diff_threshold,
+            max_frames=self.max_frames,
+        )
+        self.record(len(keep), sum(keep))
+        return keep
+
+    def sampler(self):
+        return FrameSampler(diff_threshold=self.diff_threshold, max_frames=self.max_frames)
+
+    def record(self, frames, landmarked):
+        with self._lock:
+            self._frames += frames
+            self._landmarked += landmarked
+
+    def stats(self):
+        with self._lock:
+            return {
+                "diff_threshold": self.diff_threshold,
+                "max_frames": self.max_frames,
+                "frames": self._frames,
+                "landmarked": self._landmarked,
+                "skipped_ratio": 1 - self._landmarked / self._frames if self._frames else 0.0,
+            }
@@ -0,0 +1,174 @@
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+import numpy as np
+
+
+class PoolTimeout(Exception):
+    """Không lấy được Holistic nào trong thời gian chờ cho phép"""
+
+
+class LandmarkWorkerUnavailable(RuntimeError):
+    """
+    Process worker landmark chết lúc khởi động hoặc giữa clip; đã được khởi động lại
+    nên request sau có thể thử lại. Khai báo ở đây để main.py bắt được mà không import
+    landmark_workers (kéo theo mediapipe).
+    """
+
+
+class HolisticPool:
+    """
+    Pool giới hạn các graph Holistic dùng lại giữa các request.
+
+    - Tối đa `size` graph, tạo sẵn lúc startup (warm_up) hoặc tạo dần khi cần.
+    - Có session_id: ưu tiên trả lại đúng graph mà session đó dùng lần trước
+      để giữ tracking state (static_image_mode=False) giữa các clip liên tiếp.
+    - Không có session_id hoặc graph đổi chủ: reset() graph, tương đương
+      tạo mới như trước nhưng không phải load lại model.
+    """
+
+    def __init__(self, size=2, checkout_timeout=10.0, factory=None, max_sessions=1024):
+        if size < 1:
+            raise ValueError("Pool size must be >= 1")
+        self.size = size
+        self.checkout_timeout = checkout_timeout
+        if factory is None:
+            # Import muộn: chỉ kéo mediapipe vào khi thật sự tạo pool
+            from app.utils import create_holistic
+            factory = create_holistic
+        self._factory = factory
+        self._max_sessions = max_sessions
+
+        self._cond = threading.Condition()
+        self._graphs = []          # index -> Holistic
+        self._free = []            # index các graph đang rảnh
+        self._owner = {}           # index -> session_id dùng gần nhất
+        self._sessions = OrderedDict()  # session_id -> index (LRU)
+
+        self._stats = {
+            "checkouts": 0,
+            "affinity_hits": 0,
+            "resets": 0,
+            "timeouts": 0,
+            "waits": 0,
+            "wait_time_total": 0.0,
+            "wait_time_max": 0.0,
+            "warmup_seconds": None,
+        }
+
+    def warm_up(self):
+        """Tạo đủ `size` graph và chạy 1 frame đen qua mỗi graph để load model"""
+        start = time.perf_counter()
+        with self._cond:
+            while len(self._graphs) < self.size:
+                self._add_graph()
+            graphs = list(self._graphs)
+        for graph in graphs:
+            self._warm_graph(graph)
+        self._stats["warmup_seconds"] = time.perf_counter() - start
+
+    def _warm_graph(self, graph):
+        graph.process(np.zeros((256, 256, 3), dtype=np.uint8))
+        graph.reset()
+
+    def _add_graph(self):
+        idx = len(self._graphs)
+        self._graphs.append(self._factory())
+        self._free.append(idx)
+        return idx
+
+    def _take(self, session_id):
+        """Chọn 1 graph rảnh (đang giữ lock). Trả về (index, affinity_hit) hoặc None"""
+        if session_id is not None:
+            idx = self._sessions.get(session_id)
+            if idx is not None and idx in self._free and self._owner.get(idx) == session_id:
+                self._free.remove(idx)
+                self._sessions.move_to_end(session_id)
+                return idx, True
+
+        if not self._free and len(self._graphs) < self.size:
+            self._add_graph()
+        if not self._free:
+            return None
+
+        # Ưu tiên graph chưa thuộc session nào còn "sống" để không cướp affinity của session khác
+        live = {i for sid, i in self._sessions.items() if self._owner.get(i) == sid}
+        idx = next((i for i in self._free if i not in live), self._free[0])
+        self._free.remove(idx)
+        return idx, False
+
+    @contextmanager
+    def checkout(self, session_id=None, timeout=None):
+        """Mượn 1 graph Holistic, tự trả lại khi ra khỏi `with`"""
+        timeout = self.checkout_timeout if timeout is None else timeout
+        start = time.perf_counter()
+        deadline = start + timeout
+        waited = False
+
+        with self._cond:
+            taken = self._take(session_id)
+            while taken is None:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    self._stats["timeouts"] += 1
+                    raise PoolTimeout(f"No Holistic graph available after {timeout:.1f}s")
+                waited = True
+                self._cond.wait(remaining)
+                taken = self._take(session_id)
+
+            idx, affinity_hit = taken
+            wait_time = time.perf_counter() - start
+            self._stats["checkouts"] += 1
+            if waited:
+                self._stats["waits"] += 1
+                self._stats["wait_time_total"] += wait_time
+                self._stats["wait_time_max"] = max(self._stats["wait_time_max"], wait_time)
+
+            need_reset = not affinity_hit and idx in self._owner
+            if affinity_hit:
+                self._stats["affinity_hits"] += 1
+            if need_reset:
+                self._stats["resets"] += 1
+            self._owner[idx] = session_id
+            if session_id is not None:
+                self._sessions[session_id] = idx
+                self._sessions.move_to_end(session_id)
+                while len(self._sessions) > self._max_sessions:
+                    self._sessions.popitem(last=False)
+            graph = self._graphs[idx]
+
+        if need_reset:
+            graph.reset()
+
+        try:
+            yield graph
+        finally:
+            with self._cond:
+                if session_id is None:
+                    # Không có session -> lần sau ai lấy cũng phải reset
+                    self._owner[idx] = None
+                self._free.append(idx)
+                self._cond.notify()
+
+    def stats(self):
+        with self._cond:
+            in_use = len(self._graphs) - len(self._free)
+            return {
+                "size": self.size,
+                "created": len(self._graphs),
+                "in_use": in_use,
+                "sessions": len(self._sessions),
+                "checkout_timeout": self.checkout_timeout,
+                **self._stats,
+            }
+
+    def close(self):
+        with self._cond:
+            for graph in self._graphs:
+                graph.close()
+            self._graphs.clear()
+            self._free.clear()
+            self._owner.clear()
+            self._sessions.clear()
@@ -0,0 +1,194 @@
+"""
+Backend suy luận CPU cho LSTMClassifier: eager | torchscript | onnx | int8.
+
+Export artifact trước khi deploy (chạy trong thư mục backend/):
+
+    python -m app.inference_backends export --backend torchscript
+    python -m app.inference_backends export --backend onnx
+
+Nếu chưa có artifact, backend sẽ tự trace / export trong bộ nhớ lúc startup.
+"""
+
+import argparse
+import copy
+import io
+from abc import ABC, abstractmethod
+from pathlib import Path
+
+import torch
+import torch.nn as nn
+
+BACKENDS = ("eager", "torchscript", "onnx", "int8")
+
+# Sai lệch logits tối đa so với eager chấp nhận được ở parity check lúc startup
+DEFAULT_TOLERANCES = {
+    "eager": 0.0,
+    "torchscript": 1e-4,
+    "onnx": 1e-4,
+    "int8": 5e-2,
+}
+
+
+class InferenceBackend(ABC):
+    """Gọi như model: backend(x (B, T, F), lengths=None) → logits (B, num_classes)"""
+
+    name = "base"
+    # False: không nhận `lengths`, batch chỉ được gồm các chuỗi cùng độ dài
+    supports_lengths = False
+
+    @abstractmethod
+    def __call__(self, x, lengths=None):
+        ...
+
+
+class EagerBackend(InferenceBackend):
+    name = "eager"
+    supports_lengths = True
+
+    def __init__(self, model):
+        self.model = model
+
+    def __call__(self, x, lengths=None):
+        with torch.no_grad():
+            return self.model(x, lengths=lengths)
+
+
+class Int8Backend(EagerBackend):
+    """Dynamic quantization int8 cho nn.LSTM + nn.Linear (vẫn nhận lengths)"""
+
+    name = "int8"
+
+    def __init__(self, model):
+        super().__init__(torch.ao.quantization.quantize_dynamic(
+            model, {nn.LSTM, nn.Linear}, dtype=torch.qint8
+        ))
+
+
+class TorchScriptBackend(InferenceBackend):
+    name = "torchscript"
+
+    def __init__(self, model, artifact_path=None):
+        if artifact_path is not None and Path(artifact_path).exists():
+            self.module = torch.jit.load(str(artifact_path), map_location="cpu")
+        else:
+            self.module = trace_torchscript(model)
+        self.module.eval()
+
+    def __call__(self, x, lengths=None):
+        with torch.no_grad():
+            return self.module(x)
+
+
+class OnnxBackend(InferenceBackend):
+    name = "onnx"
+
+    def __init__(self, model, artifact_path=None):
+        import onnxruntime as ort
+
+        if artifact_path is not None and Path(artifact_path).exists():
+            source = str(artifact_path)
+        else:
+            buf = io.BytesIO()
+            export_onnx(model, buf)
+            source = buf.getvalue()
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = ort.InferenceSession(source, options, providers=["CPUExecutionProvider"])
+
+    def __call__(self, x, lengths=None):
+        logits = self.session.run(["logits"], {"x": x.detach().cpu().numpy()})[0]
+        return torch.from_numpy(logits)
+
+
+def _example_input(model):
+    return torch.zeros(1, 100, model.lstm.input_size)
+
+
+def _cpu_copy(model):
+    """Bản sao CPU ở chế độ eval để export; model của caller giữ nguyên device / train mode"""
+    return copy.deepcopy(model).cpu().eval()
+
+
+def trace_torchscript(model):
+    return torch.jit.trace(_cpu_copy(model), (_example_input(model),))
+
+
+def export_onnx(model, f):
+    torch.onnx.export(
+        _cpu_copy(model),
+        (_example_input(model),),
+        f,
+        input_names=["x"],
+        output_names=["logits"],
+        dynamic_axes={"x": {0: "batch", 1: "time"}, "logits": {0: "batch"}},
+        opset_version=17,
+        dynamo=False,
+    )
+
+
+def artifact_path(model_path, backend):
+    """model/lstm_attn.pth → model/lstm_attn.ts.pt | model/lstm_attn.onnx"""
+    suffix = {"torchscript": ".ts.pt", "onnx": ".onnx"}.get(backend)
+    if suffix is None:
+        return None
+    return Path(model_path).with_suffix(suffix)
+
+
+def create_backend(name, model, model_path=None):
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown inference backend '{name}', expected one of {BACKENDS}")
+    path = artifact_path(model_path, name) if model_path else None
+    if name == "eager":
+        return EagerBackend(model)
+    if name == "int8":
+        return Int8Backend(model)
+    if name == "torchscript":
+        return TorchScriptBackend(model, path)
+    return OnnxBackend(model, path)
+
+
+def parity_check(backend, model, lengths=(100, 37, 5), seed=0):
+    """Max |logits(backend) - logits(eager)| trên vài chuỗi ngẫu nhiên"""
+    gen = torch.Generator().manual_seed(seed)
+    max_diff = 0.0
+    with torch.no_grad():
+        for length in lengths:
+            x = torch.rand(1, length, model.lstm.input_size, generator=gen)
+            expected = model(x)
+            actual = backend(x)
+            max_diff = max(max_diff, (actual - expected).abs().max().item())
+    return max_diff
+
+
+def _load_default_model(model_path):
+    from app.model_handler import load_model
+
+    return load_model(model_path, device="cpu")
+
+
+def _export(args):
+    model = _load_default_model(args.model)
+    path = artifact_path(args.model, args.backend)
+    if args.backend == "torchscript":
+        trace_torchscript(model).save(str(path))
+    else:
+        export_onnx(model, str(path))
+    backend = create_backend(args.backend, model, args.model)
+    diff = parity_check(backend, model)
+    print(f"Exported {args.backend} → {path} (max |Δlogits| vs eager = {diff:.2e})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export LSTMClassifier cho backend suy luận CPU")
+    sub = parser.add_subparsers(dest="command", required=True)
+    export = sub.add_parser("export", help="Ghi artifact TorchScript / ONNX cạnh file .pth")
+    export.add_argument("--backend", choices=("torchscript", "onnx"), required=True)
+    export.add_argument("--model", default="model/lstm_attn.pth")
+    args = parser.parse_args()
+
+    if args.command == "export":
+        _export(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,220 @@
+import multiprocessing
+from multiprocessing import shared_memory
+
+import cv2
+import numpy as np
+
+from app.holistic_pool import HolisticPool, LandmarkWorkerUnavailable
+from app.light_landmarker import create_landmarker
+from app.utils import ClipLandmarker, decode_base64_to_bgr
+
+
+class LandmarkWorkerTimeout(TimeoutError):
+    """Worker không trả kết quả trong thời gian cho phép (đã bị kill + khởi động lại)"""
+
+
+def decode_frames_to_shared_memory(frames, decode_bgr=decode_base64_to_bgr):
+    """
+    Giải mã cả clip (base64 hoặc bytes JPEG tùy decode_bgr) thẳng vào
+    1 block shared memory (T, H, W, 3) RGB uint8.
+    Frame lệch kích thước được resize về kích thước frame đầu.
+    Người gọi chịu trách nhiệm close() + unlink() block trả về.
+    """
+    first = decode_bgr(frames[0])
+    h, w = first.shape[:2]
+    shape = (len(frames), h, w, 3)
+    shm = shared_memory.SharedMemory(create=True, size=int(np.prod(shape)))
+    out = np.ndarray(shape, dtype=np.uint8, buffer=shm.buf)
+    try:
+        for i, frame in enumerate(frames):
+            bgr = first if i == 0 else decode_bgr(frame)
+            if bgr.shape[:2] != (h, w):
+                bgr = cv2.resize(bgr, (w, h))
+            cv2.cvtColor(bgr, cv2.COLOR_BGR2RGB, dst=out[i])
+    except Exception:
+        del out
+        shm.close()
+        shm.unlink()
+        raise
+    del out
+    return shm, shape
+
+
+def _landmark_shared_frames(holistic, shm_name, shape, alpha, keep=None):
+    """
+    Chạy Holistic + trích keypoint lần lượt trên các frame trong shared memory.
+    keep: list bool cả clip; shared memory chỉ chứa các frame keep=True, frame
+    còn lại dùng lại landmark của frame trước.
+    """
+    shm = shared_memory.SharedMemory(name=shm_name)
+    frames = np.ndarray(shape, dtype=np.uint8, buffer=shm.buf)
+    if keep is None:
+        keep = [True] * shape[0]
+    try:
+        clip = ClipLandmarker(holistic, alpha=alpha, capacity=len(keep))
+        i = 0
+        for k in keep:
+            if k:
+                clip.add_frame(frames[i])
+                i += 1
+            else:
+                clip.repeat_frame()
+        return clip.to_array()
+    finally:
+        del frames
+        shm.close()
+
+
+def _worker_main(conn, model_complexity, alpha, landmarker="holistic", light_pose_complexity=0):
+    """Vòng lặp của process worker: mỗi worker giữ riêng 1 graph Holistic (hoặc LightLandmarker)"""
+    holistic = create_landmarker(
+        landmarker,
+        model_complexity=model_complexity,
+        light_pose_complexity=light_pose_complexity,
+    )
+    holistic.process(np.zeros((256, 256, 3), dtype=np.uint8))
+    holistic.reset()
+    conn.send(("ready", None))
+
+    while True:
+        try:
+            msg = conn.recv()
+        except EOFError:
+            break
+        if msg is None:
+            break
+        shm_name, shape, keep, reset = msg
+        try:
+            if reset:
+                holistic.reset()
+            conn.send(("ok", _landmark_shared_frames(holistic, shm_name, shape, alpha, keep)))
+        except Exception as e:
+            conn.send(("error", repr(e)))
+
+    holistic.close()
+
+
+class LandmarkWorker:
+    """
+    Handle phía process API cho 1 process worker (giao tiếp qua Pipe).
+    Mọi lần chờ worker đều có timeout: worker treo / chết mà không đóng pipe
+    sẽ bị kill và khởi động lại thay vì giữ thread của executor mãi mãi.
+    """
+
+    def __init__(self, ctx, model_complexity=2, alpha=0.5, landmarker="holistic", light_pose_complexity=0,
+                 timeout=60.0, start_timeout=120.0):
+        self._ctx = ctx
+        self._args = (model_complexity, alpha, landmarker, light_pose_complexity)
+        self.timeout = timeout
+        self.start_timeout = start_timeout
+        self._start()
+
+    def _start(self):
+        parent_conn, child_conn = self._ctx.Pipe()
+        self._process = self._ctx.Process(
+            target=_worker_main,
+            args=(child_conn, *self._args),
+            daemon=True,
+        )
+        self._process.start()
+        child_conn.close()
+        self._conn = parent_conn
+        self._ready = False
+        self._reset_pending = False
+
+    def _recv(self, timeout):
+        """recv() có timeout; hết giờ → kill + khởi động lại worker rồi raise LandmarkWorkerTimeout"""
+        if not self._conn.poll(timeout):
+            self._kill()
+            self._start()
+            raise LandmarkWorkerTimeout(f"Landmark worker did not respond within {timeout}s (restarted)")
+        return self._conn.recv()
+
+    def wait_ready(self):
+        if not self._ready:
+            try:
+                self._recv(self.start_timeout)
+            except (EOFError, OSError) as e:
+                if isinstance(e, LandmarkWorkerTimeout):
+                    raise
+                # Process chết trước khi báo "ready" -> khởi động lại để slot này không hỏng vĩnh viễn
+                self._kill()
+                self._start()
+                raise LandmarkWorkerUnavailable("Landmark worker failed to start (restarted)")
+            self._ready = True
+
+    def reset(self):
+        # Reset thật sự chạy trong worker, ngay trước clip kế tiếp
+        self._reset_pending = True
+
+    def landmark(self, shm_name, shape, keep=None):
+        """Gửi 1 clip (đã nằm trong shared memory) cho worker, trả về (T, 144) float32"""
+        try:
+            self.wait_ready()
+            self._conn.send((shm_name, shape, keep, self._reset_pending))
+            self._reset_pending = False
+            status, payload = self._recv(self.timeout)
+        except (LandmarkWorkerTimeout, LandmarkWorkerUnavailable):
+            # Worker đã được kill + khởi động lại
+            raise
+        except (EOFError, OSError):
+            # Worker chết giữa chừng -> khởi động lại cho lần sau
+            self._kill()
+            self._start()
+            raise LandmarkWorkerUnavailable("Landmark worker died while processing clip (restarted)")
+        if status != "ok":
+            raise RuntimeError(f"Landmark worker error: {payload}")
+        return payload
+
+    def _kill(self):
+        self._process.kill()
+        self._process.join(timeout=5)
+        self._conn.close()
+
+    def close(self):
+        try:
+            self._conn.send(None)
+        except (BrokenPipeError, OSError):
+            pass
+        self._process.join(timeout=5)
+        if self._process.is_alive():
+            self._process.terminate()
+        self._conn.close()
+
+
+class LandmarkWorkerPool(HolisticPool):
+    """
+    Pool process worker cho landmarking, dùng lại logic checkout/affinity của HolisticPool.
+    Mỗi clip chỉ chạy trên 1 worker, tuần tự từng frame, nên thứ tự frame và EMA
+    smoothing giữ nguyên; nhiều clip đồng thời chạy song song trên nhiều core.
+    """
+
+    def __init__(self, size=2, checkout_timeout=10.0, model_complexity=2, alpha=0.5,
+                 landmarker="holistic", light_pose_complexity=0, timeout=60.0):
+        ctx = multiprocessing.get_context("spawn")
+        super().__init__(
+            size=size,
+            checkout_timeout=checkout_timeout,
+            factory=lambda: LandmarkWorker(
+                ctx,
+                model_complexity=model_complexity,
+                alpha=alpha,
+                landmarker=landmarker,
+                light_pose_complexity=light_pose_complexity,
+                timeout=timeout,
+            ),
+        )
+
+    def _warm_graph(self, worker):
+        worker.wait_ready()
+
+    def landmark_clip(self, frames, session_id=None, decode_bgr=decode_base64_to_bgr, keep=None):
+        """Decode clip (chỉ các frame keep=True nếu có keep) vào shared memory rồi giao cho 1 worker rảnh"""
+        kept = frames if keep is None else [f for f, k in zip(frames, keep) if k]
+        shm, shape = decode_frames_to_shared_memory(kept, decode_bgr=decode_bgr)
+        try:
+            with self.checkout(session_id=session_id) as worker:
+                return worker.landmark(shm.name, shape, keep)
+        finally:
+            shm.close()
+            shm.unlink()
@@ -0,0 +1,121 @@
+from types import SimpleNamespace
+
+import numpy as np
+import mediapipe as mp
+from mediapipe.framework.formats import landmark_pb2
+
+from app.utils import create_holistic
+
+mp_pose = mp.solutions.pose
+mp_hands = mp.solutions.hands
+
+LANDMARKERS = ("holistic", "light")
+
+# Điểm pose dùng để đặt ROI bàn tay: (cổ tay, ngón trỏ, ngón út) mỗi bên
+_HAND_ANCHORS = {
+    "left": (mp_pose.PoseLandmark.LEFT_WRIST, mp_pose.PoseLandmark.LEFT_INDEX, mp_pose.PoseLandmark.LEFT_PINKY),
+    "right": (mp_pose.PoseLandmark.RIGHT_WRIST, mp_pose.PoseLandmark.RIGHT_INDEX, mp_pose.PoseLandmark.RIGHT_PINKY),
+}
+MIN_WRIST_VISIBILITY = 0.5
+MIN_ROI_SIZE = 32       # px, ROI nhỏ hơn thì coi như không thấy tay
+ROI_SCALE = 4.0         # cạnh ROI = ROI_SCALE * |cổ tay → giữa trỏ/út|
+
+
+class LightLandmarker:
+    """
+    Thay cho Holistic khi chỉ cần 144 feature (6 điểm tay/vai + 2 x 21 điểm bàn tay):
+    Pose (complexity thấp) + Hands chạy trên ROI quanh cổ tay, bỏ qua nhánh face.
+
+    process(rgb) trả về object giống kết quả Holistic (pose_landmarks,
+    left_hand_landmarks, right_hand_landmarks), toạ độ chuẩn hoá theo cả frame,
+    nên dùng được trực tiếp với fill_raw_keypoints / ClipLandmarker / HolisticPool.
+    """
+
+    def __init__(self, pose_complexity=0, hands_complexity=0):
+        self.pose = mp_pose.Pose(
+            static_image_mode=False,
+            model_complexity=pose_complexity,
+            smooth_landmarks=True,
+            enable_segmentation=False,
+            min_detection_confidence=0.6,
+            min_tracking_confidence=0.7,
+        )
+        # Mỗi bên 1 graph Hands để tracking không lẫn giữa 2 tay
+        self.hands = {
+            side: mp_hands.Hands(
+                static_image_mode=False,
+                max_num_hands=1,
+                model_complexity=hands_complexity,
+                min_detection_confidence=0.6,
+                min_tracking_confidence=0.7,
+            )
+            for side in _HAND_ANCHORS
+        }
+
+    def _hand_roi(self, pose_lms, side, width, height):
+        """ROI vuông (x0, y0, x1, y1) theo pixel quanh bàn tay, None nếu không thấy cổ tay"""
+        wrist, index, pinky = (pose_lms.landmark[i] for i in _HAND_ANCHORS[side])
+        if wrist.visibility < MIN_WRIST_VISIBILITY:
+            return None
+        wx, wy = wrist.x * width, wrist.y * height
+        mx, my = (index.x + pinky.x) / 2 * width, (index.y + pinky.y) / 2 * height
+        size = ROI_SCALE * max(np.hypot(mx - wx, my - wy), 1.0)
+        cx, cy = mx, my  # tâm bàn tay ~ giữa gốc ngón trỏ / ngón út
+        x0, y0 = max(int(cx - size / 2), 0), max(int(cy - size / 2), 0)
+        x1, y1 = min(int(cx + size / 2), width), min(int(cy + size / 2), height)
+        if x1 - x0 < MIN_ROI_SIZE or y1 - y0 < MIN_ROI_SIZE:
+            return None
+        return x0, y0, x1, y1
+
+    def _process_hand(self, rgb, side, roi):
+        if roi is None:
+            return None
+        x0, y0, x1, y1 = roi
+        result = self.hands[side].process(np.ascontiguousarray(rgb[y0:y1, x0:x1]))
+        if not result.multi_hand_landmarks:
+            return None
+
+        # Toạ độ trong ROI → toạ độ chuẩn hoá theo cả frame (z cùng thang với x)
+        height, width = rgb.shape[:2]
+        xyz = np.array([(lm.x, lm.y, lm.z) for lm in result.multi_hand_landmarks[0].landmark], dtype=np.float32)
+        scale = np.array([(x1 - x0) / width, (y1 - y0) / height, (x1 - x0) / width], dtype=np.float32)
+        offset = np.array([x0 / width, y0 / height, 0.0], dtype=np.float32)
+        mapped = xyz * scale + offset
+
+        out = landmark_pb2.NormalizedLandmarkList()
+        for x, y, z in mapped.tolist():
+            lm = out.landmark.add()
+            lm.x, lm.y, lm.z = x, y, z
+        return out
+
+    def process(self, rgb):
+        pose_lms = self.pose.process(rgb).pose_landmarks
+        hands = {"left": None, "right": None}
+        if pose_lms is not None:
+            height, width = rgb.shape[:2]
+            for side in hands:
+                hands[side] = self._process_hand(rgb, side, self._hand_roi(pose_lms, side, width, height))
+        return SimpleNamespace(
+            pose_landmarks=pose_lms,
+            left_hand_landmarks=hands["left"],
+            right_hand_landmarks=hands["right"],
+        )
+
+    def reset(self):
+        self.pose.reset()
+        for hands in self.hands.values():
+            hands.reset()
+
+    def close(self):
+        self.pose.close()
+        for hands in self.hands.values():
+            hands.close()
+
+
+def create_landmarker(kind="holistic", model_complexity=2, light_pose_complexity=0):
+    """holistic: create_holistic như demo; light: LightLandmarker"""
+    if kind == "holistic":
+        return create_holistic(model_complexity=model_complexity)
+    if kind == "light":
+        return LightLandmarker(pose_complexity=light_pose_complexity)
+    raise ValueError(f"Unknown landmarker '{kind}', expected one of {LANDMARKERS}")
@@ -1,16 +1,29 @@
-from fastapi import FastAPI
+import asyncio
+import base64
+import hmac
+import json
+import os
+import sys
+import time
+from contextlib import ExitStack, asynccontextmanager, contextmanager
+
+from fastapi import Depends, FastAPI, Header, HTTPException, Request, Response, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 from pydantic import BaseModel
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import UploadFile
 import numpy as np
-import torch
-import torch.nn.functional as F
-
-from app.model_handler import load_model
-from app.utils import (
-    mp_holistic,
-    decode_base64_to_rgb,
-    extract_frame_keypoints,
-)
+
+# Chỉ import module nhẹ ở đây: torch / mediapipe / cv2 và weights được load trong
+# lifespan (load_recognizer) để import app.main và GET / không phải chờ
+from app import metrics
+from app.executor import ExecutorBusy, RecognitionExecutor
+from app.holistic_pool import HolisticPool, LandmarkWorkerUnavailable, PoolTimeout
+
+# Middleware đo latency HTTP + render /metrics dùng chung với catalog API (src/shared)
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+from shared.http_metrics import RequestMetricsMiddleware, render as render_metrics  # noqa: E402
 
 # ====== CONFIG KHỚP DEMO ======
 WINDOW_SIZE = 100          # số frame dùng khi train (model chịu được T khác nhau)
@@ -19,6 +32,86 @@ HIDDEN_DIM = 128
 MODEL_PATH = "model/lstm_attn.pth"
 SMOOTHING_ALPHA = 0.5
 
+# Landmarker: holistic (như demo) | light (Pose complexity thấp + Hands trên ROI cổ tay, không face)
+LANDMARKER = os.getenv("LANDMARKER", "holistic")
+LIGHT_POSE_COMPLEXITY = int(os.getenv("LIGHT_POSE_COMPLEXITY", "0"))
+
+# Pool Holistic dùng lại giữa các request
+HOLISTIC_MODEL_COMPLEXITY = int(os.getenv("HOLISTIC_MODEL_COMPLEXITY", "2"))
+HOLISTIC_POOL_SIZE = int(os.getenv("HOLISTIC_POOL_SIZE", "2"))
+HOLISTIC_POOL_WARMUP = os.getenv("HOLISTIC_POOL_WARMUP", "1") == "1"
+HOLISTIC_CHECKOUT_TIMEOUT = float(os.getenv("HOLISTIC_CHECKOUT_TIMEOUT", "10"))
+
+# Số process worker landmarking (0 = chạy Holistic ngay trong process API)
+LANDMARK_WORKERS = int(os.getenv("LANDMARK_WORKERS", "0"))
+# Thời gian tối đa chờ 1 worker landmark xong 1 clip; quá hạn → kill + khởi động lại worker, 504
+LANDMARK_WORKER_TIMEOUT = float(os.getenv("LANDMARK_WORKER_TIMEOUT", "60"))
+
+# Executor riêng cho decode + Holistic: số job chạy đồng thời và số job được chờ
+RECOGNITION_WORKERS = int(os.getenv("RECOGNITION_WORKERS", str(LANDMARK_WORKERS or HOLISTIC_POOL_SIZE)))
+RECOGNITION_QUEUE_SIZE = int(os.getenv("RECOGNITION_QUEUE_SIZE", "16"))
+
+# Decode frame: frame rộng hơn DECODE_TARGET_WIDTH được decode ở độ phân giải giảm
+# (IMREAD_REDUCED_COLOR_*) rồi resize; DECODE_SCALE=2/4/8 ép luôn decode ở 1/scale
+DECODE_TARGET_WIDTH = int(os.getenv("DECODE_TARGET_WIDTH", "640"))
+DECODE_SCALE = int(os.getenv("DECODE_SCALE", "1"))
+
+# Lọc frame trước Holistic: bỏ frame gần trùng frame trước (diff ảnh xám 64x48 theo
+# vùng, thang 0–255; 0 = tắt) và giới hạn số frame chạy Holistic mỗi clip (0 = không giới hạn).
+# Mặc định tắt: chưa đo độ khớp prediction so với landmark đủ mọi frame, bật sau khi đã đo.
+FRAME_DIFF_THRESHOLD = float(os.getenv("FRAME_DIFF_THRESHOLD", "0"))
+MAX_LANDMARKED_FRAMES = int(os.getenv("MAX_LANDMARKED_FRAMES", "0"))
+
+# Early exit cho /predict, /predict_frames: cứ mỗi EARLY_EXIT_CHECKPOINT frame được landmark thì
+# chạy LSTM trên prefix, dừng decode + Holistic khi confidence ≥ EARLY_EXIT_CONFIDENCE.
+# Mặc định tắt; bật bằng EARLY_EXIT=1, từng request bật / tắt bằng ?early_exit=true|false.
+# Chỉ áp dụng khi landmark trong process API (LANDMARK_WORKERS=0).
+EARLY_EXIT = os.getenv("EARLY_EXIT", "0") == "1"
+EARLY_EXIT_CHECKPOINT = int(os.getenv("EARLY_EXIT_CHECKPOINT", "20"))
+EARLY_EXIT_CONFIDENCE = float(os.getenv("EARLY_EXIT_CONFIDENCE", "0.9"))
+
+# Số frame tối đa cho 1 clip stream qua /ws/predict
+WS_MAX_FRAMES = int(os.getenv("WS_MAX_FRAMES", "300"))
+# Socket đang giữ graph Holistic mà im lặng quá số giây này thì bỏ clip, trả graph về pool (0 = không)
+WS_IDLE_RELEASE_SECONDS = float(os.getenv("WS_IDLE_RELEASE_SECONDS", "10"))
+
+# /predict_keypoints: dtype chấp nhận (little-endian) và số frame tối đa
+KEYPOINT_DTYPES = {"float32": np.dtype("<f4"), "float16": np.dtype("<f2")}
+MAX_KEYPOINT_FRAMES = int(os.getenv("MAX_KEYPOINT_FRAMES", "1000"))
+
+# Micro-batching cho LSTMClassifier
+INFER_MAX_BATCH_SIZE = int(os.getenv("INFER_MAX_BATCH_SIZE", "8"))
+INFER_MAX_WAIT_MS = float(os.getenv("INFER_MAX_WAIT_MS", "5"))
+
+# Backend suy luận mặc định: eager | torchscript | onnx | int8 (3 cái sau chỉ chạy CPU);
+# manifest có thể đặt "backend" riêng cho từng version. Không đặt tolerance → theo backend
+INFER_BACKEND = os.getenv("INFER_BACKEND", "eager")
+INFER_PARITY_TOLERANCE = float(os.environ["INFER_PARITY_TOLERANCE"]) if os.getenv("INFER_PARITY_TOLERANCE") else None
+
+# Registry model: manifest các version (weights, nhãn, kiến trúc); header X-Model-Version chọn version.
+# MODEL_MANIFEST_POLL_SECONDS > 0: tự reload khi manifest đổi; version bị gỡ đóng sau grace period
+MODEL_MANIFEST = os.getenv("MODEL_MANIFEST", "model/manifest.json")
+MODEL_MANIFEST_POLL_SECONDS = float(os.getenv("MODEL_MANIFEST_POLL_SECONDS", "0"))
+MODEL_RETIRE_GRACE_SECONDS = float(os.getenv("MODEL_RETIRE_GRACE_SECONDS", "30"))
+# POST /models/reload: cần header X-Reload-Token khớp token này; không đặt → chỉ nhận từ localhost
+MODEL_RELOAD_TOKEN = os.getenv("MODEL_RELOAD_TOKEN", "")
+
+# Kho landmark tham chiếu của video unit (python -m app.reference_store build ...)
+REFERENCE_STORE_DIR = os.getenv("REFERENCE_STORE_DIR", "reference_store")
+
+# Chấm điểm /score: bề rộng dải DTW theo tỉ lệ độ dài chuỗi dài hơn; SCORE_SCALE: sai số
+# (đơn vị bề rộng vai) ứng với điểm 100 / e ≈ 37
+SCORE_DTW_BAND = float(os.getenv("SCORE_DTW_BAND", "0.2"))
+SCORE_SCALE = float(os.getenv("SCORE_SCALE", "0.5"))
+
+# Startup: RECOGNIZER_BACKGROUND_LOAD=1 → server nhận request ngay (/livez), model + landmarker
+# load trong lifespan task, /readyz và endpoint nhận diện trả 503 tới khi load + warm-up xong;
+# =0 → chờ load xong mới nhận request. STARTUP_WARMUP_FRAMES: số frame của clip tổng hợp
+# chạy qua Holistic + LSTM lúc startup (0 = bỏ qua)
+RECOGNIZER_BACKGROUND_LOAD = os.getenv("RECOGNIZER_BACKGROUND_LOAD", "1") == "1"
+STARTUP_WARMUP_FRAMES = int(os.getenv("STARTUP_WARMUP_FRAMES", "8"))
+STARTUP_RETRY_AFTER = 5
+
 # 5 classes giống file demo
 LABELS = [
     "bản_thân",
@@ -36,19 +129,173 @@ LABELS_DISPLAY = [
     "ong",
 ]
 
-# ====== LOAD MODEL ======
-device = "cuda" if torch.cuda.is_available() else "cpu"
-model = load_model(
-    MODEL_PATH,
-    device=device,
-    input_size=INPUT_FEATURES,
-    hidden_size=HIDDEN_DIM,
-    num_layers=2,
-    num_classes=len(LABELS),
+# Manifest dự phòng khi chưa có MODEL_MANIFEST: đúng model demo ở trên
+FALLBACK_MANIFEST = {
+    "default": "lstm_attn",
+    "versions": {
+        "lstm_attn": {
+            "weights": MODEL_PATH,
+            "labels": LABELS,
+            "labels_display": LABELS_DISPLAY,
+            "input_features": INPUT_FEATURES,
+            "architecture": {"type": "lstm_attn", "hidden_size": HIDDEN_DIM, "num_layers": 2},
+        }
+    },
+}
+
+# ====== LOAD MODEL (lifespan) ======
+# Object nặng tạo trong load_recognizer(); None tới khi startup xong
+model_registry = None
+holistic_pool = None
+landmark_workers = None
+frame_decoder = None
+frame_selection = None
+reference_store = None  # memmap, không copy; None nếu chưa build
+
+recognition_executor = RecognitionExecutor(
+    max_workers=RECOGNITION_WORKERS,
+    max_queue=RECOGNITION_QUEUE_SIZE,
 )
 
+early_exit_stats = {"requests": 0, "exits": 0, "checks": 0, "frames": 0, "frames_used": 0}
+
+# starting → ready | failed; phases: thời gian từng bước startup (giây), theo dõi cold start
+startup_state = {"status": "starting", "phases": {}, "error": None}
+
+
+@contextmanager
+def startup_phase(name):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        seconds = time.perf_counter() - start
+        startup_state["phases"][name] = round(seconds, 3)
+        print(f"[startup] {name}: {seconds:.3f}s")
+
+
+def warm_up_pipeline():
+    """1 clip tổng hợp qua đúng đường của request: decode JPEG → Holistic → smoothing → LSTM"""
+    import cv2
+
+    jpeg = cv2.imencode(".jpg", np.full((480, 640, 3), 127, dtype=np.uint8))[1].tobytes()
+    frames = [jpeg] * STARTUP_WARMUP_FRAMES
+    if landmark_workers is not None:
+        seq_np = landmark_workers.landmark_clip(frames, decode_bgr=frame_decoder.decode_bgr)
+    else:
+        seq_np = landmark_clip(frames)
+    model_registry.get().batcher.predict(seq_np)
+
+
+def load_recognizer():
+    """Import module nặng, load model + landmarker rồi warm-up; chạy trong lifespan task"""
+    global model_registry, holistic_pool, landmark_workers, frame_decoder, frame_selection, reference_store
+
+    start = time.perf_counter()
+    try:
+        with startup_phase("import_torch"):
+            import torch
+
+            device = "cuda" if torch.cuda.is_available() else "cpu"
+
+        with startup_phase("import_mediapipe"):
+            from app.frame_sampling import FrameSelection
+            from app.light_landmarker import create_landmarker
+            from app.utils import FrameDecoder
+
+        with startup_phase("load_models"):
+            from app.model_registry import ModelRegistry
+
+            registry = ModelRegistry(
+                MODEL_MANIFEST,
+                fallback_manifest=FALLBACK_MANIFEST,
+                retire_grace=MODEL_RETIRE_GRACE_SECONDS,
+                device=device,
+                backend=INFER_BACKEND,
+                parity_tolerance=INFER_PARITY_TOLERANCE,
+                max_batch_size=INFER_MAX_BATCH_SIZE,
+                max_wait_ms=INFER_MAX_WAIT_MS,
+                warmup_length=WINDOW_SIZE,
+            )
+            registry.reload()
+            model_registry = registry
+            if MODEL_MANIFEST_POLL_SECONDS > 0:
+                model_registry.watch(MODEL_MANIFEST_POLL_SECONDS)
+
+        with startup_phase("landmarker"):
+            holistic_pool = HolisticPool(
+                size=HOLISTIC_POOL_SIZE,
+                checkout_timeout=HOLISTIC_CHECKOUT_TIMEOUT,
+                factory=lambda: create_landmarker(
+                    LANDMARKER,
+                    model_complexity=HOLISTIC_MODEL_COMPLEXITY,
+                    light_pose_complexity=LIGHT_POSE_COMPLEXITY,
+                ),
+            )
+            if LANDMARK_WORKERS > 0:
+                from app.landmark_workers import LandmarkWorkerPool
+
+                landmark_workers = LandmarkWorkerPool(
+                    size=LANDMARK_WORKERS,
+                    checkout_timeout=HOLISTIC_CHECKOUT_TIMEOUT,
+                    model_complexity=HOLISTIC_MODEL_COMPLEXITY,
+                    alpha=SMOOTHING_ALPHA,
+                    landmarker=LANDMARKER,
+                    light_pose_complexity=LIGHT_POSE_COMPLEXITY,
+                    timeout=LANDMARK_WORKER_TIMEOUT,
+                )
+            if HOLISTIC_POOL_WARMUP:
+                if landmark_workers is not None:
+                    landmark_workers.warm_up()
+                else:
+                    holistic_pool.warm_up()
+
+        with startup_phase("frame_pipeline"):
+            from app.reference_store import ReferenceStore
+
+            frame_decoder = FrameDecoder(target_width=DECODE_TARGET_WIDTH, scale=DECODE_SCALE)
+            frame_selection = FrameSelection(
+                diff_threshold=FRAME_DIFF_THRESHOLD,
+                max_frames=MAX_LANDMARKED_FRAMES,
+            )
+            reference_store = ReferenceStore.open_if_exists(REFERENCE_STORE_DIR)
+
+        if STARTUP_WARMUP_FRAMES > 0:
+            with startup_phase("warmup_inference"):
+                warm_up_pipeline()
+    except Exception as e:
+        startup_state["status"], startup_state["error"] = "failed", repr(e)
+        print(f"[startup] failed: {e!r}")
+        raise
+
+    startup_state["phases"]["total"] = round(time.perf_counter() - start, 3)
+    startup_state["status"] = "ready"
+    print(f"[startup] ready in {startup_state['phases']['total']:.3f}s")
+
+
+def close_recognizer():
+    if holistic_pool is not None:
+        holistic_pool.close()
+    if landmark_workers is not None:
+        landmark_workers.close()
+    recognition_executor.close()
+    if model_registry is not None:
+        model_registry.close()
+
+
+@asynccontextmanager
+async def lifespan(app):
+    loader = asyncio.create_task(run_in_threadpool(load_recognizer))
+    if not RECOGNIZER_BACKGROUND_LOAD:
+        await loader
+    yield
+    # Thread load không huỷ được: chờ nó xong (hoặc lỗi) rồi mới đóng
+    await asyncio.gather(loader, return_exceptions=True)
+    close_recognizer()
+
+
 # ====== FASTAPI + CORS ======
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -57,61 +304,623 @@ app.add_middleware(
     allow_headers=["*"],
     allow_credentials=True,
 )
+app.add_middleware(RequestMetricsMiddleware, histogram=metrics.REQUEST_LATENCY)
 
 
 class FramesPayload(BaseModel):
     data: list[str]  # list base64 (đã strip "data:image/..,")
 
 
+def require_ready():
+    """Dependency cho endpoint cần model / landmarker: 503 + Retry-After tới khi startup xong"""
+    if startup_state["status"] != "ready":
+        raise HTTPException(
+            status_code=503,
+            detail=f"Recognizer is {startup_state['status']}",
+            headers={"Retry-After": str(STARTUP_RETRY_AFTER)},
+        )
+
+
+def require_reload_auth(request: Request, x_reload_token: str | None = Header(default=None)):
+    """Dependency cho /models/reload: đúng MODEL_RELOAD_TOKEN, hoặc gọi từ localhost khi chưa đặt token"""
+    if MODEL_RELOAD_TOKEN:
+        if not x_reload_token or not hmac.compare_digest(x_reload_token, MODEL_RELOAD_TOKEN):
+            raise HTTPException(status_code=401, detail="Invalid or missing X-Reload-Token")
+    elif request.client is None or request.client.host not in ("127.0.0.1", "::1", "localhost"):
+        raise HTTPException(status_code=403, detail="Model reload is only allowed from localhost")
+
+
 @app.get("/")
 def health_check():
     return {"message": "Backend is running!"}
 
 
-@app.post("/predict")
-async def predict(payload: FramesPayload):
-    frames_b64 = payload.data
-    if not frames_b64:
-        return {"prediction": "No frames", "confidence": 0.0}
+@app.get("/livez")
+def livez():
+    """Liveness: không chờ model; load lỗi → 503 để orchestrator restart replica"""
+    if startup_state["status"] == "failed":
+        return JSONResponse(status_code=503, content={"status": "failed", "error": startup_state["error"]})
+    return {"status": "alive"}
 
-    sequence = []
-    prev_arm = prev_left = prev_right = None
-
-    # Dùng Holistic giống demo
-    with mp_holistic.Holistic(
-        static_image_mode=False,
-        model_complexity=2,
-        min_detection_confidence=0.6,
-        min_tracking_confidence=0.7,
-        enable_segmentation=False,
-        refine_face_landmarks=False,
-    ) as holistic:
-        for b64 in frames_b64:
-            rgb = decode_base64_to_rgb(b64)
-            results = holistic.process(rgb)
-            frame_kp, prev_arm, prev_left, prev_right = extract_frame_keypoints(
-                results, prev_arm, prev_left, prev_right, alpha=SMOOTHING_ALPHA
-            )
-            sequence.append(frame_kp)
 
-    if len(sequence) == 0:
+@app.get("/readyz")
+def readyz():
+    """Readiness: 200 khi model + landmarker đã load và warm-up xong, kèm thời gian từng phase"""
+    if startup_state["status"] != "ready":
+        return JSONResponse(status_code=503, content=startup_state)
+    return startup_state
+
+
+@app.get("/models", dependencies=[Depends(require_ready)])
+def models():
+    return model_registry.stats()
+
+
+@app.post("/models/reload", dependencies=[Depends(require_reload_auth), Depends(require_ready)])
+async def reload_models():
+    """Đọc lại manifest, load + warm version mới ngoài event loop rồi swap; lỗi thì giữ version cũ"""
+    try:
+        return await run_in_threadpool(model_registry.reload)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Model reload failed: {e}")
+
+
+@app.get("/stats")
+def stats():
+    result = {
+        "startup": startup_state,
+        "recognition_executor": recognition_executor.stats(),
+        "early_exit": early_exit_stats,
+    }
+    if startup_state["status"] != "ready":
+        return result
+    result.update(
+        holistic_pool=holistic_pool.stats(),
+        frame_selection=frame_selection.stats(),
+        frame_decoder=frame_decoder.stats(),
+        models=model_registry.stats(),
+    )
+    if landmark_workers is not None:
+        result["landmark_workers"] = landmark_workers.stats()
+    if reference_store is not None:
+        result["reference_store"] = reference_store.stats()
+    return result
+
+
+def read_metric_stats():
+    """Số liệu đọc lúc scrape /metrics: hàng đợi, graph đang dùng, tỉ lệ cache / bỏ frame"""
+    yield "gauge", "recognizer_ready", "1 khi model + landmarker đã load và warm-up xong", {}, startup_state["status"] == "ready"
+    executor = recognition_executor.stats()
+    yield "gauge", "recognizer_executor_queued", "Job nhận diện đang chờ", {}, executor["queued"]
+    yield "gauge", "recognizer_executor_running", "Job nhận diện đang chạy", {}, executor["running"]
+    yield "counter", "recognizer_executor_rejected", "Job bị từ chối vì hàng đợi đầy (503)", {}, executor["rejected"]
+    yield "counter", "recognizer_executor_cancelled", "Job bị huỷ khi còn trong hàng đợi (client ngắt / timeout)", {}, executor["cancelled"]
+    if startup_state["status"] != "ready":
+        return
+
+    for name, pool in (("holistic", holistic_pool), ("workers", landmark_workers)):
+        if pool is None:
+            continue
+        pool_stats = pool.stats()
+        labels = {"pool": name}
+        yield "gauge", "recognizer_landmarker_in_use", "Graph / worker đang được mượn", labels, pool_stats["in_use"]
+        yield "gauge", "recognizer_landmarker_size", "Số graph / worker tối đa", labels, pool_stats["size"]
+        yield "counter", "recognizer_landmarker_timeouts", "Checkout hết thời gian chờ", labels, pool_stats["timeouts"]
+        checkouts = pool_stats["checkouts"]
+        yield ("gauge", "recognizer_session_affinity_hit_ratio",
+               "Tỉ lệ checkout lấy lại đúng graph của session (không phải reset)", labels,
+               pool_stats["affinity_hits"] / checkouts if checkouts else 0.0)
+
+    selection = frame_selection.stats()
+    yield "gauge", "recognizer_frame_skip_ratio", "Tỉ lệ frame bỏ qua Holistic (gần trùng / vượt giới hạn)", {}, selection["skipped_ratio"]
+    yield "counter", "recognizer_frames", "Frame nhận được", {}, selection["frames"]
+    yield "counter", "recognizer_frames_landmarked", "Frame đã chạy Holistic", {}, selection["landmarked"]
+
+    for name, version in model_registry.stats()["versions"].items():
+        batcher = version["batcher"]
+        labels = {"version": name}
+        yield "gauge", "recognizer_batcher_queued", "Chuỗi đang chờ vào batch", labels, batcher["queued"]
+        yield "counter", "recognizer_batcher_requests", "Chuỗi đã chạy qua LSTM", labels, batcher["requests"]
+        yield "counter", "recognizer_batcher_batches", "Số batch đã chạy", labels, batcher["batches"]
+        yield "counter", "recognizer_batcher_forward_seconds", "Tổng thời gian forward LSTM", labels, batcher["forward_seconds_total"]
+
+
+metrics.register_stats(read_metric_stats)
+
+
+@app.get("/metrics")
+def prometheus_metrics():
+    body, content_type = render_metrics()
+    return Response(content=body, media_type=content_type)
+
+
+class EarlyExit:
+    """Gọi ở mỗi checkpoint với prefix (t, 144): chạy LSTM, trả True khi đủ tự tin để dừng"""
+
+    def __init__(self, threshold, version):
+        self.threshold = threshold
+        self.version = version
+        self.checks = 0
+        self.stopped = False
+        self.probs = None
+
+    def __call__(self, seq_np):
+        self.checks += 1
+        start = time.perf_counter()
+        self.probs = self.version.batcher.predict(seq_np)
+        metrics.STAGE_INFERENCE.observe(time.perf_counter() - start)
+        self.stopped = bool(self.probs.max() >= self.threshold)
+        return self.stopped
+
+
+class BadFrame(ValueError):
+    """Frame của clip không decode được (base64 / JPEG hỏng); message nêu index frame → 400"""
+
+
+def landmark_clip(frames, session_id=None, keep=None, counter=None, stop=None):
+    """
+    Decode (base64 hoặc bytes JPEG) + Holistic + extract_frame_keypoints ngay trong process API → (T, 144).
+    stop: EarlyExit gọi sau mỗi EARLY_EXIT_CHECKPOINT frame được landmark; True → bỏ phần còn lại,
+    trả về prefix đã landmark (EMA smoothing chỉ nhìn về trước nên prefix không đổi).
+    """
+    from app.utils import ClipLandmarker
+
+    # Mượn Holistic từ pool; cùng X-Session-Id thì giữ tracking giữa các clip
+    with holistic_pool.checkout(session_id=session_id) as holistic:
+        clip = ClipLandmarker(holistic, alpha=SMOOTHING_ALPHA, capacity=len(frames))
+        landmarked = 0
+        decode_time = landmark_time = 0.0
+        for i, frame in enumerate(frames):
+            if keep is None or keep[i]:
+                start = time.perf_counter()
+                try:
+                    rgb = frame_decoder.decode_rgb(frame, counter)
+                except ValueError as e:
+                    raise BadFrame(f"Frame {i}: {e}") from e
+                decoded = time.perf_counter()
+                clip.add_frame(rgb)
+                decode_time += decoded - start
+                landmark_time += time.perf_counter() - decoded
+                landmarked += 1
+                if (stop is not None and landmarked % EARLY_EXIT_CHECKPOINT == 0 and i + 1 < len(frames)
+                        and stop(clip.to_array())):
+                    break
+            else:
+                # Frame gần trùng: không decode / Holistic, giữ đúng timing của chuỗi
+                clip.repeat_frame()
+    start = time.perf_counter()
+    seq_np = clip.to_array()
+    metrics.STAGE_DECODE.observe(decode_time)
+    metrics.STAGE_LANDMARK.observe(landmark_time + time.perf_counter() - start)
+    return seq_np
+
+
+def landmark_frames_sync(frames, session_id=None, binary=False, stop=None):
+    """Lọc frame trùng rồi landmark cả clip (chạy trên recognition_executor)"""
+    if frame_selection.enabled and not binary:
+        decoded = []
+        for i, f in enumerate(frames):
+            try:
+                decoded.append(base64.b64decode(f))
+            except ValueError as e:  # binascii.Error
+                raise BadFrame(f"Frame {i}: {e}") from e
+        frames, binary = decoded, True
+    start = time.perf_counter()
+    try:
+        keep = frame_selection.select(frames)
+    except ValueError as e:
+        raise BadFrame(str(e)) from e
+    metrics.STAGE_SELECT.observe(time.perf_counter() - start)
+    counter = {}
+    try:
+        if landmark_workers is not None:
+            # Decode vào shared memory + Holistic trong process worker
+            decode_time = 0.0
+            # landmark_clip của pool chỉ đưa frame (đã lọc keep) cho decode: tra index theo object
+            positions = {id(f): i for i, f in enumerate(frames)}
+
+            def decode(frame):
+                nonlocal decode_time
+                decode_start = time.perf_counter()
+                try:
+                    bgr = frame_decoder.decode_bgr(frame, counter)
+                except ValueError as e:
+                    raise BadFrame(f"Frame {positions.get(id(frame), '?')}: {e}") from e
+                decode_time += time.perf_counter() - decode_start
+                return bgr
+
+            start = time.perf_counter()
+            seq_np = landmark_workers.landmark_clip(frames, session_id, decode, keep)
+            metrics.STAGE_DECODE.observe(decode_time)
+            metrics.STAGE_LANDMARK.observe(time.perf_counter() - start - decode_time)
+            return seq_np
+        return landmark_clip(frames, session_id, keep, counter, stop)
+    finally:
+        frame_decoder.record_clip(counter)
+
+
+async def run_recognition(fn, *args):
+    """Chạy job nặng CPU trên recognition_executor; frame hỏng → 400, hàng đợi đầy / hết graph → 503"""
+    try:
+        return await recognition_executor.run(fn, *args)
+    except BadFrame as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except ExecutorBusy as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+    except (PoolTimeout, LandmarkWorkerUnavailable) as e:
+        # Hết graph rảnh / worker vừa chết và đang khởi động lại: client thử lại sau
+        raise HTTPException(
+            status_code=503, detail=str(e), headers={"Retry-After": str(recognition_executor.retry_after())}
+        )
+    except TimeoutError as e:
+        # LandmarkWorkerTimeout: worker treo đã được khởi động lại
+        raise HTTPException(status_code=504, detail=str(e))
+
+
+async def landmark_frames(frames, session_id=None, binary=False, stop=None):
+    """Landmark cả clip (base64 hoặc bytes JPEG), qua process worker nếu có → (T, 144)"""
+    return await run_recognition(landmark_frames_sync, frames, session_id, binary, stop)
+
+
+def get_model_version(name=None):
+    """Version theo header X-Model-Version (None → version mặc định của manifest)"""
+    from app.model_registry import UnknownModelVersion
+
+    try:
+        return model_registry.get(name)
+    except UnknownModelVersion:
+        raise HTTPException(status_code=400, detail=f"Unknown model version: {name}")
+
+
+async def classify_sequence(seq_np, version):
+    """Chạy LSTMClassifier (qua micro-batcher của version) trên (T, 144) → {"prediction", "confidence"}"""
+    if len(seq_np) == 0:
         return {"prediction": "No landmarks", "confidence": 0.0}
 
-    seq_np = np.array(sequence, dtype=np.float32)  # (T, 144)
-    if seq_np.ndim != 2 or seq_np.shape[1] != INPUT_FEATURES:
+    if seq_np.ndim != 2 or seq_np.shape[1] != version.input_features:
         return {"prediction": "Bad feature shape", "confidence": 0.0}
 
-    tensor_inp = torch.from_numpy(seq_np).unsqueeze(0).to(device)  # (1, T, 144)
+    start = time.perf_counter()
+    probs = await version.batcher.apredict(seq_np)  # (num_classes,)
+    metrics.STAGE_INFERENCE.observe(time.perf_counter() - start)
+    return format_prediction(probs, version)
 
-    with torch.no_grad():
-        logits = model(tensor_inp)
-        probs = F.softmax(logits, dim=1)[0]
-        conf, idx = torch.max(probs, dim=0)
 
-    label_idx = idx.item()
-    label_display = LABELS_DISPLAY[label_idx] if 0 <= label_idx < len(LABELS_DISPLAY) else LABELS[label_idx]
+def format_prediction(probs, version):
+    label_idx = int(probs.argmax())
+    conf = probs[label_idx]
+    labels_display = version.labels_display
+    label_display = labels_display[label_idx] if 0 <= label_idx < len(labels_display) else version.labels[label_idx]
 
     return {
         "prediction": label_display,          # React sẽ show string này
-        "confidence": float(conf.item()),     # 0.0–1.0
+        "confidence": float(conf),            # 0.0–1.0
+        "model_version": version.name,
     }
+
+
+async def predict_clip(frames, session_id=None, binary=False, early_exit=None, model_version=None):
+    """
+    Landmark + phân loại 1 clip. Khi có yêu cầu early exit, kết quả thêm "early_exit"
+    (có áp dụng hay không), "frames_used" và "frames"; với LANDMARK_WORKERS > 0 early
+    exit không được hỗ trợ nên luôn là "early_exit": false và dùng đủ mọi frame.
+    """
+    # Chốt version trước khi landmark: reload giữa chừng không đổi model của request này
+    version = get_model_version(model_version)
+    if early_exit is None:
+        early_exit = EARLY_EXIT
+    if not early_exit or landmark_workers is not None:
+        seq_np = await landmark_frames(frames, session_id, binary)
+        result = await classify_sequence(seq_np, version)  # seq_np: (T, 144)
+        if early_exit:
+            return {**result, "early_exit": False, "frames_used": len(seq_np), "frames": len(frames)}
+        return result
+
+    stop = EarlyExit(EARLY_EXIT_CONFIDENCE, version)
+    seq_np = await landmark_frames(frames, session_id, binary, stop)
+    result = format_prediction(stop.probs, version) if stop.stopped else await classify_sequence(seq_np, version)
+
+    early_exit_stats["requests"] += 1
+    early_exit_stats["exits"] += stop.stopped
+    early_exit_stats["checks"] += stop.checks
+    early_exit_stats["frames"] += len(frames)
+    early_exit_stats["frames_used"] += len(seq_np)
+    return {**result, "early_exit": True, "frames_used": len(seq_np), "frames": len(frames)}
+
+
+@app.post("/predict", dependencies=[Depends(require_ready)])
+async def predict(
+    payload: FramesPayload,
+    x_session_id: str | None = Header(default=None),
+    x_model_version: str | None = Header(default=None),
+    early_exit: bool | None = None,
+):
+    frames_b64 = payload.data
+    if not frames_b64:
+        return {"prediction": "No frames", "confidence": 0.0}
+
+    return await predict_clip(frames_b64, x_session_id, early_exit=early_exit, model_version=x_model_version)
+
+
+@app.post("/predict_frames", dependencies=[Depends(require_ready)])
+async def predict_frames(
+    request: Request,
+    x_session_id: str | None = Header(default=None),
+    x_model_version: str | None = Header(default=None),
+    early_exit: bool | None = None,
+):
+    """
+    Giống /predict nhưng nhận frame JPEG dạng binary, không base64:
+    - multipart/form-data: mỗi frame là 1 part tên "frames"
+    - application/octet-stream: [uint32 big-endian độ dài][bytes JPEG] lặp lại
+    """
+    from app.utils import split_frame_stream
+
+    content_type = request.headers.get("content-type", "")
+    if content_type.startswith("multipart/form-data"):
+        # async with: file tạm của các part được đóng ngay khi đọc xong
+        async with request.form() as form:
+            parts = form.getlist("frames")
+            if not all(isinstance(part, UploadFile) for part in parts):
+                raise HTTPException(status_code=400, detail='Every "frames" part must be a file')
+            frames = [np.frombuffer(await part.read(), np.uint8) for part in parts]
+    else:
+        try:
+            frames = split_frame_stream(await request.body())
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+    if not frames:
+        return {"prediction": "No frames", "confidence": 0.0}
+
+    return await predict_clip(frames, x_session_id, binary=True, early_exit=early_exit, model_version=x_model_version)
+
+
+async def read_body_limited(request, max_bytes, detail):
+    """
+    Đọc body nhưng dừng ngay khi vượt max_bytes (413): Content-Length khai báo quá lớn
+    bị từ chối trước khi đọc, body chunked / khai báo sai bị cắt khi stream vượt giới hạn.
+    """
+    declared = request.headers.get("content-length")
+    if declared is not None and declared.isdigit() and int(declared) > max_bytes:
+        raise HTTPException(status_code=413, detail=detail)
+    body = bytearray()
+    async for chunk in request.stream():
+        body += chunk
+        if len(body) > max_bytes:
+            raise HTTPException(status_code=413, detail=detail)
+    return bytes(body)
+
+
+async def read_keypoints(request, dtype="float32", smooth=True):
+    """
+    Body: mảng (T, 144) little-endian `dtype` (float32 | float16), theo đúng layout
+    của extract_frame_keypoints: 6 arm + 21 tay trái + 21 tay phải, mỗi điểm (x, y, z).
+    smooth=true: landmark thô, phần không detect được điền NaN; server áp dụng cùng
+    EMA smoothing với đường ảnh. smooth=false: chuỗi đã smooth sẵn. → (T, 144) float32
+    """
+    np_dtype = KEYPOINT_DTYPES.get(dtype)
+    if np_dtype is None:
+        raise HTTPException(status_code=400, detail=f"dtype must be one of {list(KEYPOINT_DTYPES)}")
+
+    row_bytes = INPUT_FEATURES * np_dtype.itemsize
+    body = await read_body_limited(
+        request, MAX_KEYPOINT_FRAMES * row_bytes, f"At most {MAX_KEYPOINT_FRAMES} frames per clip"
+    )
+    if not body or len(body) % row_bytes:
+        raise HTTPException(status_code=400, detail=f"Body must be a (T, {INPUT_FEATURES}) {dtype} array")
+
+    raw = np.frombuffer(body, dtype=np_dtype).reshape(-1, INPUT_FEATURES)
+    if np.isinf(raw).any():
+        raise HTTPException(status_code=400, detail="Keypoints must not contain inf")
+
+    if smooth:
+        from app.utils import smooth_keypoint_sequence
+
+        return await run_recognition(smooth_keypoint_sequence, raw, SMOOTHING_ALPHA)
+    if np.isnan(raw).any():
+        raise HTTPException(status_code=400, detail="NaN is only allowed with smooth=true")
+    return raw.astype(np.float32)
+
+
+@app.post("/predict_keypoints", dependencies=[Depends(require_ready)])
+async def predict_keypoints(
+    request: Request,
+    dtype: str = "float32",
+    smooth: bool = True,
+    x_model_version: str | None = Header(default=None),
+):
+    """Nhận chuỗi keypoint đã tính sẵn ở client (xem read_keypoints), bỏ qua decode + Holistic"""
+    version = get_model_version(x_model_version)
+    seq_np = await read_keypoints(request, dtype, smooth)
+    return await classify_sequence(seq_np, version)
+
+
+def get_reference(unit_id):
+    """Chuỗi landmark tham chiếu (R, 144) float16 của unit; 503 nếu chưa build kho, 404 nếu thiếu unit"""
+    if reference_store is None:
+        raise HTTPException(status_code=503, detail="Reference store is not built (python -m app.reference_store build)")
+    reference = reference_store.get(unit_id=unit_id)
+    if reference is None or len(reference) == 0:
+        raise HTTPException(status_code=404, detail=f"No reference landmarks for unit {unit_id}")
+    return reference
+
+
+def score_sync(seq_np, reference):
+    from app.scoring import score_sequence
+
+    start = time.perf_counter()
+    result = score_sequence(seq_np, reference, band_ratio=SCORE_DTW_BAND, scale=SCORE_SCALE)
+    metrics.STAGE_SCORING.observe(time.perf_counter() - start)
+    return result
+
+
+async def score_against_reference(seq_np, unit_id, reference):
+    """DTW chuỗi người học với chuỗi tham chiếu → {"unit_id", "score", "distance", "parts", ...}"""
+    if len(seq_np) == 0:
+        raise HTTPException(status_code=400, detail="No landmarks in clip")
+    try:
+        result = await run_recognition(score_sync, seq_np, reference)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"unit_id": unit_id, **result}
+
+
+@app.post("/score/{unit_id}", dependencies=[Depends(require_ready)])
+async def score(unit_id: int, payload: FramesPayload, x_session_id: str | None = Header(default=None)):
+    """
+    Chấm động tác của người học (frame base64 như /predict) so với video mẫu của unit:
+    score 0–100 + sai số / điểm theo arms, left_hand, right_hand.
+    """
+    reference = get_reference(unit_id)
+    if not payload.data:
+        raise HTTPException(status_code=400, detail="No frames")
+    seq_np = await landmark_frames(payload.data, x_session_id)
+    return await score_against_reference(seq_np, unit_id, reference)
+
+
+@app.post("/score_keypoints/{unit_id}", dependencies=[Depends(require_ready)])
+async def score_keypoints(unit_id: int, request: Request, dtype: str = "float32", smooth: bool = True):
+    """Như /score nhưng nhận chuỗi keypoint của client (body giống /predict_keypoints)"""
+    reference = get_reference(unit_id)
+    seq_np = await read_keypoints(request, dtype, smooth)
+    return await score_against_reference(seq_np, unit_id, reference)
+
+
+def add_stream_frame(clip, sampler, frame, counter, timing):
+    """
+    1 frame của /ws/predict (bytes JPEG hoặc base64); frame gần trùng thì không chạy Holistic.
+    Thời gian từng stage cộng dồn vào timing, observe khi hết clip.
+    """
+    from app.frame_sampling import frame_signature
+
+    if isinstance(frame, str):
+        frame = base64.b64decode(frame)
+    if not frame:
+        raise ValueError("Empty frame")
+    start = time.perf_counter()
+    accepted = sampler is None or sampler.accept(frame_signature(frame))
+    decode_start = time.perf_counter()
+    if accepted:
+        rgb = frame_decoder.decode_rgb(frame, counter)
+        decoded = time.perf_counter()
+        clip.add_frame(rgb)
+        timing["landmark"] += time.perf_counter() - decoded
+        timing["decode"] += decoded - decode_start
+    else:
+        clip.repeat_frame()
+    timing["select"] += decode_start - start
+
+
+@app.websocket("/ws/predict")
+async def ws_predict(websocket: WebSocket, session_id: str | None = None, model_version: str | None = None):
+    """
+    Stream frame qua WebSocket, landmark ngay khi frame tới:
+    - message binary: bytes JPEG của 1 frame
+    - message text: {"frame": "<base64>"} | {"type": "end"} | {"type": "reset"}
+    Khi nhận "end" chỉ còn chạy LSTM, trả {"prediction", "confidence", "frames"}.
+    Message hỏng (JSON sai, base64 / JPEG không decode được) nhận {"error"}, socket vẫn mở.
+    Im lặng quá WS_IDLE_RELEASE_SECONDS giữa 1 clip: clip bị bỏ và graph Holistic trả về pool.
+    ?model_version= chọn version model giống header X-Model-Version.
+    """
+    await websocket.accept()
+    if startup_state["status"] != "ready":
+        await websocket.close(code=1013, reason=f"Recognizer is {startup_state['status']}")
+        return
+    from app.model_registry import UnknownModelVersion
+    from app.utils import ClipLandmarker
+
+    if model_version is not None:
+        try:
+            model_registry.get(model_version)
+        except UnknownModelVersion:
+            await websocket.close(code=1008, reason=f"Unknown model version: {model_version}")
+            return
+
+    clip_stack = ExitStack()
+    clip = sampler = None
+    counter = {}
+    timing = dict.fromkeys(("select", "decode", "landmark"), 0.0)
+
+    def release_clip():
+        """Trả Holistic về pool giữa các clip; cùng session_id sẽ lấy lại đúng graph"""
+        nonlocal clip, sampler, counter, timing
+        clip_stack.close()
+        clip = sampler = None
+        counter = {}
+        timing = dict.fromkeys(timing, 0.0)
+
+    try:
+        while True:
+            idle_timeout = WS_IDLE_RELEASE_SECONDS if clip is not None and WS_IDLE_RELEASE_SECONDS > 0 else None
+            try:
+                message = await asyncio.wait_for(websocket.receive(), idle_timeout)
+            except asyncio.TimeoutError:
+                release_clip()
+                await websocket.send_json({"error": f"Clip discarded after {WS_IDLE_RELEASE_SECONDS:g}s idle"})
+                continue
+            if message["type"] == "websocket.disconnect":
+                break
+
+            if message.get("bytes") is not None:
+                frame = message["bytes"]
+            else:
+                try:
+                    data = json.loads(message.get("text") or "{}")
+                except ValueError:
+                    await websocket.send_json({"error": "Invalid JSON message"})
+                    continue
+                if not isinstance(data, dict):
+                    await websocket.send_json({"error": "Message must be a JSON object"})
+                    continue
+                msg_type = data.get("type")
+                if msg_type in ("end", "reset"):
+                    seq_np = None
+                    if clip is not None:
+                        seq_np = clip.to_array()
+                        frame_selection.record(len(clip), sampler.landmarked if sampler else len(clip))
+                        frame_decoder.record_clip(counter)
+                        metrics.STAGE_SELECT.observe(timing["select"])
+                        metrics.STAGE_DECODE.observe(timing["decode"])
+                        metrics.STAGE_LANDMARK.observe(timing["landmark"])
+                    release_clip()
+                    if msg_type == "end":
+                        if seq_np is None:
+                            result = {"prediction": "No frames", "confidence": 0.0}
+                        else:
+                            try:
+                                result = await classify_sequence(seq_np, model_registry.get(model_version))
+                            except UnknownModelVersion:
+                                result = {"error": f"Unknown model version: {model_version}"}
+                        await websocket.send_json({**result, "frames": 0 if seq_np is None else len(seq_np)})
+                    continue
+                if "frame" not in data:
+                    await websocket.send_json({"error": "Unknown message"})
+                    continue
+                frame = data["frame"]
+                if not isinstance(frame, str):
+                    await websocket.send_json({"error": "\"frame\" must be a base64 string"})
+                    continue
+
+            if clip is None:
+                holistic = await run_in_threadpool(
+                    clip_stack.enter_context, holistic_pool.checkout(session_id=session_id)
+                )
+                clip = ClipLandmarker(holistic, alpha=SMOOTHING_ALPHA, capacity=WINDOW_SIZE)
+                sampler = frame_selection.sampler() if frame_selection.enabled else None
+            if len(clip) >= WS_MAX_FRAMES:
+                await websocket.send_json({"error": f"Clip exceeds {WS_MAX_FRAMES} frames"})
+                continue
+
+            # Decode + Holistic cho frame này chạy trên recognition_executor
+            try:
+                await recognition_executor.run(add_stream_frame, clip, sampler, frame, counter, timing)
+            except ValueError as e:
+                # base64 sai (binascii.Error) hoặc JPEG không decode được: bỏ frame, giữ clip
+                await websocket.send_json({"error": f"Invalid frame: {e}"})
+    except WebSocketDisconnect:
+        pass
+    except (PoolTimeout, ExecutorBusy) as e:
+        await websocket.close(code=1013, reason=str(e))  # 1013: Try Again Later
+    finally:
+        clip_stack.close()
@@ -0,0 +1,60 @@
+"""
+Metric Prometheus cho recognizer, xuất ở GET /metrics.
+
+Hot path chỉ observe() 1 lần mỗi request / clip (thời gian từng frame được cộng dồn
+bằng perf_counter rồi mới observe), còn độ sâu hàng đợi, graph đang dùng, tỉ lệ
+cache... được đọc từ stats() lúc scrape nên không tốn gì khi không có ai scrape.
+Middleware đo latency HTTP và render() dùng chung với catalog API (src/shared/http_metrics.py).
+"""
+
+from prometheus_client import REGISTRY, Histogram
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+
+# Giây: từ vài ms (1 request nhẹ) tới vài chục giây (clip dài, hàng đợi đầy)
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+REQUEST_LATENCY = Histogram(
+    "recognizer_http_request_duration_seconds",
+    "Latency HTTP theo route template",
+    ["method", "route", "status"],
+    buckets=LATENCY_BUCKETS,
+)
+
+STAGE_LATENCY = Histogram(
+    "recognizer_stage_duration_seconds",
+    "Thời gian từng stage cho 1 clip: select (lọc frame), decode, landmark (Holistic + keypoint), "
+    "inference (chờ batch + LSTM), scoring (DTW với landmark tham chiếu)",
+    ["stage"],
+    buckets=LATENCY_BUCKETS,
+)
+# Gắn label sẵn: tránh tra dict label mỗi lần observe
+STAGE_SELECT = STAGE_LATENCY.labels("select")
+STAGE_DECODE = STAGE_LATENCY.labels("decode")
+STAGE_LANDMARK = STAGE_LATENCY.labels("landmark")
+STAGE_INFERENCE = STAGE_LATENCY.labels("inference")
+STAGE_SCORING = STAGE_LATENCY.labels("scoring")
+
+
+class StatsCollector:
+    """
+    Collector đọc số liệu lúc scrape. read() trả về iterable
+    (kind, name, documentation, labels dict, value) với kind là "gauge" | "counter".
+    """
+
+    def __init__(self, read):
+        self._read = read
+
+    def collect(self):
+        families = {}
+        for kind, name, documentation, labels, value in self._read():
+            family = families.get(name)
+            if family is None:
+                cls = GaugeMetricFamily if kind == "gauge" else CounterMetricFamily
+                family = families[name] = cls(name, documentation, labels=list(labels))
+            family.add_metric(list(labels.values()), float(value))
+        return list(families.values())
+
+
+def register_stats(read):
+    REGISTRY.register(StatsCollector(read))
+
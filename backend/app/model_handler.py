@@ -1,5 +1,6 @@
 import torch
 import torch.nn as nn
+from torch.nn.utils.rnn import pack_padded_sequence, pad_packed_sequence
 
 
 class LSTMClassifier(nn.Module):
@@ -18,10 +19,21 @@ class LSTMClassifier(nn.Module):
         self.dropout = nn.Dropout(0.3)
         self.fc = nn.Linear(hidden_size * 2, num_classes)
 
-    def forward(self, x):
-        out, _ = self.lstm(x)                         # (B, T, 2H)
+    def forward(self, x, lengths=None):
+        # lengths (B,): số frame thật của từng chuỗi khi batch có padding ở cuối
+        if lengths is None:
+            out, _ = self.lstm(x)                     # (B, T, 2H)
+        else:
+            packed = pack_padded_sequence(x, lengths.cpu(), batch_first=True, enforce_sorted=False)
+            out, _ = self.lstm(packed)
+            out, _ = pad_packed_sequence(out, batch_first=True, total_length=x.size(1))
         out = self.layernorm(out)                    # (B, T, 2H)
-        attn_weights = torch.softmax(self.attn(out), dim=1)  # (B, T, 1)
+        scores = self.attn(out)                      # (B, T, 1)
+        if lengths is not None:
+            # Frame padding không được nhận trọng số attention
+            mask = torch.arange(x.size(1), device=x.device)[None, :] >= lengths.to(x.device)[:, None]
+            scores = scores.masked_fill(mask.unsqueeze(-1), float("-inf"))
+        attn_weights = torch.softmax(scores, dim=1)  # (B, T, 1)
         out = (attn_weights * out).sum(dim=1)        # (B, 2H)
         out = self.dropout(out)
         return self.fc(out)                          # (B, num_classes)
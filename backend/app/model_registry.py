@@ -0,0 +1,220 @@
+"""
+Registry các version LSTMClassifier, đọc từ manifest JSON (mặc định model/manifest.json):
+
+    {
+      "default": "lstm_attn-v1",
+      "versions": {
+        "lstm_attn-v1": {
+          "weights": "lstm_attn.pth",            # tương đối theo thư mục manifest
+          "labels": ["bản_thân", ...],
+          "labels_display": ["ban than", ...],
+          "input_features": 144,                # layout: 6 arm + 21 LH + 21 RH, (x, y, z)
+          "architecture": {"type": "lstm_attn", "hidden_size": 128, "num_layers": 2},
+          "backend": "eager"                    # tuỳ chọn, mặc định INFER_BACKEND
+        }
+      }
+    }
+
+reload() đọc lại manifest, load + warm version mới/đổi ở thread gọi (không chặn
+request đang chạy), rồi đổi bảng version trong 1 phép gán. Version bị gỡ chỉ đóng
+batcher sau `retire_grace` giây để request đang dở vẫn chạy xong.
+"""
+
+import hashlib
+import json
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+
+from app.batching import MicroBatcher
+from app.inference_backends import DEFAULT_TOLERANCES, create_backend, parity_check
+from app.model_handler import load_model
+from app.utils import NUM_FEATURES
+
+ARCHITECTURES = ("lstm_attn",)
+
+
+class UnknownModelVersion(KeyError):
+    """Header X-Model-Version trỏ tới version không có trong registry"""
+
+
+class ModelVersion:
+    """1 version đã load: backend suy luận + micro-batcher riêng + nhãn"""
+
+    def __init__(self, name, spec, base_dir, device="cpu", backend=None, parity_tolerance=None,
+                 max_batch_size=8, max_wait_ms=5.0, warmup_length=100):
+        arch = spec.get("architecture", {})
+        if arch.get("type", "lstm_attn") not in ARCHITECTURES:
+            raise ValueError(f"{name}: unsupported architecture {arch.get('type')!r}")
+        self.name = name
+        self.spec = spec
+        self.labels = list(spec["labels"])
+        self.labels_display = list(spec.get("labels_display", self.labels))
+        self.input_features = int(spec.get("input_features", NUM_FEATURES))
+        if self.input_features != NUM_FEATURES:
+            raise ValueError(f"{name}: input_features={self.input_features}, landmark pipeline produces {NUM_FEATURES}")
+
+        start = time.perf_counter()
+        self.weights = Path(base_dir) / spec["weights"]
+        self.backend_name = spec.get("backend") or backend or "eager"
+        device = device if self.backend_name == "eager" else "cpu"
+        model = load_model(
+            str(self.weights),
+            device=device,
+            input_size=self.input_features,
+            hidden_size=arch.get("hidden_size", 128),
+            num_layers=arch.get("num_layers", 2),
+            num_classes=len(self.labels),
+        )
+        backend_impl = create_backend(self.backend_name, model, str(self.weights))
+
+        # So logits với eager trên vài chuỗi ngẫu nhiên, lệch quá ngưỡng thì không nhận version
+        tolerance = parity_tolerance if parity_tolerance is not None else DEFAULT_TOLERANCES[self.backend_name]
+        self.parity = {
+            "backend": self.backend_name,
+            "max_abs_diff": parity_check(backend_impl, model) if self.backend_name != "eager" else 0.0,
+            "tolerance": tolerance,
+        }
+        if self.parity["max_abs_diff"] > tolerance:
+            raise RuntimeError(f"{name}: inference backend failed parity check: {self.parity}")
+
+        self.batcher = MicroBatcher(backend_impl, device=device, max_batch_size=max_batch_size, max_wait_ms=max_wait_ms)
+        # Warm-up: 1 batch đầy với chuỗi tổng hợp để cấp phát / JIT xong trước khi nhận traffic
+        warm = np.zeros((warmup_length, self.input_features), dtype=np.float32)
+        for future in [self.batcher.submit(warm) for _ in range(max_batch_size)]:
+            future.result()
+        self.load_seconds = time.perf_counter() - start
+        self.loaded_at = time.time()
+
+    def stats(self):
+        return {
+            "weights": str(self.weights),
+            "labels": self.labels_display,
+            "inference_backend": self.parity,
+            "load_seconds": self.load_seconds,
+            "batcher": self.batcher.stats(),
+        }
+
+    def close(self):
+        self.batcher.close()
+
+
+def _spec_key(spec, base_dir):
+    """Thay đổi khi spec hoặc file weights đổi → version cần load lại"""
+    weights = Path(base_dir) / spec["weights"]
+    stat = weights.stat()
+    raw = json.dumps(spec, sort_keys=True) + f"|{stat.st_mtime_ns}|{stat.st_size}"
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class ModelRegistry:
+    def __init__(self, manifest_path, fallback_manifest=None, retire_grace=30.0, **version_kwargs):
+        self.manifest_path = Path(manifest_path)
+        self._fallback = fallback_manifest
+        self.retire_grace = retire_grace
+        self._version_kwargs = version_kwargs
+
+        self._reload_lock = threading.Lock()
+        # (default, {name: ModelVersion}, {name: spec_key}) — thay cả tuple khi swap
+        self._state = (None, {}, {})
+        self._manifest_mtime = None
+        self._last_reload = None
+        self._watcher = None
+        self._stop = threading.Event()
+
+    def _read_manifest(self):
+        if self.manifest_path.exists():
+            with open(self.manifest_path, encoding="utf-8") as f:
+                return json.load(f), self.manifest_path.parent, self.manifest_path.stat().st_mtime_ns
+        if self._fallback is None:
+            raise FileNotFoundError(f"Model manifest not found: {self.manifest_path}")
+        return self._fallback, Path("."), None
+
+    def reload(self):
+        """Đọc manifest, load version mới / đổi, swap nguyên tử. Trả về dict kết quả"""
+        with self._reload_lock:
+            start = time.perf_counter()
+            manifest, base_dir, mtime = self._read_manifest()
+            _, old_versions, old_keys = self._state
+
+            versions, keys, loaded = {}, {}, []
+            try:
+                for name, spec in manifest["versions"].items():
+                    key = _spec_key(spec, base_dir)
+                    if old_keys.get(name) == key:
+                        versions[name] = old_versions[name]
+                    else:
+                        print(f"Loading model version {name} ...")
+                        versions[name] = ModelVersion(name, spec, base_dir, **self._version_kwargs)
+                        loaded.append(name)
+                    keys[name] = key
+
+                default = manifest.get("default") or next(iter(versions))
+                if default not in versions:
+                    raise ValueError(f"Default model version {default!r} is not in the manifest")
+            except Exception:
+                # Lỗi ở bất kỳ version nào → giữ nguyên bảng cũ, bỏ các version vừa load
+                for name in loaded:
+                    versions[name].close()
+                raise
+
+            self._state = (default, versions, keys)
+            self._manifest_mtime = mtime
+            retired = [v for name, v in old_versions.items() if versions.get(name) is not v]
+            if retired:
+                timer = threading.Timer(self.retire_grace, lambda: [v.close() for v in retired])
+                timer.daemon = True
+                timer.start()
+
+            self._last_reload = {
+                "at": time.time(),
+                "seconds": time.perf_counter() - start,
+                "default": default,
+                "loaded": loaded,
+                "retired": [v.name for v in retired],
+            }
+            print(f"Model registry reloaded: {self._last_reload}")
+            return self._last_reload
+
+    def get(self, version=None):
+        default, versions, _ = self._state
+        name = version or default
+        if name not in versions:
+            raise UnknownModelVersion(name)
+        return versions[name]
+
+    def watch(self, interval):
+        """Thread nền: manifest đổi mtime thì reload (lỗi load giữ nguyên version cũ)"""
+        def loop():
+            while not self._stop.wait(interval):
+                try:
+                    mtime = self.manifest_path.stat().st_mtime_ns
+                except FileNotFoundError:
+                    continue
+                if mtime != self._manifest_mtime:
+                    try:
+                        self.reload()
+                    except Exception as e:
+                        self._manifest_mtime = mtime  # không thử lại tới khi manifest đổi tiếp
+                        print(f"Model registry reload failed: {e!r}")
+
+        self._watcher = threading.Thread(target=loop, name="model-registry-watch", daemon=True)
+        self._watcher.start()
+
+    def stats(self):
+        default, versions, _ = self._state
+        return {
+            "manifest": str(self.manifest_path),
+            "default": default,
+            "last_reload": self._last_reload,
+            "versions": {name: v.stats() for name, v in versions.items()},
+        }
+
+    def close(self):
+        self._stop.set()
+        _, versions, _ = self._state
+        for v in versions.values():
+            v.close()
+
@@ -0,0 +1,326 @@
+"""
+Kho landmark tham chiếu cho video mẫu của từng unit (bảng `unit`, cột video_url).
+
+Job offline chạy cùng pipeline Holistic + keypoint + EMA smoothing như /predict
+trên mọi video unit (song song nhiều process), rồi ghi 1 kho gọn:
+
+    <store>/builds/<id>/landmarks.f16   mảng (N, 144) float16 liên tục, mọi unit nối đuôi nhau
+    <store>/builds/<id>/index.json      unit_id → {code, offset, length, sha256, video_url}
+    <store>/current → builds/<id>       symlink tới bản build đang dùng
+
+Mỗi lần build ghi vào 1 thư mục mới rồi đổi symlink `current` bằng 1 lần
+os.replace (atomic), nên reader không bao giờ thấy data của bản mới đi với
+index của bản cũ. Kho cũ dạng phẳng (<store>/index.json) vẫn đọc được.
+
+Lúc serve, ReferenceStore mở landmarks.f16 bằng np.memmap (không copy, các
+process recognizer dùng chung page cache). Build lại là incremental: video có
+sha256 không đổi (và cùng tham số landmark) được chép lại từ kho cũ.
+
+    # media_root: thư mục chứa /media/... (video_url của unit)
+    python -m app.reference_store build --media-root ../ui/public --workers 4
+    python -m app.reference_store build --media-root ../ui/public --units-json units.json
+"""
+
+import argparse
+import hashlib
+import json
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+from app.utils import NUM_FEATURES
+
+STORE_VERSION = 1
+DATA_FILE = "landmarks.f16"
+INDEX_FILE = "index.json"
+STORE_DTYPE = np.dtype("<f2")
+CURRENT_LINK = "current"
+BUILDS_DIR = "builds"
+# Số bản build giữ lại (bản đang dùng + bản trước để rollback)
+KEEP_BUILDS = 2
+
+
+def resolve_store_dir(path):
+    """Thư mục build mà `current` đang trỏ tới; kho dạng phẳng thì chính là path"""
+    current = Path(path) / CURRENT_LINK
+    return current.resolve() if current.exists() else Path(path)
+
+
+class ReferenceStore:
+    """Đọc kho landmark tham chiếu qua memmap: get(unit_id=...) / get(code=...) → (T, 144) float16"""
+
+    def __init__(self, path):
+        # Resolve 1 lần: index và data luôn đọc từ cùng 1 thư mục build
+        self.path = resolve_store_dir(path)
+        with open(self.path / INDEX_FILE, encoding="utf-8") as f:
+            self.index = json.load(f)
+        if self.index.get("version") != STORE_VERSION:
+            raise ValueError(f"Unsupported reference store version: {self.index.get('version')}")
+
+        self.units = {int(uid): entry for uid, entry in self.index["units"].items()}
+        self._by_code = {entry["code"]: uid for uid, entry in self.units.items() if entry.get("code")}
+        total = self.index["total_frames"]
+        if total:
+            self._data = np.memmap(self.path / DATA_FILE, dtype=STORE_DTYPE, mode="r", shape=(total, NUM_FEATURES))
+        else:
+            self._data = np.zeros((0, NUM_FEATURES), dtype=STORE_DTYPE)
+
+    @classmethod
+    def open_if_exists(cls, path):
+        return cls(path) if (resolve_store_dir(path) / INDEX_FILE).exists() else None
+
+    def __len__(self):
+        return len(self.units)
+
+    def __contains__(self, unit_id):
+        return unit_id in self.units
+
+    def unit_id_for_code(self, code):
+        return self._by_code.get(code)
+
+    def get(self, unit_id=None, code=None):
+        """View (T, 144) float16 trỏ thẳng vào memmap, None nếu unit không có trong kho"""
+        if unit_id is None:
+            unit_id = self._by_code.get(code)
+        entry = self.units.get(unit_id)
+        if entry is None:
+            return None
+        return self._data[entry["offset"] : entry["offset"] + entry["length"]]
+
+    def stats(self):
+        return {
+            "path": str(self.path),
+            "units": len(self.units),
+            "total_frames": self.index["total_frames"],
+            "bytes": self.index["total_frames"] * NUM_FEATURES * STORE_DTYPE.itemsize,
+            "built_at": self.index.get("built_at"),
+        }
+
+
+def file_sha256(path, chunk_size=1 << 20):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(chunk_size):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def resolve_video_path(video_url, media_root):
+    """'/media/words/x.mp4' → <media_root>/media/words/x.mp4"""
+    return Path(media_root) / video_url.lstrip("/")
+
+
+# ====== Process worker: mỗi process giữ 1 graph Holistic ======
+_holistic = None
+
+
+def _init_worker(model_complexity):
+    global _holistic
+    from app.utils import create_holistic
+
+    _holistic = create_holistic(model_complexity=model_complexity)
+
+
+def landmark_video(path, holistic, alpha=0.5):
+    """Đọc video bằng OpenCV, chạy cùng pipeline với /predict → (T, 144) float32"""
+    import cv2
+
+    from app.utils import ClipLandmarker
+
+    cap = cv2.VideoCapture(str(path))
+    if not cap.isOpened():
+        raise RuntimeError(f"Cannot open video: {path}")
+    count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT)) or 100
+    clip = ClipLandmarker(holistic, alpha=alpha, capacity=count)
+    try:
+        while True:
+            ok, bgr = cap.read()
+            if not ok:
+                break
+            clip.add_frame(cv2.cvtColor(bgr, cv2.COLOR_BGR2RGB))
+    finally:
+        cap.release()
+    return clip.to_array()
+
+
+def _landmark_job(job):
+    sha, path, alpha = job
+    # Mỗi video là 1 clip độc lập: xóa tracking state của video trước
+    _holistic.reset()
+    try:
+        return sha, landmark_video(path, _holistic, alpha=alpha), None
+    except Exception as e:
+        return sha, None, repr(e)
+
+
+# ====== Build ======
+def _load_previous(store_dir, params):
+    """sha256 → (T, 144) float16 từ kho cũ nếu cùng tham số landmark"""
+    try:
+        old = ReferenceStore(store_dir)
+    except (FileNotFoundError, ValueError, KeyError):
+        return {}
+    if old.index.get("params") != params:
+        return {}
+    return {entry["sha256"]: old.get(uid) for uid, entry in old.units.items()}
+
+
+def build_store(units, store_dir, media_root, workers=2, model_complexity=2, alpha=0.5, log=print):
+    """
+    Landmark video của các unit và ghi kho vào store_dir.
+    units: list dict có unit_id, code, video_url (như DatabaseManager.get_all_units()).
+    Trả về dict thống kê (reused / extracted / missing / failed).
+    """
+    store_dir = Path(store_dir)
+    store_dir.mkdir(parents=True, exist_ok=True)
+    params = {"alpha": alpha, "model_complexity": model_complexity, "num_features": NUM_FEATURES}
+    previous = _load_previous(store_dir, params)
+
+    # Hash video, gom các unit dùng chung 1 file
+    entries, jobs, missing = [], {}, []
+    for unit in units:
+        if not unit.get("video_url"):
+            missing.append(unit.get("code"))
+            continue
+        path = resolve_video_path(unit["video_url"], media_root)
+        if not path.is_file():
+            missing.append(unit.get("code"))
+            continue
+        sha = file_sha256(path)
+        entries.append((unit, sha))
+        if sha not in previous and sha not in jobs:
+            jobs[sha] = (sha, str(path), alpha)
+
+    log(f"{len(entries)} unit videos: {len(jobs)} to extract, "
+        f"{len({sha for _, sha in entries}) - len(jobs)} reused, {len(missing)} missing")
+
+    start = time.perf_counter()
+    sequences = {sha: seq for sha, seq in previous.items()}
+    failed = {}
+    if jobs:
+        ctx = multiprocessing.get_context("spawn")
+        with ctx.Pool(processes=max(1, min(workers, len(jobs))), initializer=_init_worker,
+                      initargs=(model_complexity,)) as pool:
+            for i, (sha, seq, error) in enumerate(pool.imap_unordered(_landmark_job, jobs.values()), 1):
+                if error is not None:
+                    failed[sha] = error
+                    log(f"[{i}/{len(jobs)}] FAILED {jobs[sha][1]}: {error}")
+                    continue
+                sequences[sha] = seq.astype(STORE_DTYPE)
+                log(f"[{i}/{len(jobs)}] {jobs[sha][1]} → {len(seq)} frames")
+
+    # Ghi vào thư mục build mới; chưa ai đọc tới cho đến khi đổi symlink `current`
+    (store_dir / BUILDS_DIR).mkdir(exist_ok=True)
+    build_dir = Path(tempfile.mkdtemp(prefix=time.strftime("%Y%m%d-%H%M%S-"), dir=store_dir / BUILDS_DIR))
+    build_dir.chmod(0o755)  # mkdtemp tạo 0700
+    index_units, offset = {}, 0
+    with open(build_dir / DATA_FILE, "wb") as f:
+        written = {}
+        for unit, sha in entries:
+            if sha in failed:
+                continue
+            if sha not in written:
+                seq = np.ascontiguousarray(sequences[sha], dtype=STORE_DTYPE)
+                f.write(seq.tobytes())
+                written[sha] = (offset, len(seq))
+                offset += len(seq)
+            seq_offset, length = written[sha]
+            index_units[str(unit["unit_id"])] = {
+                "code": unit.get("code"),
+                "offset": seq_offset,
+                "length": length,
+                "sha256": sha,
+                "video_url": unit["video_url"],
+            }
+
+    index = {
+        "version": STORE_VERSION,
+        "dtype": STORE_DTYPE.str,
+        "num_features": NUM_FEATURES,
+        "params": params,
+        "total_frames": offset,
+        "built_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "units": index_units,
+    }
+    with open(build_dir / INDEX_FILE, "w", encoding="utf-8") as f:
+        json.dump(index, f, ensure_ascii=False, indent=1)
+    _publish(store_dir, build_dir)
+
+    return {
+        "units": len(index_units),
+        "total_frames": offset,
+        "extracted": len(jobs) - len(failed),
+        "reused": len({sha for _, sha in entries} - set(jobs)),
+        "missing": missing,
+        "failed": list(failed.values()),
+        "seconds": time.perf_counter() - start,
+    }
+
+
+def _publish(store_dir, build_dir):
+    """
+    Trỏ `current` sang build_dir bằng 1 lần os.replace symlink (atomic), rồi dọn
+    bản build cũ. Process đang memmap bản cũ vẫn đọc được inode đã bị xóa.
+    """
+    tmp_link = store_dir / (CURRENT_LINK + ".tmp")
+    if tmp_link.is_symlink() or tmp_link.exists():
+        tmp_link.unlink()
+    os.symlink(Path(BUILDS_DIR) / build_dir.name, tmp_link, target_is_directory=True)
+    os.replace(tmp_link, store_dir / CURRENT_LINK)
+
+    # File của kho dạng phẳng cũ không còn được đọc nữa
+    for name in (DATA_FILE, INDEX_FILE):
+        (store_dir / name).unlink(missing_ok=True)
+    builds = sorted(p for p in (store_dir / BUILDS_DIR).iterdir() if p.is_dir())
+    for old in builds[:-KEEP_BUILDS]:
+        if old.name != build_dir.name:
+            shutil.rmtree(old, ignore_errors=True)
+
+
+def _load_units(args):
+    if args.units_json:
+        with open(args.units_json, encoding="utf-8") as f:
+            return json.load(f)
+    # Lấy unit từ Supabase giống src/backend (src/ trên sys.path)
+    sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+    from shared.database import DatabaseManager
+
+    return DatabaseManager().get_all_units()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Kho landmark tham chiếu cho video unit")
+    sub = parser.add_subparsers(dest="command", required=True)
+    build = sub.add_parser("build", help="Landmark video unit (incremental theo sha256)")
+    build.add_argument("--media-root", required=True, help="Thư mục chứa /media/... của video_url")
+    build.add_argument("--store", default=os.getenv("REFERENCE_STORE_DIR", "reference_store"))
+    build.add_argument("--units-json", help="File JSON list unit thay vì đọc từ Supabase")
+    build.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    build.add_argument("--model-complexity", type=int, default=2)
+    build.add_argument("--alpha", type=float, default=0.5)
+    info = sub.add_parser("info", help="In thống kê kho")
+    info.add_argument("--store", default=os.getenv("REFERENCE_STORE_DIR", "reference_store"))
+    args = parser.parse_args()
+
+    if args.command == "build":
+        result = build_store(
+            _load_units(args),
+            args.store,
+            args.media_root,
+            workers=args.workers,
+            model_complexity=args.model_complexity,
+            alpha=args.alpha,
+        )
+        print(json.dumps(result, ensure_ascii=False, indent=2))
+    else:
+        print(json.dumps(ReferenceStore(args.store).stats(), indent=2))
+
+
+if __name__ == "__main__":
+    main()
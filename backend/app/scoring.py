@@ -0,0 +1,156 @@
+"""
+Chấm điểm động tác của người học so với landmark tham chiếu của unit (ReferenceStore)
+bằng DTW có ràng buộc dải (Sakoe-Chiba), vectorized với NumPy.
+
+- Mỗi frame được chuẩn hoá theo thân người: gốc toạ độ = trung điểm 2 vai, đơn vị =
+  khoảng cách 2 vai (x, y; bỏ z vì nhiễu) → không phụ thuộc vị trí / khoảng cách tới camera.
+- Chi phí giữa frame i (người học) và j (tham chiếu) tính riêng cho arms / left_hand /
+  right_hand: RMS khoảng cách các điểm, qua 1 phép nhân ma trận cho cả cặp chuỗi.
+  Tay không detect được ở 1 bên → MISSING_HAND_COST, cả 2 bên → 0.
+- DTW duyệt theo đường chéo phụ (i + j = k): mọi ô trên 1 đường chéo độc lập nhau nên
+  tính cả đường chéo bằng 1 lần gather / min / scatter, chỉ O(n + m) vòng lặp Python.
+- Điểm = 100 * exp(-cost / scale), cost = trung bình chi phí dọc đường căn chỉnh.
+"""
+
+import numpy as np
+
+# Layout 48 điểm của extract_frame_keypoints: vai/khuỷu/cổ tay trái, phải; tay trái 21; tay phải 21
+PARTS = {
+    "arms": slice(0, 6),
+    "left_hand": slice(6, 27),
+    "right_hand": slice(27, 48),
+}
+PART_WEIGHTS = {"arms": 0.2, "left_hand": 0.4, "right_hand": 0.4}
+_LEFT_SHOULDER, _RIGHT_SHOULDER = 0, 3
+
+# Chi phí (đơn vị: bề rộng vai) khi 1 bên thấy tay còn bên kia không
+MISSING_HAND_COST = 1.0
+_MIN_SHOULDER_WIDTH = 1e-3
+
+_STEPS = ((-1, -1), (-1, 0), (0, -1))  # chéo, lên, trái
+
+
+def normalize_sequence(seq):
+    """
+    (T, 144) → (T, 48, 2) toạ độ theo thân người + mask (T, 3) phần nào có landmark.
+    Tay chưa từng detect (toàn 0 sau smoothing) bị đánh dấu thiếu.
+    """
+    points = np.asarray(seq, dtype=np.float64).reshape(len(seq), -1, 3)[:, :, :2]
+    present = np.stack([np.any(points[:, part] != 0, axis=(1, 2)) for part in PARTS.values()], axis=1)
+
+    left, right = points[:, _LEFT_SHOULDER], points[:, _RIGHT_SHOULDER]
+    center = (left + right) / 2
+    width = np.linalg.norm(left - right, axis=1)
+    # Frame thiếu pose: dùng bề rộng vai trung vị của cả chuỗi
+    valid = present[:, 0] & (width > _MIN_SHOULDER_WIDTH)
+    fallback = np.median(width[valid]) if valid.any() else 1.0
+    width = np.where(valid, width, fallback)
+    return (points - center[:, None]) / width[:, None, None], present
+
+
+def part_cost_matrices(a, a_present, b, b_present):
+    """
+    Chi phí (n, m) cho từng phần: RMS khoảng cách điểm giữa frame i của a và frame j của b.
+    ||x - y||² = ||x||² + ||y||² - 2 x·y → 1 phép nhân ma trận thay vì broadcast (n, m, P, 2).
+    """
+    costs = {}
+    for p, (name, part) in enumerate(PARTS.items()):
+        x = a[:, part].reshape(len(a), -1)
+        y = b[:, part].reshape(len(b), -1)
+        sq = (x * x).sum(1)[:, None] + (y * y).sum(1)[None, :] - 2 * x @ y.T
+        cost = np.sqrt(np.maximum(sq, 0) / (x.shape[1] // 2))
+
+        both = a_present[:, p][:, None] & b_present[:, p][None, :]
+        neither = ~a_present[:, p][:, None] & ~b_present[:, p][None, :]
+        if name != "arms":
+            cost = np.where(both, cost, np.where(neither, 0.0, MISSING_HAND_COST))
+        costs[name] = cost
+    return costs
+
+
+def band_mask(n, m, band):
+    """Dải Sakoe-Chiba nghiêng theo tỉ lệ n/m: |i/n - j/m| * max(n, m) <= band (đơn vị frame)"""
+    i = np.arange(n)[:, None] / max(n - 1, 1)
+    j = np.arange(m)[None, :] / max(m - 1, 1)
+    return np.abs(i - j) * max(n, m) <= band
+
+
+def banded_dtw(cost, band):
+    """
+    DTW trên ma trận chi phí (n, m), chỉ đi trong dải `band` frame quanh đường chéo.
+    Trả về (tổng chi phí, đường căn chỉnh (L, 2) các cặp (i, j) từ đầu tới cuối).
+    """
+    n, m = cost.shape
+    # Chuỗi quá ngắn so với chuỗi kia: nới dải để luôn còn ít nhất 1 đường đi
+    band = max(band, max(n, m) / max(min(n, m) - 1, 1))
+    cost = np.where(band_mask(n, m, band), cost, np.inf)
+
+    # acc[i + 1, j + 1] = chi phí tích luỹ tới ô (i, j); hàng / cột 0 là biên vô cực
+    acc = np.full((n + 1, m + 1), np.inf)
+    acc[0, 0] = 0.0
+    flat, width = acc.reshape(-1), m + 1
+    for k in range(n + m - 1):
+        i = np.arange(max(0, k - m + 1), min(n, k + 1))
+        cell = i * width + (k - i)  # acc[i, j] dạng index phẳng, j = k - i
+        best = np.minimum(np.minimum(flat[cell], flat[cell + 1]), flat[cell + width])
+        flat[cell + width + 1] = cost[i, k - i] + best
+
+    total = acc[n, m]
+    if not np.isfinite(total):
+        raise ValueError("No warping path inside the band")
+
+    # Lần ngược từ (n-1, m-1): mỗi bước đi về ô trước có chi phí tích luỹ nhỏ nhất
+    rows = acc.tolist()  # float Python: so sánh từng ô nhanh hơn index numpy
+    path = [(n - 1, m - 1)]
+    i, j = n - 1, m - 1
+    while i > 0 or j > 0:
+        candidates = (rows[i][j], rows[i][j + 1], rows[i + 1][j])
+        di, dj = _STEPS[candidates.index(min(candidates))]
+        i, j = i + di, j + dj
+        path.append((i, j))
+    return float(total), np.array(path[::-1])
+
+
+def similarity(cost, scale):
+    return float(100 * np.exp(-cost / scale))
+
+
+def score_sequence(learner, reference, band_ratio=0.2, scale=0.5):
+    """
+    So chuỗi (T, 144) của người học với chuỗi tham chiếu (R, 144).
+    band_ratio: bề rộng dải DTW theo tỉ lệ độ dài chuỗi dài hơn.
+    Trả về điểm tổng + sai số / điểm / tỉ lệ detect cho từng phần.
+    """
+    if len(learner) == 0 or len(reference) == 0:
+        raise ValueError("Empty sequence")
+    a, a_present = normalize_sequence(learner)
+    b, b_present = normalize_sequence(reference)
+    if not a_present[:, 0].any():
+        raise ValueError("No pose landmarks detected in clip")
+    if not b_present[:, 0].any():
+        raise ValueError("Reference has no pose landmarks")
+    costs = part_cost_matrices(a, a_present, b, b_present)
+    combined = sum(PART_WEIGHTS[name] * cost for name, cost in costs.items())
+
+    band = max(band_ratio * max(len(a), len(b)), 1.0)
+    total, path = banded_dtw(combined, band)
+    distance = total / len(path)
+
+    parts = {}
+    for p, (name, cost) in enumerate(costs.items()):
+        error = float(cost[path[:, 0], path[:, 1]].mean())
+        parts[name] = {
+            "error": error,
+            "score": similarity(error, scale),
+            "detected": float(a_present[:, p].mean()),
+            "reference_detected": float(b_present[:, p].mean()),
+        }
+    return {
+        "score": similarity(distance, scale),
+        "distance": distance,
+        "parts": parts,
+        "frames": len(a),
+        "reference_frames": len(b),
+        "path_length": len(path),
+        "band": band,
+    }
@@ -0,0 +1,58 @@
+"""RecognitionExecutor: job bị huỷ khi còn trong hàng đợi phải trả lại chỗ"""
+
+import asyncio
+import threading
+
+import pytest
+
+from app.executor import ExecutorBusy, RecognitionExecutor
+
+
+@pytest.fixture
+def blocked_executor():
+    """Executor 1 worker, worker đang bị giữ bởi 1 job chờ Event"""
+    executor = RecognitionExecutor(max_workers=1, max_queue=1)
+    release = threading.Event()
+    started = threading.Event()
+
+    def block():
+        started.set()
+        release.wait(5)
+
+    blocker = executor.submit(block)
+    assert started.wait(5)
+    yield executor, release
+    release.set()
+    blocker.result(5)
+    executor.close()
+
+
+def test_cancelled_future_releases_queue_slot(blocked_executor):
+    executor, release = blocked_executor
+    queued = executor.submit(lambda: None)
+    assert executor.stats()["queued"] == 1
+    # Hàng đợi đầy
+    with pytest.raises(ExecutorBusy):
+        executor.submit(lambda: None)
+
+    assert queued.cancel()
+    stats = executor.stats()
+    assert stats["queued"] == 0
+    assert stats["cancelled"] == 1
+    # Chỗ đã được trả lại
+    executor.submit(lambda: None)
+
+
+def test_cancelled_request_task_releases_queue_slot(blocked_executor):
+    executor, release = blocked_executor
+
+    async def request():
+        # Giống request bị timeout / client ngắt khi job còn chờ
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.wait_for(executor.run(lambda: None), timeout=0.05)
+
+    asyncio.run(request())
+    release.set()
+    stats = executor.stats()
+    assert stats["queued"] == 0
+    assert stats["cancelled"] == 1
@@ -0,0 +1,79 @@
+"""Frame hỏng trên /predict_frames và /predict trả 400 nêu index frame thay vì 500"""
+
+import base64
+import os
+import struct
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+pytest.importorskip("mediapipe")
+cv2 = pytest.importorskip("cv2")
+
+BACKEND_DIR = Path(__file__).resolve().parents[2]
+
+# Đọc lúc import app.main: load đồng bộ, 1 graph complexity 1 (model có sẵn trong mediapipe)
+os.environ.setdefault("RECOGNIZER_BACKGROUND_LOAD", "0")
+os.environ.setdefault("HOLISTIC_MODEL_COMPLEXITY", "1")
+os.environ.setdefault("HOLISTIC_POOL_SIZE", "1")
+os.environ.setdefault("STARTUP_WARMUP_FRAMES", "0")
+
+
+@pytest.fixture(scope="module")
+def client():
+    from fastapi.testclient import TestClient
+
+    cwd = os.getcwd()
+    os.chdir(BACKEND_DIR)  # MODEL_MANIFEST / REFERENCE_STORE_DIR là đường dẫn tương đối
+    try:
+        from app.main import app
+
+        with TestClient(app) as c:
+            yield c
+    finally:
+        os.chdir(cwd)
+
+
+@pytest.fixture(scope="module")
+def jpeg():
+    return cv2.imencode(".jpg", np.full((240, 320, 3), 120, np.uint8))[1].tobytes()
+
+
+def length_prefixed(frames):
+    return b"".join(struct.pack(">I", len(f)) + f for f in frames)
+
+
+def test_undecodable_frame_in_stream_is_400(client, jpeg):
+    body = length_prefixed([jpeg, b"not a jpeg", jpeg])
+
+    r = client.post("/predict_frames", content=body, headers={"Content-Type": "application/octet-stream"})
+
+    assert r.status_code == 400
+    assert r.json()["detail"].startswith("Frame 1:")
+
+
+def test_undecodable_multipart_frame_is_400(client, jpeg):
+    files = [("frames", (f"{i}.jpg", data, "image/jpeg")) for i, data in enumerate([jpeg, jpeg, b"garbage"])]
+
+    r = client.post("/predict_frames", files=files)
+
+    assert r.status_code == 400
+    assert r.json()["detail"].startswith("Frame 2:")
+
+
+def test_bad_base64_frame_is_400(client, jpeg):
+    good = base64.b64encode(jpeg).decode()
+
+    r = client.post("/predict", json={"data": [good, "@@@not base64"]})
+
+    assert r.status_code == 400
+    assert r.json()["detail"].startswith("Frame 1:")
+
+
+def test_valid_clip_still_predicts(client, jpeg):
+    r = client.post("/predict_frames", content=length_prefixed([jpeg] * 3),
+                    headers={"Content-Type": "application/octet-stream"})
+
+    assert r.status_code == 200
+    assert "prediction" in r.json()
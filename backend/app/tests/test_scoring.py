@@ -0,0 +1,58 @@
+"""banded_dtw so với DTW đầy đủ viết bằng vòng lặp thuần trên ma trận chi phí ngẫu nhiên"""
+
+import numpy as np
+import pytest
+
+from app.scoring import band_mask, banded_dtw
+
+
+def brute_force_dtw(cost):
+    """DTW không ràng buộc dải, O(n * m) vòng lặp Python"""
+    n, m = cost.shape
+    acc = np.full((n + 1, m + 1), np.inf)
+    acc[0, 0] = 0.0
+    for i in range(n):
+        for j in range(m):
+            acc[i + 1, j + 1] = cost[i, j] + min(acc[i, j], acc[i, j + 1], acc[i + 1, j])
+    return acc[n, m]
+
+
+def check_path(path, cost, total):
+    """Đường đi từ (0, 0) tới (n-1, m-1), mỗi bước chéo / xuống / phải, tổng chi phí = total"""
+    n, m = cost.shape
+    assert tuple(path[0]) == (0, 0)
+    assert tuple(path[-1]) == (n - 1, m - 1)
+    steps = {tuple(step) for step in np.diff(path, axis=0)}
+    assert steps <= {(1, 1), (1, 0), (0, 1)}
+    assert cost[path[:, 0], path[:, 1]].sum() == pytest.approx(total)
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_unbanded_matches_brute_force(seed):
+    rng = np.random.default_rng(seed)
+    n, m = rng.integers(1, 40, size=2)
+    cost = rng.random((n, m))
+
+    # Dải rộng bằng chuỗi dài hơn phủ toàn bộ ma trận
+    total, path = banded_dtw(cost, band=max(n, m))
+
+    assert total == pytest.approx(brute_force_dtw(cost))
+    check_path(path, cost, total)
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_band_only_restricts_the_path(seed):
+    rng = np.random.default_rng(100 + seed)
+    n, m = rng.integers(2, 40, size=2)
+    cost = rng.random((n, m))
+    band = 0.2 * max(n, m)
+
+    total, path = banded_dtw(cost, band=band)
+
+    check_path(path, cost, total)
+    assert total >= brute_force_dtw(cost) - 1e-9
+    effective = max(band, max(n, m) / max(min(n, m) - 1, 1))
+    assert band_mask(n, m, effective)[path[:, 0], path[:, 1]].all()
+    # Ngoài dải là vô cực: DTW đầy đủ trên ma trận đã che phải cho cùng kết quả
+    masked = np.where(band_mask(n, m, effective), cost, np.inf)
+    assert total == pytest.approx(brute_force_dtw(masked))
@@ -1,4 +1,5 @@
 import base64
+import threading
 import cv2
 import numpy as np
 import mediapipe as mp
@@ -17,16 +18,188 @@ POSE_LANDMARKS = [
     mp_holistic.PoseLandmark.RIGHT_WRIST,
 ]
 
+# 6 arm + 21 LH + 21 RH, mỗi điểm (x, y, z)
+NUM_POINTS = len(POSE_LANDMARKS) + 21 + 21
+NUM_FEATURES = NUM_POINTS * 3
+
+_POSE_INDICES = [lm.value for lm in POSE_LANDMARKS]
+
+
+def create_holistic(model_complexity=2):
+    """Tạo graph Holistic với cấu hình giống demo"""
+    return mp_holistic.Holistic(
+        static_image_mode=False,
+        model_complexity=model_complexity,
+        min_detection_confidence=0.6,
+        min_tracking_confidence=0.7,
+        enable_segmentation=False,
+        refine_face_landmarks=False,
+    )
+
+
+def decode_bytes_to_bgr(img_bytes):
+    """Giải mã bytes JPEG/PNG → ảnh BGR (numpy array, đúng thứ tự kênh của OpenCV)"""
+    nparr = np.frombuffer(img_bytes, np.uint8)
+    return cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+
+
+def decode_bytes_to_rgb(img_bytes):
+    """Giải mã bytes JPEG/PNG → ảnh RGB (numpy array)"""
+    return cv2.cvtColor(decode_bytes_to_bgr(img_bytes), cv2.COLOR_BGR2RGB)
+
+
+def split_frame_stream(body):
+    """
+    Tách body dạng length-prefixed: [uint32 big-endian độ dài][bytes JPEG] lặp lại.
+    Trả về list view uint8 trỏ thẳng vào body (không copy).
+    """
+    buf = np.frombuffer(body, np.uint8)
+    frames = []
+    offset, total = 0, len(buf)
+    while offset < total:
+        if offset + 4 > total:
+            raise ValueError("Truncated frame length prefix")
+        length = int.from_bytes(buf[offset:offset + 4].tobytes(), "big")
+        offset += 4
+        if length == 0 or offset + length > total:
+            raise ValueError(f"Invalid frame length {length} at offset {offset - 4}")
+        frames.append(buf[offset:offset + length])
+        offset += length
+    return frames
+
+
+def decode_base64_to_bgr(b64_string: str):
+    """Giải mã base64 → ảnh BGR (numpy array, đúng thứ tự kênh của OpenCV)"""
+    return decode_bytes_to_bgr(base64.b64decode(b64_string))
+
 
 def decode_base64_to_rgb(b64_string: str):
     """Giải mã base64 → ảnh RGB (numpy array)"""
-    img_bytes = base64.b64decode(b64_string)
-    nparr = np.frombuffer(img_bytes, np.uint8)
-    bgr = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+    bgr = decode_base64_to_bgr(b64_string)
     rgb = cv2.cvtColor(bgr, cv2.COLOR_BGR2RGB)
     return rgb
 
 
+# Marker SOF của JPEG (chứa kích thước ảnh), trừ DHT (C4), JPG (C8), DAC (CC)
+_JPEG_SOF_MARKERS = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+_REDUCED_COLOR_FLAGS = {
+    1: cv2.IMREAD_COLOR,
+    2: cv2.IMREAD_REDUCED_COLOR_2,
+    4: cv2.IMREAD_REDUCED_COLOR_4,
+    8: cv2.IMREAD_REDUCED_COLOR_8,
+}
+
+
+def jpeg_size(data):
+    """(width, height) đọc từ header JPEG mà không decode; None nếu không phải JPEG hợp lệ"""
+    data = memoryview(data).cast("B")
+    if len(data) < 4 or data[0] != 0xFF or data[1] != 0xD8:
+        return None
+    i = 2
+    while i + 9 <= len(data):
+        if data[i] != 0xFF:
+            return None
+        marker = data[i + 1]
+        if marker == 0xFF:  # byte đệm
+            i += 1
+            continue
+        if marker in _JPEG_SOF_MARKERS:
+            height = (data[i + 5] << 8) | data[i + 6]
+            width = (data[i + 7] << 8) | data[i + 8]
+            return width, height
+        i += 2 + ((data[i + 2] << 8) | data[i + 3])
+    return None
+
+
+class FrameDecoder:
+    """
+    Decode frame JPEG (bytes hoặc base64) cho Holistic, rẻ hơn decode_base64_to_rgb:
+    - target_width > 0: frame rộng hơn được decode thẳng ở 1/2, 1/4, 1/8 độ phân giải
+      (IMREAD_REDUCED_COLOR_*, libjpeg bỏ bớt hệ số DCT) rồi resize về đúng target_width.
+    - scale > 1: luôn decode ở 1/scale (2, 4 hoặc 8).
+    - decode_rgb() ghi BGR → RGB vào buffer dùng lại theo từng thread; kết quả chỉ
+      hợp lệ tới lần decode kế tiếp trên cùng thread (Holistic.process copy ảnh nên đủ).
+    Truyền dict `counter` để cộng dồn số byte nén / byte đã decode của 1 clip.
+    """
+
+    def __init__(self, target_width=0, scale=1):
+        if scale not in _REDUCED_COLOR_FLAGS:
+            raise ValueError(f"scale must be one of {list(_REDUCED_COLOR_FLAGS)}")
+        self.target_width = target_width
+        self.scale = scale
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._stats = {"clips": 0, "frames": 0, "input_bytes": 0, "native_bytes": 0, "decoded_bytes": 0}
+
+    def _reduction(self, size):
+        if self.scale > 1 or not self.target_width or size is None:
+            return self.scale
+        width = size[0]
+        for factor in (8, 4, 2):
+            if width // factor >= self.target_width:
+                return factor
+        return 1
+
+    def decode_bgr(self, data, counter=None):
+        if isinstance(data, str):
+            data = base64.b64decode(data)
+        buf = np.frombuffer(data, np.uint8)
+        if not len(buf):
+            raise ValueError("Empty frame")
+        size = jpeg_size(buf)
+        bgr = cv2.imdecode(buf, _REDUCED_COLOR_FLAGS[self._reduction(size)])
+        if bgr is None:
+            raise ValueError("Cannot decode frame")
+        height, width = bgr.shape[:2]
+        if self.target_width and width > self.target_width:
+            target = (self.target_width, max(1, round(height * self.target_width / width)))
+            # Tỉ lệ còn lại < 2 sau khi decode giảm nên INTER_LINEAR là đủ (rẻ hơn INTER_AREA ~6 lần)
+            bgr = cv2.resize(bgr, target, dst=self._buffer("bgr", target[::-1]), interpolation=cv2.INTER_LINEAR)
+
+        if counter is not None:
+            counter["frames"] = counter.get("frames", 0) + 1
+            counter["input_bytes"] = counter.get("input_bytes", 0) + len(buf)
+            native = size[0] * size[1] * 3 if size else bgr.size
+            counter["native_bytes"] = counter.get("native_bytes", 0) + native
+            counter["decoded_bytes"] = counter.get("decoded_bytes", 0) + bgr.size
+        return bgr
+
+    def decode_rgb(self, data, counter=None):
+        bgr = self.decode_bgr(data, counter)
+        return cv2.cvtColor(bgr, cv2.COLOR_BGR2RGB, dst=self._buffer("rgb", bgr.shape[:2]))
+
+    def _buffer(self, name, hw):
+        """Buffer (H, W, 3) uint8 dùng lại cho thread hiện tại"""
+        key = (name, hw)
+        buffers = getattr(self._local, "buffers", None)
+        if buffers is None:
+            buffers = self._local.buffers = {}
+        buf = buffers.get(key)
+        if buf is None:
+            # Giữ tối đa 1 buffer mỗi loại để clip đổi kích thước không làm phình bộ nhớ
+            for old in [k for k in buffers if k[0] == name]:
+                del buffers[old]
+            buf = buffers[key] = np.empty((*hw, 3), dtype=np.uint8)
+        return buf
+
+    def record_clip(self, counter):
+        with self._lock:
+            self._stats["clips"] += 1
+            for key in ("frames", "input_bytes", "native_bytes", "decoded_bytes"):
+                self._stats[key] += counter.get(key, 0)
+
+    def stats(self):
+        with self._lock:
+            clips = self._stats["clips"]
+            return {
+                "target_width": self.target_width,
+                "scale": self.scale,
+                **self._stats,
+                "decoded_bytes_per_clip": self._stats["decoded_bytes"] / clips if clips else 0.0,
+                "native_bytes_per_clip": self._stats["native_bytes"] / clips if clips else 0.0,
+            }
+
+
 def extract_frame_keypoints(results, prev_arm, prev_left, prev_right, alpha=0.5):
     """
     Trích xuất keypoints từ pose (arm) và hands - GIỐNG HỆT DEMO:
@@ -66,4 +239,147 @@ def extract_frame_keypoints(results, prev_arm, prev_left, prev_right, alpha=0.5)
 
     # Concatenate: arm (6×3) + left hand (21×3) + right hand (21×3) = 144 features
     frame_kp = np.concatenate([arm_points, left, right]).flatten()
-    return frame_kp, prev_arm, prev_left, prev_right
\ No newline at end of file
+    return frame_kp, prev_arm, prev_left, prev_right
+
+
+def _xyz_view(landmark_list):
+    """
+    View (n, 3) float32 trỏ thẳng vào bytes protobuf đã serialize của landmark_list,
+    tránh truy cập lm.x / lm.y / lm.z từng cái. Mỗi NormalizedLandmark được serialize
+    thành 0x0a <len> | 0x0d x(4) | 0x15 y(4) | 0x1d z(4) [| visibility | presence];
+    trả về None nếu bố cục khác (khi đó đọc theo cách thường).
+    """
+    if not hasattr(landmark_list, "SerializeToString"):
+        return None
+    n = len(landmark_list.landmark)
+    data = landmark_list.SerializeToString()
+    if n == 0 or len(data) % n:
+        return None
+    rec = len(data) // n
+    if not 17 <= rec < 130:
+        return None
+    if (data[0::rec] != b"\x0a" * n or data[1::rec] != bytes([rec - 2]) * n
+            or data[2::rec] != b"\x0d" * n or data[7::rec] != b"\x15" * n or data[12::rec] != b"\x1d" * n):
+        return None
+    return np.ndarray((n, 3), dtype="<f4", buffer=data, offset=3, strides=(rec, 5))
+
+
+def fill_raw_keypoints(results, out):
+    """
+    Ghi landmark thô (chưa smooth) của 1 frame vào out (48, 3) float32:
+    arm 6 điểm, tay trái 21, tay phải 21; phần không detect được = NaN.
+    """
+    n_arm = len(_POSE_INDICES)
+    if results.pose_landmarks:
+        xyz = _xyz_view(results.pose_landmarks)
+        if xyz is not None:
+            out[:n_arm] = xyz[_POSE_INDICES]
+        else:
+            pose = results.pose_landmarks.landmark
+            out[:n_arm] = [(pose[i].x, pose[i].y, pose[i].z) for i in _POSE_INDICES]
+    else:
+        out[:n_arm] = np.nan
+
+    for hand_lms, lo in ((results.left_hand_landmarks, n_arm), (results.right_hand_landmarks, n_arm + 21)):
+        if hand_lms:
+            xyz = _xyz_view(hand_lms)
+            if xyz is not None:
+                out[lo:lo + 21] = xyz
+            else:
+                out[lo:lo + 21] = [(lm.x, lm.y, lm.z) for lm in hand_lms.landmark]
+        else:
+            out[lo:lo + 21] = np.nan
+
+
+def smooth_keypoint_sequence(raw, alpha=0.5):
+    """
+    EMA smoothing cho cả chuỗi landmark thô (T, 144) hoặc (T, 48, 3), cho kết quả
+    giống hệt gọi extract_frame_keypoints lần lượt từng frame:
+    - arm (6 điểm) / tay trái (21) / tay phải (21): phần nào có NaN = không detect
+    - arm chưa từng detect → 0; tay chưa từng detect → 0 và 0 được dùng làm prev
+    Không phải 1 lượt vector hoá hoàn toàn: mask detect / có prev và lựa chọn
+    blend / lấy thô / giữ prev được tính 1 lần cho cả chuỗi, còn phép đệ quy EMA
+    (prev → cur) vẫn lặp theo frame. Dạng đóng (tổng lũy thừa beta) hay lfilter cộng
+    theo thứ tự khác nên lệch bit cuối so với extract_frame_keypoints, mà kết quả cần
+    giống hệt từng bit. Mỗi frame chỉ còn vài phép toán in-place trên các đoạn liên
+    tục của buffer: hàm này tốn ~0.4–0.6 ms cho clip 100 frame, và cả đường mới
+    (fill_raw_keypoints + hàm này) nhanh hơn extract_frame_keypoints từng frame
+    ~1.4–2.4x tuỳ lần chạy benchmarks/bench_keypoints.py. Trả về (T, 144) float32.
+    """
+    raw = np.asarray(raw, dtype=np.float64).reshape(len(raw), NUM_POINTS, 3)
+    n_frames = len(raw)
+    n_arm = len(_POSE_INDICES)
+    parts = [(0, n_arm), (n_arm, n_arm + 21), (n_arm + 21, NUM_POINTS)]
+
+    missing = np.isnan(raw).any(axis=2)  # (T, 48)
+    present = ~np.stack([missing[:, lo:hi].any(axis=1) for lo, hi in parts], axis=1)  # (T, 3)
+
+    # Có prev: arm khi đã từng detect ở frame trước; tay thì mọi frame sau frame 0
+    has_prev = np.zeros_like(present)
+    has_prev[1:, 0] = np.logical_or.accumulate(present[:-1, 0])
+    has_prev[1:, 1:] = True
+    blend = (present & has_prev).tolist()
+    take = (present & ~has_prev).tolist()
+    all_blend = (present & has_prev).all(axis=1).tolist()
+
+    scaled = alpha * raw
+    beta = 1 - alpha
+    out = np.zeros((n_frames, NUM_POINTS, 3))
+    prev = np.zeros((NUM_POINTS, 3))
+    for t in range(n_frames):
+        cur = out[t]
+        if all_blend[t]:
+            # Trường hợp phổ biến: cả 3 phần đều detect được → 2 phép toán trên cả frame
+            np.multiply(prev, beta, out=cur)
+            cur += scaled[t]
+        else:
+            cur[...] = prev
+            for p, (lo, hi) in enumerate(parts):
+                if blend[t][p]:
+                    seg = cur[lo:hi]
+                    seg *= beta
+                    seg += scaled[t, lo:hi]
+                elif take[t][p]:
+                    cur[lo:hi] = raw[t, lo:hi]
+        prev = cur
+
+    return out.astype(np.float32).reshape(n_frames, NUM_FEATURES)
+
+
+class ClipLandmarker:
+    """
+    Landmark từng frame của 1 clip theo thứ tự vào 1 buffer (T, 48, 3) float32
+    cấp phát sẵn; smoothing chạy 1 lần trên cả chuỗi ở to_array().
+    """
+
+    def __init__(self, holistic, alpha=0.5, capacity=100):
+        self.holistic = holistic
+        self.alpha = alpha
+        self.raw = np.empty((max(capacity, 1), NUM_POINTS, 3), dtype=np.float32)
+        self.n_frames = 0
+
+    def _next_row(self):
+        if self.n_frames == len(self.raw):
+            grown = np.empty((2 * len(self.raw), NUM_POINTS, 3), dtype=np.float32)
+            grown[: self.n_frames] = self.raw
+            self.raw = grown
+        self.n_frames += 1
+        return self.raw[self.n_frames - 1]
+
+    def add_frame(self, rgb):
+        fill_raw_keypoints(self.holistic.process(rgb), self._next_row())
+
+    def repeat_frame(self):
+        """Frame bị bỏ qua (không chạy Holistic): dùng lại landmark thô của frame trước"""
+        row = self._next_row()
+        if self.n_frames > 1:
+            row[...] = self.raw[self.n_frames - 2]
+        else:
+            row[...] = np.nan
+
+    def __len__(self):
+        return self.n_frames
+
+    def to_array(self):
+        """(T, 144) float32, đã smooth"""
+        return smooth_keypoint_sequence(self.raw[: self.n_frames], alpha=self.alpha)
@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""
+Microbenchmark: latency LSTMClassifier trên CPU theo từng backend suy luận
+(eager | torchscript | onnx | int8), batch 1 và batch 8, kèm sai lệch logits
+so với eager.
+
+    python benchmarks/bench_backends.py --length 100 --repeat 50
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import torch
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.inference_backends import BACKENDS, create_backend, parity_check  # noqa: E402
+from app.model_handler import load_model  # noqa: E402
+
+
+def _time(backend, x, repeat):
+    backend(x)  # warm-up
+    start = time.perf_counter()
+    for _ in range(repeat):
+        backend(x)
+    return (time.perf_counter() - start) / repeat
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--model", default="model/lstm_attn.pth")
+    parser.add_argument("--length", type=int, default=100)
+    parser.add_argument("--repeat", type=int, default=50)
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 8])
+    parser.add_argument("--threads", type=int, default=None, help="torch.set_num_threads")
+    parser.add_argument("--backends", nargs="+", choices=BACKENDS, default=list(BACKENDS))
+    args = parser.parse_args()
+
+    if args.threads:
+        torch.set_num_threads(args.threads)
+    model = load_model(args.model, device="cpu")
+
+    header = f"{'backend':<12}{'max |Δlogits|':>15}" + "".join(f"{f'b={b} ms':>12}" for b in args.batch_sizes)
+    print(header)
+    print("-" * len(header))
+    baseline = {}
+    for name in args.backends:
+        backend = create_backend(name, model)
+        diff = parity_check(backend, model)
+        row = f"{name:<12}{diff:>15.2e}"
+        for b in args.batch_sizes:
+            x = torch.rand(b, args.length, model.lstm.input_size)
+            ms = _time(backend, x, args.repeat) * 1000
+            baseline.setdefault(b, ms)  # backend đầu tiên (mặc định eager) làm mốc
+            row += f"{ms:>7.2f} {baseline[b] / ms:>3.1f}x"
+        print(row)
+
+
+if __name__ == "__main__":
+    main()
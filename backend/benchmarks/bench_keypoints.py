@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+Microbenchmark: trích keypoint + smoothing cho 1 clip.
+
+So sánh đường cũ (extract_frame_keypoints từng frame + np.array(sequence))
+với đường mới (fill_raw_keypoints vào buffer (T, 48, 3) + smooth_keypoint_sequence),
+dùng kết quả Holistic giả lập bằng protobuf landmark thật, và kiểm tra 2 đường
+cho ra cùng 1 mảng (T, 144).
+
+    python benchmarks/bench_keypoints.py --frames 100 --repeat 50
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+from types import SimpleNamespace
+
+import numpy as np
+from mediapipe.framework.formats import landmark_pb2
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.utils import (  # noqa: E402
+    NUM_POINTS,
+    extract_frame_keypoints,
+    fill_raw_keypoints,
+    smooth_keypoint_sequence,
+)
+
+
+def _landmark_list(rng, n, with_visibility=False):
+    lms = landmark_pb2.NormalizedLandmarkList()
+    for x, y, z in rng.random((n, 3)):
+        lm = lms.landmark.add()
+        lm.x, lm.y, lm.z = x, y, z
+        if with_visibility:
+            lm.visibility = 0.9
+            lm.presence = 0.9
+    return lms
+
+
+def make_results(n_frames, seed=0, drop_rate=0.2):
+    """Kết quả Holistic giả: mỗi phần (pose / tay trái / tay phải) mất detect với xác suất drop_rate"""
+    rng = np.random.default_rng(seed)
+    results = []
+    for _ in range(n_frames):
+        results.append(SimpleNamespace(
+            pose_landmarks=_landmark_list(rng, 33, with_visibility=True) if rng.random() > drop_rate else None,
+            left_hand_landmarks=_landmark_list(rng, 21) if rng.random() > drop_rate else None,
+            right_hand_landmarks=_landmark_list(rng, 21) if rng.random() > drop_rate else None,
+        ))
+    return results
+
+
+def per_frame_path(results, alpha):
+    sequence = []
+    prev_arm = prev_left = prev_right = None
+    for res in results:
+        frame_kp, prev_arm, prev_left, prev_right = extract_frame_keypoints(
+            res, prev_arm, prev_left, prev_right, alpha=alpha
+        )
+        sequence.append(frame_kp)
+    return np.array(sequence, dtype=np.float32)
+
+
+def vectorized_path(results, alpha, raw):
+    for t, res in enumerate(results):
+        fill_raw_keypoints(res, raw[t])
+    return smooth_keypoint_sequence(raw[: len(results)], alpha=alpha)
+
+
+def bench(fn, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return np.median(times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--frames", type=int, default=100)
+    parser.add_argument("--repeat", type=int, default=50)
+    parser.add_argument("--alpha", type=float, default=0.5)
+    args = parser.parse_args()
+
+    results = make_results(args.frames)
+    raw = np.empty((args.frames, NUM_POINTS, 3), dtype=np.float32)
+
+    expected = per_frame_path(results, args.alpha)
+    actual = vectorized_path(results, args.alpha, raw)
+    assert np.array_equal(expected, actual), "vectorized path differs from extract_frame_keypoints"
+
+    t_old = bench(lambda: per_frame_path(results, args.alpha), args.repeat)
+    t_new = bench(lambda: vectorized_path(results, args.alpha, raw), args.repeat)
+    t_smooth = bench(lambda: smooth_keypoint_sequence(raw, alpha=args.alpha), args.repeat)
+
+    print(f"frames={args.frames} repeat={args.repeat} (median, identical output)")
+    print(f"  per-frame extract_frame_keypoints : {t_old * 1e3:8.3f} ms  ({t_old / args.frames * 1e6:6.1f} us/frame)")
+    print(f"  preallocated + vectorized smooth  : {t_new * 1e3:8.3f} ms  ({t_new / args.frames * 1e6:6.1f} us/frame)")
+    print(f"    of which smooth_keypoint_sequence: {t_smooth * 1e3:8.3f} ms")
+    print(f"  speedup: {t_old / t_new:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
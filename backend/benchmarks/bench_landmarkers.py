@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+So sánh landmarker "holistic" (như demo) với "light" (Pose + Hands trên ROI cổ tay)
+trên video thật: latency mỗi frame và mức trùng khớp dự đoán của LSTMClassifier.
+
+Mỗi video được cắt thành các clip `--window` frame; cả 2 landmarker chạy trên
+cùng các clip (reset giữa các clip), rồi so argmax của model.
+
+    python benchmarks/bench_landmarkers.py video1.mp4 video2.mp4 --window 100
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import cv2
+import numpy as np
+import torch
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.light_landmarker import create_landmarker  # noqa: E402
+from app.model_handler import load_model  # noqa: E402
+from app.utils import ClipLandmarker  # noqa: E402
+
+
+def read_clips(paths, window):
+    """Đọc các video → list clip, mỗi clip là list frame RGB"""
+    clips = []
+    for path in paths:
+        cap = cv2.VideoCapture(str(path))
+        frames = []
+        while True:
+            ok, bgr = cap.read()
+            if not ok:
+                break
+            frames.append(cv2.cvtColor(bgr, cv2.COLOR_BGR2RGB))
+        cap.release()
+        clips.extend(frames[i : i + window] for i in range(0, len(frames), window))
+    return [clip for clip in clips if clip]
+
+
+def run_landmarker(landmarker, clips, alpha):
+    """Landmark tất cả clip → (list (T, 144), thời gian mỗi frame)"""
+    landmarker.process(np.zeros((256, 256, 3), dtype=np.uint8))  # warm-up
+    sequences, elapsed, n_frames = [], 0.0, 0
+    for frames in clips:
+        landmarker.reset()
+        clip = ClipLandmarker(landmarker, alpha=alpha, capacity=len(frames))
+        start = time.perf_counter()
+        for rgb in frames:
+            clip.add_frame(rgb)
+        elapsed += time.perf_counter() - start
+        n_frames += len(frames)
+        sequences.append(clip.to_array())
+    landmarker.close()
+    return sequences, elapsed / n_frames
+
+
+def predict(model, sequences):
+    with torch.no_grad():
+        return [int(model(torch.from_numpy(seq)[None]).argmax()) for seq in sequences]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("videos", nargs="+")
+    parser.add_argument("--model", default="model/lstm_attn.pth")
+    parser.add_argument("--window", type=int, default=100)
+    parser.add_argument("--alpha", type=float, default=0.5)
+    parser.add_argument("--holistic-complexity", type=int, default=2)
+    parser.add_argument("--light-pose-complexity", type=int, default=0)
+    args = parser.parse_args()
+
+    clips = read_clips(args.videos, args.window)
+    if not clips:
+        sys.exit("No frames read from the given videos")
+    model = load_model(args.model, device="cpu")
+    print(f"{len(clips)} clips, {sum(len(c) for c in clips)} frames")
+
+    results = {}
+    for kind in ("holistic", "light"):
+        landmarker = create_landmarker(
+            kind,
+            model_complexity=args.holistic_complexity,
+            light_pose_complexity=args.light_pose_complexity,
+        )
+        sequences, per_frame = run_landmarker(landmarker, clips, args.alpha)
+        results[kind] = (sequences, per_frame, predict(model, sequences))
+        print(f"{kind:<10} {per_frame * 1000:8.2f} ms/frame")
+
+    ref_seqs, ref_time, ref_preds = results["holistic"]
+    seqs, light_time, preds = results["light"]
+    agreement = np.mean([a == b for a, b in zip(ref_preds, preds)])
+    feature_diff = np.mean([np.abs(a - b).mean() for a, b in zip(ref_seqs, seqs)])
+    print(f"speedup     {ref_time / light_time:.2f}x")
+    print(f"agreement   {agreement:.1%} of clips predict the same class")
+    print(f"mean |Δfeature| {feature_diff:.4f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,335 @@
+#!/usr/bin/env python3
+"""
+Benchmark từng stage của đường /predict, offline và lặp lại được.
+
+Clip JPEG tổng hợp (hình chuyển động + nhiễu, kích thước tuỳ chọn) hoặc cắt từ
+video thu sẵn (--video). Đo riêng từng stage trên cùng các clip:
+
+    decode      FrameDecoder.decode_rgb (base64 → RGB, như server)     / frame
+    holistic    Holistic.process                                       / frame
+    extract     extract_frame_keypoints (đường demo, từng frame)       / frame
+    keypoints   fill_raw_keypoints + smooth_keypoint_sequence (server) / clip
+    tensor      (T, 144) numpy → tensor (1, T, 144) trên device        / clip
+    forward     LSTMClassifier forward (no_grad)                       / clip
+
+rồi end-to-end POST /predict với 1..N client đồng thời (in-process qua
+TestClient, hoặc --url tới server đang chạy). Kết quả JSON: p50/p95/p99,
+mean, throughput; `compare` in chênh lệch giữa 2 lần chạy.
+
+    python benchmarks/bench_pipeline.py run --frames 60 --width 640 --height 480 \\
+        --clips 4 --concurrency 1 2 4 --out bench/base.json
+    python benchmarks/bench_pipeline.py run --video rec.mp4 --out bench/new.json
+    python benchmarks/bench_pipeline.py compare bench/base.json bench/new.json
+
+Holistic trên clip tổng hợp gần như không detect được gì (nhanh hơn thực tế);
+dùng --video để có số liệu sát với production.
+"""
+
+import argparse
+import base64
+import json
+import os
+import platform
+import sys
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+
+def make_synthetic_clips(n_clips, n_frames, width, height, quality, seed=0):
+    """Clip JPEG base64: nền nhiễu + 2 "bàn tay" di chuyển, mỗi frame khác frame trước"""
+    import cv2
+
+    rng = np.random.default_rng(seed)
+    clips = []
+    for _ in range(n_clips):
+        background = rng.integers(60, 180, (height, width, 3), dtype=np.uint8)
+        start = rng.random((2, 2)) * (width * 0.4, height * 0.4) + (width * 0.3, height * 0.3)
+        velocity = rng.normal(0, 0.01, (2, 2)) * (width, height)
+        radius = max(width // 20, 4)
+        frames = []
+        for t in range(n_frames):
+            img = background.copy()
+            for center in start + velocity * t:
+                cv2.circle(img, (int(center[0]) % width, int(center[1]) % height), radius, (200, 170, 150), -1)
+            ok, buf = cv2.imencode(".jpg", img, [cv2.IMWRITE_JPEG_QUALITY, quality])
+            frames.append(base64.b64encode(buf.tobytes()).decode())
+        clips.append(frames)
+    return clips
+
+
+def read_video_clips(paths, n_frames, width, height, quality, max_clips):
+    """Cắt video thành clip n_frames frame, resize nếu có --width/--height, encode lại JPEG base64"""
+    import cv2
+
+    clips = []
+    for path in paths:
+        cap = cv2.VideoCapture(str(path))
+        frames = []
+        while len(clips) < max_clips:
+            ok, bgr = cap.read()
+            if not ok:
+                break
+            if width and height:
+                bgr = cv2.resize(bgr, (width, height), interpolation=cv2.INTER_AREA)
+            ok, buf = cv2.imencode(".jpg", bgr, [cv2.IMWRITE_JPEG_QUALITY, quality])
+            frames.append(base64.b64encode(buf.tobytes()).decode())
+            if len(frames) == n_frames:
+                clips.append(frames)
+                frames = []
+        cap.release()
+    return clips
+
+
+def summarize(times, items=None):
+    """times: list giây mỗi lần đo → ms p50/p95/p99/mean + throughput (items / giây tổng)"""
+    arr = np.asarray(times, dtype=np.float64) * 1000
+    total = float(np.sum(times))
+    return {
+        "n": len(times),
+        "mean_ms": float(arr.mean()),
+        "p50_ms": float(np.percentile(arr, 50)),
+        "p95_ms": float(np.percentile(arr, 95)),
+        "p99_ms": float(np.percentile(arr, 99)),
+        "throughput_per_s": (items if items is not None else len(times)) / total if total else 0.0,
+    }
+
+
+def bench_stages(clips, args):
+    """Đo từng stage tuần tự, 1 thread, trên cùng các clip (Holistic reset giữa các clip)"""
+    import torch
+
+    from app.light_landmarker import create_landmarker
+    from app.model_handler import load_model
+    from app.utils import (
+        NUM_POINTS,
+        FrameDecoder,
+        extract_frame_keypoints,
+        fill_raw_keypoints,
+        smooth_keypoint_sequence,
+    )
+
+    if args.threads:
+        torch.set_num_threads(args.threads)
+    device = "cuda" if torch.cuda.is_available() and not args.cpu else "cpu"
+    model = load_model(args.model, device=device)
+    decoder = FrameDecoder(target_width=args.decode_width)
+    landmarker = create_landmarker(args.landmarker, model_complexity=args.holistic_complexity)
+    landmarker.process(np.zeros((256, 256, 3), dtype=np.uint8))  # warm-up
+
+    times = {name: [] for name in ("decode", "holistic", "extract", "keypoints", "tensor", "forward")}
+    for _ in range(args.repeat):
+        for frames in clips:
+            landmarker.reset()
+            raw = np.empty((len(frames), NUM_POINTS, 3), dtype=np.float32)
+            prev_arm = prev_left = prev_right = None
+            for t, frame in enumerate(frames):
+                start = time.perf_counter()
+                rgb = decoder.decode_rgb(frame)
+                times["decode"].append(time.perf_counter() - start)
+
+                start = time.perf_counter()
+                results = landmarker.process(rgb)
+                times["holistic"].append(time.perf_counter() - start)
+
+                start = time.perf_counter()
+                _, prev_arm, prev_left, prev_right = extract_frame_keypoints(
+                    results, prev_arm, prev_left, prev_right, alpha=args.alpha
+                )
+                times["extract"].append(time.perf_counter() - start)
+                fill_raw_keypoints(results, raw[t])
+
+            start = time.perf_counter()
+            seq_np = smooth_keypoint_sequence(raw, alpha=args.alpha)
+            times["keypoints"].append(time.perf_counter() - start)
+
+            start = time.perf_counter()
+            x = torch.from_numpy(seq_np).unsqueeze(0).to(device)
+            times["tensor"].append(time.perf_counter() - start)
+
+            with torch.no_grad():
+                model(x)  # warm-up cho đúng độ dài T
+                if device == "cuda":
+                    torch.cuda.synchronize()
+                start = time.perf_counter()
+                model(x)
+                if device == "cuda":
+                    torch.cuda.synchronize()
+                times["forward"].append(time.perf_counter() - start)
+    landmarker.close()
+
+    n_frames = sum(len(c) for c in clips) * args.repeat
+    return {
+        name: {
+            **summarize(values, items=n_frames if name in ("decode", "holistic", "extract") else None),
+            "unit": "frame" if name in ("decode", "holistic", "extract") else "clip",
+        }
+        for name, values in times.items()
+    }
+
+
+def _client(args):
+    """Client HTTP: tới --url, hoặc TestClient chạy app.main ngay trong process"""
+    if args.url:
+        import httpx
+
+        return httpx.Client(base_url=args.url, timeout=300)
+
+    os.environ.setdefault("RECOGNIZER_BACKGROUND_LOAD", "0")
+    os.environ.setdefault("HOLISTIC_MODEL_COMPLEXITY", str(args.holistic_complexity))
+    os.environ.setdefault("HOLISTIC_POOL_SIZE", str(max(args.concurrency)))
+    os.environ.setdefault("RECOGNITION_QUEUE_SIZE", str(max(args.concurrency) * 4))
+    from fastapi.testclient import TestClient
+
+    from app.main import app
+
+    return TestClient(app)
+
+
+def bench_end_to_end(clips, args):
+    """POST /predict: mỗi mức concurrency, `concurrency` thread gửi lần lượt các clip"""
+    results = {}
+    with _client(args) as client:
+        client.post("/predict", json={"data": clips[0]})  # warm-up
+        for concurrency in args.concurrency:
+            latencies, errors, lock = [], [], threading.Lock()
+
+            def worker(idx, concurrency=concurrency, latencies=latencies, errors=errors, lock=lock):
+                headers = {"X-Session-Id": f"bench-{idx}"}
+                for i in range(args.requests):
+                    frames = clips[(idx + i) % len(clips)]
+                    start = time.perf_counter()
+                    r = client.post("/predict", json={"data": frames}, headers=headers)
+                    elapsed = time.perf_counter() - start
+                    with lock:
+                        (latencies if r.status_code == 200 else errors).append(elapsed)
+
+            threads = [threading.Thread(target=worker, args=(i,)) for i in range(concurrency)]
+            start = time.perf_counter()
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+            wall = time.perf_counter() - start
+
+            stats = summarize(latencies) if latencies else {"n": 0}
+            stats["throughput_per_s"] = len(latencies) / wall
+            stats["frames_per_s"] = len(latencies) * len(clips[0]) / wall
+            stats["errors"] = len(errors)
+            results[str(concurrency)] = stats
+            print(f"  concurrency {concurrency:>3}: p50 {stats.get('p50_ms', 0):8.1f} ms  "
+                  f"p95 {stats.get('p95_ms', 0):8.1f} ms  {stats['throughput_per_s']:6.2f} req/s  "
+                  f"errors {len(errors)}")
+    return results
+
+
+def run(args):
+    if args.video:
+        clips = read_video_clips(args.video, args.frames, args.width, args.height, args.quality, args.clips)
+    else:
+        clips = make_synthetic_clips(args.clips, args.frames, args.width, args.height, args.quality, args.seed)
+    if not clips:
+        sys.exit("No clips (video shorter than --frames?)")
+    print(f"{len(clips)} clips x {len(clips[0])} frames")
+
+    report = {
+        "meta": {
+            "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "args": {k: v for k, v in vars(args).items() if k != "func"},
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+        },
+    }
+    if not args.skip_stages:
+        print("stages:")
+        report["stages"] = bench_stages(clips, args)
+        for name, stats in report["stages"].items():
+            print(f"  {name:<10} p50 {stats['p50_ms']:8.3f} ms  p95 {stats['p95_ms']:8.3f} ms  "
+                  f"p99 {stats['p99_ms']:8.3f} ms  / {stats['unit']}")
+    if not args.skip_e2e:
+        print("end-to-end /predict:")
+        report["end_to_end"] = bench_end_to_end(clips, args)
+
+    if args.out:
+        Path(args.out).parent.mkdir(parents=True, exist_ok=True)
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"Wrote {args.out}")
+
+
+def _diff_line(name, base, new, keys):
+    cells = []
+    for key in keys:
+        if key not in base or key not in new:
+            continue
+        b, n = base[key], new[key]
+        change = (n - b) / b * 100 if b else 0.0
+        cells.append(f"{key} {b:9.2f} → {n:9.2f} ({change:+6.1f}%)")
+    print(f"  {name:<12} " + "  ".join(cells))
+
+
+def compare(args):
+    with open(args.base, encoding="utf-8") as f:
+        base = json.load(f)
+    with open(args.new, encoding="utf-8") as f:
+        new = json.load(f)
+    keys = ("p50_ms", "p95_ms", "p99_ms", "throughput_per_s")
+
+    print(f"base: {args.base} ({base['meta']['created_at']})")
+    print(f"new:  {args.new} ({new['meta']['created_at']})")
+    if "stages" in base and "stages" in new:
+        print("stages:")
+        for name in base["stages"]:
+            if name in new["stages"]:
+                _diff_line(name, base["stages"][name], new["stages"][name], keys)
+    if "end_to_end" in base and "end_to_end" in new:
+        print("end-to-end (concurrency):")
+        for level in base["end_to_end"]:
+            if level in new["end_to_end"]:
+                _diff_line(level, base["end_to_end"][level], new["end_to_end"][level], keys)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("run", help="chạy benchmark, ghi JSON")
+    p.add_argument("--video", nargs="+", help="video thu sẵn thay cho clip tổng hợp")
+    p.add_argument("--clips", type=int, default=4)
+    p.add_argument("--frames", type=int, default=60, help="số frame mỗi clip")
+    p.add_argument("--width", type=int, default=640)
+    p.add_argument("--height", type=int, default=480)
+    p.add_argument("--quality", type=int, default=80, help="chất lượng JPEG")
+    p.add_argument("--seed", type=int, default=0)
+    p.add_argument("--repeat", type=int, default=1, help="số lượt đo stage trên toàn bộ clip")
+    p.add_argument("--model", default="model/lstm_attn.pth")
+    p.add_argument("--landmarker", default="holistic", choices=("holistic", "light"))
+    p.add_argument("--holistic-complexity", type=int, default=2)
+    p.add_argument("--decode-width", type=int, default=640, help="DECODE_TARGET_WIDTH của FrameDecoder")
+    p.add_argument("--alpha", type=float, default=0.5)
+    p.add_argument("--threads", type=int, default=None, help="torch.set_num_threads")
+    p.add_argument("--cpu", action="store_true", help="đo forward trên CPU kể cả khi có CUDA")
+    p.add_argument("--concurrency", type=int, nargs="+", default=[1, 2, 4])
+    p.add_argument("--requests", type=int, default=4, help="số request mỗi client ở mỗi mức concurrency")
+    p.add_argument("--url", help="server đang chạy (mặc định: app.main in-process)")
+    p.add_argument("--skip-stages", action="store_true")
+    p.add_argument("--skip-e2e", action="store_true")
+    p.add_argument("--out", help="file JSON kết quả")
+    p.set_defaults(func=run)
+
+    p = sub.add_parser("compare", help="so sánh 2 file JSON kết quả")
+    p.add_argument("base")
+    p.add_argument("new")
+    p.set_defaults(func=compare)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+So sánh vector store của catalog search (src/shared/vector_store.py): Chroma và
+NumPy exact (float32 / float16) trên cùng bộ vector.
+
+Vector lấy từ index NumPy đã lưu (--from-index search_index/unit_descriptions)
+hoặc sinh ngẫu nhiên theo cụm (giống nhiều mô tả gần nhau của cùng 1 unit).
+Đo: thời gian nạp, latency 1 query (p50/p95), throughput query theo batch, và
+parity top-k của từng backend NumPy so với Chroma.
+
+    python benchmarks/bench_vector_store.py --docs 5000 --dim 768 --queries 200 --out bench/vs.json
+    python benchmarks/bench_vector_store.py --from-index search_index/unit_descriptions
+
+Cần chromadb + langchain-community (requirements của catalog API).
+"""
+
+import argparse
+import json
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+from shared.vector_store import ChromaVectorStore, NumpyVectorStore, parity_check  # noqa: E402
+
+
+def make_vectors(n_docs, dim, n_queries, seed=0):
+    """Vector theo cụm: mỗi "unit" ~4 mô tả quanh 1 tâm; query = mô tả + nhiễu"""
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(max(n_docs // 4, 1), dim))
+    docs = centers[rng.integers(0, len(centers), n_docs)] + rng.normal(scale=0.5, size=(n_docs, dim))
+    queries = docs[rng.integers(0, n_docs, n_queries)] + rng.normal(scale=0.8, size=(n_queries, dim))
+    # Chuẩn hoá L2 như output của Gemini: khoảng cách L2 của Chroma và cosine cho cùng thứ hạng
+    docs /= np.linalg.norm(docs, axis=1, keepdims=True)
+    queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+    return docs.astype(np.float32), queries.astype(np.float32)
+
+
+def load_vectors(prefix, n_queries, seed=0):
+    store = NumpyVectorStore(prefix)
+    _, matrix, _, _, _ = store._state
+    docs = np.asarray(matrix, dtype=np.float32)
+    rng = np.random.default_rng(seed)
+    queries = docs[rng.integers(0, len(docs), n_queries)] + rng.normal(scale=0.02, size=(n_queries, docs.shape[1]))
+    return docs, queries.astype(np.float32)
+
+
+def fill(store, docs, batch=1000):
+    start = time.perf_counter()
+    for i in range(0, len(docs), batch):
+        ids = [f"doc-{j}" for j in range(i, min(i + batch, len(docs)))]
+        store.upsert(ids, docs[i:i + batch], [""] * len(ids), [{"unit_id": int(j.split("-")[1]) // 4} for j in ids])
+    return time.perf_counter() - start
+
+
+def time_queries(store, queries, k, batch_sizes):
+    single = []
+    for q in queries:
+        start = time.perf_counter()
+        store.search([q], k)
+        single.append(time.perf_counter() - start)
+    result = {
+        "single_p50_ms": float(np.percentile(single, 50) * 1000),
+        "single_p95_ms": float(np.percentile(single, 95) * 1000),
+        "batched_qps": {},
+    }
+    for size in batch_sizes:
+        start = time.perf_counter()
+        for i in range(0, len(queries), size):
+            store.search(queries[i:i + size], k)
+        result["batched_qps"][str(size)] = len(queries) / (time.perf_counter() - start)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--docs", type=int, default=5000)
+    parser.add_argument("--dim", type=int, default=768, help="text-embedding-004: 768")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=15, help="search_k của HybridSearchService = top_k * 3")
+    parser.add_argument("--batch", type=int, nargs="+", default=[1, 8, 64])
+    parser.add_argument("--from-index", help="prefix index NumPy đã lưu (path của NumpyVectorStore)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", help="file JSON kết quả")
+    args = parser.parse_args()
+
+    if args.from_index:
+        docs, queries = load_vectors(args.from_index, args.queries, args.seed)
+    else:
+        docs, queries = make_vectors(args.docs, args.dim, args.queries, args.seed)
+    print(f"{len(docs)} vectors x {docs.shape[1]}, {len(queries)} queries, k={args.k}")
+
+    report = {"docs": len(docs), "dim": int(docs.shape[1]), "k": args.k, "backends": {}}
+    with tempfile.TemporaryDirectory() as tmp:
+        stores = {
+            "chroma": ChromaVectorStore(tmp, "bench"),
+            "numpy-float32": NumpyVectorStore(f"{tmp}/f32", dtype="float32"),
+            "numpy-float16": NumpyVectorStore(f"{tmp}/f16", dtype="float16"),
+        }
+        for name, store in stores.items():
+            entry = {"load_seconds": fill(store, docs)}
+            entry.update(time_queries(store, queries, args.k, args.batch))
+            if name != "chroma":
+                entry["parity_vs_chroma"] = parity_check(stores["chroma"], store, queries, args.k)
+                start = time.perf_counter()
+                store.persist()
+                reloaded = NumpyVectorStore(store.path, dtype=store.dtype.name)
+                entry["save_load_seconds"] = time.perf_counter() - start
+                entry["reload_parity"] = parity_check(store, reloaded, queries, args.k)["recall_min"]
+            report["backends"][name] = entry
+            print(f"{name:14s} {json.dumps(entry)}")
+
+    if args.out:
+        Path(args.out).parent.mkdir(parents=True, exist_ok=True)
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
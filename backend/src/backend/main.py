@@ -3,7 +3,7 @@
 FastAPI Backend Server for Sign Language Database
 """
 
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Response
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 from typing import Optional, List
@@ -15,8 +15,11 @@ import os
 src_path = Path(__file__).parent.parent
 sys.path.insert(0, str(src_path))
 
+from shared import metrics
+from shared.http_metrics import RequestMetricsMiddleware, render as render_metrics
 from shared.database import DatabaseManager
 from shared.hybrid_search import get_search_service, initialize_search_service
+from shared.unit_change_feed import UnitChangeFeed
 
 # Initialize FastAPI app
 app = FastAPI(
@@ -34,9 +37,18 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Per-endpoint latency histograms for /metrics
+app.add_middleware(RequestMetricsMiddleware, histogram=metrics.REQUEST_LATENCY)
+
 # Initialize database manager
 db_manager = DatabaseManager()
 
+# Poll the unit table and re-index only changed units (0 = refresh only on restart)
+UNIT_POLL_SECONDS = float(os.getenv("UNIT_POLL_SECONDS", "0"))
+# Timestamp column for incremental polling; unset = diff row hashes of all units
+UNIT_CHANGE_COLUMN = os.getenv("UNIT_CHANGE_COLUMN") or None
+unit_feed = None
+
 
 # Request/Response models
 class SearchRequest(BaseModel):
@@ -55,7 +67,8 @@ async def root():
         "endpoints": {
             "topics": "/api/topics",
             "lessons_by_topic": "/api/topics/{topic_id}/lessons",
-            "all_lessons": "/api/lessons"
+            "all_lessons": "/api/lessons",
+            "metrics": "/metrics"
         }
     }
 
@@ -152,6 +165,13 @@ async def health_check():
     return {"status": "healthy", "service": "Sign Language Learning API"}
 
 
+@app.get("/metrics")
+async def prometheus_metrics():
+    """Prometheus metrics: request latency, Supabase round-trips, embeddings, search legs"""
+    body, content_type = render_metrics()
+    return Response(content=body, media_type=content_type)
+
+
 @app.post("/api/search/units")
 async def search_units(request: SearchRequest):
     """
@@ -168,17 +188,21 @@ async def search_units(request: SearchRequest):
             units = db_manager.get_all_units()
             initialize_search_service(units)
         
-        # Perform hybrid search
-        results = search_service.search(
+        # Perform hybrid search (both legs concurrently, off the event loop)
+        search = await search_service.asearch(
             query=request.query,
             top_k=request.top_k
         )
+        results = search["results"]
         
         return {
             "success": True,
             "query": request.query,
             "count": len(results),
-            "data": results
+            "data": results,
+            # True when a leg timed out / failed, e.g. keyword-only results
+            "degraded": search["degraded"],
+            "legs": search["legs"]
         }
     except Exception as e:
         print(f"Error in hybrid search: {str(e)}")
@@ -190,6 +214,8 @@ async def search_units(request: SearchRequest):
 @app.on_event("startup")
 async def startup_event():
     """Initialize search service on startup"""
+    global unit_feed
+    units = None
     try:
         print("🚀 Starting up application...")
         # Pre-load units for search
@@ -203,6 +229,27 @@ async def startup_event():
     except Exception as e:
         print(f"⚠️ Warning: Could not initialize search service: {str(e)}")
         print("Search service will initialize on first request")
+    
+    if UNIT_POLL_SECONDS > 0:
+        try:
+            search_service = get_search_service()
+            unit_feed = UnitChangeFeed(db_manager, search_service, interval=UNIT_POLL_SECONDS,
+                                       change_column=UNIT_CHANGE_COLUMN)
+            # Row-hash mode can diff against the startup rows; change-column mode
+            # needs the column, so its first poll re-syncs (no re-embedding)
+            if units and search_service.is_initialized and not UNIT_CHANGE_COLUMN:
+                unit_feed.prime(units)
+            unit_feed.start()
+            print(f"🔄 Unit change feed polling every {UNIT_POLL_SECONDS}s")
+        except Exception as e:
+            print(f"⚠️ Warning: Could not start unit change feed: {str(e)}")
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Stop the unit change feed"""
+    if unit_feed is not None:
+        unit_feed.stop()
 
 
 if __name__ == "__main__":
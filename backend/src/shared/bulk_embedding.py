@@ -0,0 +1,149 @@
+"""
+Bulk embedding for index builds
+
+Splits a large list of texts into batches, keeps a bounded number of batches
+in flight, paces requests with a token bucket and retries throttled (429)
+batches with exponential backoff. Each finished batch is handed to a callback
+immediately, so whatever was stored before a failure does not need to be
+embedded again on the next run.
+"""
+
+import random
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Callable, List, Optional
+
+from langchain_core.embeddings import Embeddings
+
+
+class TokenBucket:
+    """Thread-safe token bucket: `rate` tokens per second, bursts up to `capacity`"""
+    
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+    
+    def acquire(self, tokens: float = 1.0):
+        """Block until `tokens` are available, then take them"""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return
+                wait_seconds = (tokens - self._tokens) / self.rate
+            time.sleep(wait_seconds)
+
+
+def is_rate_limited(error: Exception) -> bool:
+    """True for provider throttling (HTTP 429 / RESOURCE_EXHAUSTED), however the client wraps it"""
+    for attr in ("status_code", "code"):
+        if getattr(error, attr, None) == 429:
+            return True
+    message = str(error)
+    return "429" in message or "RESOURCE_EXHAUSTED" in message or "rate limit" in message.lower()
+
+
+class BulkEmbedder:
+    """Batched, rate-limited embed_documents with retry and progress reporting"""
+    
+    def __init__(self, embeddings: Embeddings, batch_size: int = 100, max_in_flight: int = 4,
+                 requests_per_minute: float = 1500, max_retries: int = 6, backoff_seconds: float = 1.0,
+                 progress_interval: float = 5.0):
+        """
+        Args:
+            embeddings: Embeddings whose embed_documents is called once per batch
+            batch_size: Texts per request
+            max_in_flight: Batches embedded concurrently
+            requests_per_minute: Request budget shared by all in-flight batches
+            max_retries: Retries per batch on a rate-limit error
+            backoff_seconds: First retry delay, doubled per attempt (with jitter)
+            progress_interval: Seconds between progress lines
+        """
+        self.embeddings = embeddings
+        self.batch_size = max(1, batch_size)
+        self.max_in_flight = max(1, max_in_flight)
+        self.bucket = TokenBucket(requests_per_minute / 60.0, capacity=self.max_in_flight)
+        self.max_retries = max_retries
+        self.backoff_seconds = backoff_seconds
+        self.progress_interval = progress_interval
+        self.retries = 0
+    
+    def _embed_batch(self, texts: List[str]) -> List[List[float]]:
+        for attempt in range(self.max_retries + 1):
+            self.bucket.acquire()
+            try:
+                return self.embeddings.embed_documents(texts)
+            except Exception as e:
+                if not is_rate_limited(e) or attempt == self.max_retries:
+                    raise
+                self.retries += 1
+                delay = self.backoff_seconds * (2 ** attempt) * random.uniform(0.5, 1.5)
+                print(f"Embedding rate limited, retrying batch in {delay:.1f}s ({attempt + 1}/{self.max_retries})")
+                time.sleep(delay)
+    
+    def embed(self, texts: List[str], on_batch: Optional[Callable[[int, List[List[float]]], None]] = None) -> int:
+        """
+        Embed `texts` batch by batch
+        
+        Args:
+            texts: Texts to embed
+            on_batch: Called as on_batch(start, vectors) from the calling thread
+                for every finished batch, where vectors cover texts[start:start + len(vectors)]
+        
+        Returns:
+            Number of texts embedded. If a batch still fails after its retries,
+            pending batches are cancelled and the error is raised; batches
+            already passed to on_batch stay done.
+        """
+        total = len(texts)
+        if not total:
+            return 0
+        
+        starts = iter(range(0, total, self.batch_size))
+        done = 0
+        start_time = last_report = time.perf_counter()
+        
+        with ThreadPoolExecutor(max_workers=self.max_in_flight, thread_name_prefix="embed") as pool:
+            pending = {}
+            
+            def submit_next():
+                start = next(starts, None)
+                if start is not None:
+                    future = pool.submit(self._embed_batch, texts[start:start + self.batch_size])
+                    pending[future] = start
+            
+            for _ in range(self.max_in_flight):
+                submit_next()
+            
+            try:
+                while pending:
+                    finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in finished:
+                        start = pending.pop(future)
+                        vectors = future.result()
+                        if on_batch is not None:
+                            on_batch(start, vectors)
+                        done += len(vectors)
+                        submit_next()
+                    
+                    now = time.perf_counter()
+                    if now - last_report >= self.progress_interval or done == total:
+                        last_report = now
+                        rate = done / max(now - start_time, 1e-9)
+                        print(
+                            f"Embedded {done}/{total} texts ({100 * done / total:.0f}%), "
+                            f"{rate:.1f} texts/s, eta {(total - done) / rate if rate else 0:.0f}s"
+                        )
+            except BaseException:
+                for future in pending:
+                    future.cancel()
+                raise
+        
+        return done
@@ -5,8 +5,11 @@ Database connection and management utilities using Supabase REST API
 import requests
 from typing import List, Dict, Any, Optional
 import os
+import time
 from dotenv import load_dotenv
 
+from shared.metrics import DB_REQUEST_LATENCY
+
 # Load environment variables
 load_dotenv()
 
@@ -40,12 +43,18 @@ class DatabaseManager:
         """
         url = f"{self.supabase_url}/rest/v1/{endpoint}"
         
+        start = time.perf_counter()
+        outcome = "error"
         try:
             response = requests.get(url, headers=self.headers, params=params)
             response.raise_for_status()
-            return response.json()
+            data = response.json()
+            outcome = "ok"
+            return data
         except requests.exceptions.RequestException as e:
             raise Exception(f"Database error: {str(e)}")
+        finally:
+            DB_REQUEST_LATENCY.labels(endpoint, outcome).observe(time.perf_counter() - start)
     
     # Lesson-specific methods
     def get_lessons_by_topic(self, topic_id: int) -> List[Dict[str, Any]]:
@@ -112,10 +121,12 @@ class DatabaseManager:
         return topics
     
     # Unit-specific methods
+    UNIT_FIELDS = "unit_id,lesson_id,type,text,description,code,order_index,image_url,video_url"
+    
     def get_all_units(self) -> List[Dict[str, Any]]:
         """Get all units from database"""
         params = {
-            "select": "unit_id,lesson_id,type,text,description,code,order_index,image_url,video_url",
+            "select": self.UNIT_FIELDS,
             "order": "lesson_id.asc,order_index.asc"
         }
         units = self._make_request("unit", params=params)
@@ -126,3 +137,37 @@ class DatabaseManager:
                 unit['id'] = unit['unit_id']
         
         return units
+    
+    def get_units_changed_since(self, column: str, since: Optional[str] = None) -> List[Dict[str, Any]]:
+        """
+        Get units whose change-tracking column is at or after `since`
+        
+        The bound is inclusive: a row committed later with the same timestamp
+        as the last one seen would be skipped for good by a strict `gt.`, so
+        callers get those rows again and drop the ones they already have.
+        
+        Args:
+            column: Timestamp column maintained by the database (e.g. updated_at)
+            since: Last value already seen; None returns every unit
+            
+        Returns:
+            Units ordered by `column`, each including `column` and `id`
+        """
+        params = {
+            "select": f"{self.UNIT_FIELDS},{column}",
+            "order": f"{column}.asc"
+        }
+        if since is not None:
+            params[column] = f"gte.{since}"
+        units = self._make_request("unit", params=params)
+        
+        for unit in units:
+            if 'unit_id' in unit:
+                unit['id'] = unit['unit_id']
+        
+        return units
+    
+    def get_unit_ids(self) -> List[int]:
+        """Get the ids of all units (cheap listing used to detect deletions)"""
+        rows = self._make_request("unit", params={"select": "unit_id"})
+        return [row['unit_id'] for row in rows]
@@ -0,0 +1,201 @@
+"""
+Embedding cache for the catalog search
+
+Wraps an Embeddings implementation (Gemini text-embedding-004) with an
+in-memory LRU in front of a local SQLite file, so repeated queries and
+unchanged documents are never sent to the API twice.
+"""
+
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from shared import metrics
+
+_WHITESPACE = re.compile(r"\s+")
+_LOOKUP_CHUNK = 500
+
+
+def normalize_text(text: str) -> str:
+    """NFC-normalize and collapse whitespace so trivially different inputs share one entry"""
+    return _WHITESPACE.sub(" ", unicodedata.normalize("NFC", text)).strip()
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Two-level embedding cache: memory LRU -> SQLite -> wrapped embeddings
+    
+    Entries are keyed by (model, kind, normalized text); kind is "query" or
+    "documents" because Gemini embeds the two with different task types.
+    Entries older than `ttl_seconds` are treated as misses. The SQLite file is
+    trimmed to `max_entries` by least recent access (disk hits refresh it).
+    """
+    
+    def __init__(self, embeddings: Embeddings, model: str, path: Optional[str] = None,
+                 memory_entries: int = 4096, max_entries: int = 100000, ttl_seconds: float = 0):
+        """
+        Args:
+            embeddings: Embeddings used on a cache miss
+            model: Embedding model name, part of every key
+            path: SQLite file; None or "" keeps the cache in memory only
+            memory_entries: Capacity of the in-memory LRU
+            max_entries: Capacity of the SQLite file
+            ttl_seconds: Entry lifetime, 0 = never expires
+        """
+        self.embeddings = embeddings
+        self.model = model
+        self.path = path or None
+        self.memory_entries = memory_entries
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        
+        self._lock = threading.Lock()
+        self._memory = OrderedDict()  # key -> (created_at, float32 vector)
+        self._counts = {kind: {"memory": 0, "disk": 0, "miss": 0} for kind in ("query", "documents")}
+        
+        self._db = None
+        self._disk_entries = 0
+        if self.path:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._db = sqlite3.connect(self.path, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings ("
+                "key TEXT PRIMARY KEY, model TEXT, kind TEXT, vector BLOB, "
+                "created_at REAL, accessed_at REAL)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS embeddings_accessed ON embeddings (accessed_at)")
+            if self.ttl_seconds:
+                self._db.execute("DELETE FROM embeddings WHERE created_at < ?", (time.time() - self.ttl_seconds,))
+            self._db.commit()
+            self._disk_entries = self._db.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+    
+    def _key(self, kind: str, text: str) -> str:
+        return f"{self.model}\x1f{kind}\x1f{text}"
+    
+    def _expired(self, created_at: float, now: float) -> bool:
+        return bool(self.ttl_seconds) and now - created_at > self.ttl_seconds
+    
+    def _lookup(self, kind: str, keys: List[str]) -> Dict[str, np.ndarray]:
+        """Return cached vectors for `keys`, promoting disk hits into memory"""
+        now = time.time()
+        found = {}
+        with self._lock:
+            for key in dict.fromkeys(keys):
+                entry = self._memory.get(key)
+                if entry is not None and not self._expired(entry[0], now):
+                    self._memory.move_to_end(key)
+                    found[key] = entry[1]
+            memory_hits = len(found)
+            
+            missing = [key for key in dict.fromkeys(keys) if key not in found]
+            if self._db is not None and missing:
+                rows = []
+                # Stay below SQLite's bound-parameter limit on large document batches
+                for i in range(0, len(missing), _LOOKUP_CHUNK):
+                    chunk = missing[i:i + _LOOKUP_CHUNK]
+                    rows += self._db.execute(
+                        f"SELECT key, vector, created_at FROM embeddings WHERE key IN ({','.join('?' * len(chunk))})",
+                        chunk
+                    ).fetchall()
+                hits = []
+                for key, blob, created_at in rows:
+                    if self._expired(created_at, now):
+                        continue
+                    vector = np.frombuffer(blob, dtype=np.float32)
+                    found[key] = vector
+                    self._remember(key, created_at, vector)
+                    hits.append(key)
+                if hits:
+                    self._db.executemany("UPDATE embeddings SET accessed_at = ? WHERE key = ?", [(now, k) for k in hits])
+                    self._db.commit()
+            
+            disk_hits = len(found) - memory_hits
+            for result, count in (("memory", memory_hits), ("disk", disk_hits), ("miss", len(missing) - disk_hits)):
+                if count:
+                    self._counts[kind][result] += count
+                    metrics.EMBEDDING_CACHE_REQUESTS.labels(kind, result).inc(count)
+        return found
+    
+    def _remember(self, key: str, created_at: float, vector: np.ndarray):
+        self._memory[key] = (created_at, vector)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+    
+    def _store(self, kind: str, entries: Dict[str, np.ndarray]):
+        now = time.time()
+        with self._lock:
+            for key, vector in entries.items():
+                self._remember(key, now, vector)
+            if self._db is None:
+                return
+            self._db.executemany(
+                "INSERT OR REPLACE INTO embeddings VALUES (?, ?, ?, ?, ?, ?)",
+                [(key, self.model, kind, vector.tobytes(), now, now) for key, vector in entries.items()]
+            )
+            self._disk_entries += len(entries)
+            if self._disk_entries > self.max_entries:
+                # Trim to 90% so eviction runs once per batch of inserts, not on every insert
+                self._disk_entries = self._db.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+                excess = self._disk_entries - int(self.max_entries * 0.9)
+                if excess > 0:
+                    self._db.execute(
+                        "DELETE FROM embeddings WHERE key IN "
+                        "(SELECT key FROM embeddings ORDER BY accessed_at LIMIT ?)", (excess,)
+                    )
+                    self._disk_entries -= excess
+            self._db.commit()
+    
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        normalized = [normalize_text(text) for text in texts]
+        keys = [self._key("documents", text) for text in normalized]
+        found = self._lookup("documents", keys)
+        
+        # Each distinct missing text is embedded once, in a single call
+        missing = {key: text for key, text in zip(keys, normalized) if key not in found}
+        if missing:
+            vectors = self.embeddings.embed_documents(list(missing.values()))
+            fresh = {key: np.asarray(vector, dtype=np.float32) for key, vector in zip(missing, vectors)}
+            self._store("documents", fresh)
+            found.update(fresh)
+        
+        return [found[key].tolist() for key in keys]
+    
+    def embed_query(self, text: str) -> List[float]:
+        normalized = normalize_text(text)
+        key = self._key("query", normalized)
+        found = self._lookup("query", [key])
+        
+        if key not in found:
+            vector = np.asarray(self.embeddings.embed_query(normalized), dtype=np.float32)
+            self._store("query", {key: vector})
+            found[key] = vector
+        
+        return found[key].tolist()
+    
+    def stats(self) -> Dict[str, object]:
+        """Hit / miss counters per kind plus current cache sizes"""
+        with self._lock:
+            return {
+                "path": self.path,
+                "memory_entries": len(self._memory),
+                "disk_entries": self._disk_entries if self._db is not None else 0,
+                "requests": {kind: dict(counts) for kind, counts in self._counts.items()},
+            }
+    
+    def close(self):
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
@@ -0,0 +1,70 @@
+"""
+HTTP request metrics shared by both FastAPI apps
+
+The catalog API (src/backend) and the recognizer (app/) each own their
+histograms; the middleware and the /metrics renderer live here once and take
+the histogram and route labelling as parameters.
+"""
+
+import time
+from typing import Callable, Dict
+
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, Histogram, generate_latest
+
+
+def route_template(scope: Dict) -> str:
+    """
+    Route label for a finished request
+
+    Uses the route template (e.g. /api/topics/{topic_id}) rather than the raw
+    path so the number of series stays bounded; unmatched paths are grouped
+    under "unmatched".
+    """
+    route = scope.get("route")
+    return route.path if route is not None else "unmatched"
+
+
+class RequestMetricsMiddleware:
+    """ASGI middleware observing request latency into a (method, route, status) histogram"""
+
+    def __init__(self, app, histogram: Histogram, route_label: Callable[[Dict], str] = route_template):
+        """
+        Args:
+            app: Wrapped ASGI app
+            histogram: Histogram with method, route and status labels
+            route_label: Maps the ASGI scope (after routing) to the route label
+        """
+        self.app = app
+        self.histogram = histogram
+        self.route_label = route_label
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            self.histogram.labels(
+                scope["method"], self.route_label(scope), str(status)
+            ).observe(time.perf_counter() - start)
+
+
+def render():
+    """
+    Render all registered metrics
+
+    Returns:
+        (body, content type) for the /metrics response
+    """
+    return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
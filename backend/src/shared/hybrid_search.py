@@ -3,39 +3,156 @@ Hybrid Search Service for Sign Language Units
 Combines Semantic Search (Gemini Embeddings) and Keyword Search (BM25)
 """
 
+import asyncio
+import hashlib
 import os
 import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from typing import List, Dict, Any
 from collections import defaultdict
 from langchain_google_genai import GoogleGenerativeAIEmbeddings
-from langchain_community.vectorstores import Chroma
 from langchain_community.retrievers import BM25Retriever
 from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+
+from shared import metrics
+from shared.bulk_embedding import BulkEmbedder
+from shared.embedding_cache import CachedEmbeddings
+from shared.vector_store import clean_metadata, create_vector_store
+
+EMBEDDING_MODEL = "models/text-embedding-004"
+DEFAULT_INDEX_DIR = "search_index"
+DEFAULT_COLLECTION = "unit_descriptions"
+
+
+class LegBusy(Exception):
+    """Every worker of a search leg is taken; the leg is skipped instead of queued"""
+
+
+class BoundedExecutor:
+    """
+    Thread pool that rejects work instead of queueing it
+    
+    A slot stays taken until the call really finishes, even after the caller
+    gave up on it, so calls stuck on a slow upstream can occupy at most
+    `max_workers` threads and never delay anything else.
+    """
+    
+    def __init__(self, max_workers: int, name: str):
+        self.max_workers = max(1, max_workers)
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix=name)
+        self._slots = threading.BoundedSemaphore(self.max_workers)
+    
+    async def run(self, fn, *args):
+        """Run fn(*args) in the pool; raises LegBusy at once when no worker is free"""
+        if not self._slots.acquire(blocking=False):
+            raise LegBusy(f"All {self.max_workers} workers busy")
+        try:
+            future = self._executor.submit(fn, *args)
+        except BaseException:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        return await asyncio.wrap_future(future)
+
+
+def document_id(model: str, unit_id: Any, text: str) -> str:
+    """
+    Stable id for one description variant
+    
+    Changes whenever the text, the owning unit or the embedding model changes,
+    so an unchanged id means the stored embedding can be reused.
+    """
+    raw = f"{model}\x1f{unit_id}\x1f{text}"
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class TimedEmbeddings(Embeddings):
+    """Embeddings wrapper that records Gemini call latency and text counts"""
+    
+    def __init__(self, embeddings: Embeddings):
+        self.embeddings = embeddings
+    
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        metrics.EMBEDDED_TEXTS.labels("documents").inc(len(texts))
+        with metrics.EMBEDDING_DOCUMENTS.time():
+            return self.embeddings.embed_documents(texts)
+    
+    def embed_query(self, text: str) -> List[float]:
+        metrics.EMBEDDED_TEXTS.labels("query").inc()
+        with metrics.EMBEDDING_QUERY.time():
+            return self.embeddings.embed_query(text)
 
 
 class HybridSearchService:
     """Service for performing hybrid search on unit descriptions"""
     
-    def __init__(self, gemini_api_key: str = None):
+    def __init__(self, gemini_api_key: str = None, index_dir: str = None,
+                 collection_name: str = DEFAULT_COLLECTION, vector_backend: str = None):
         """
         Initialize Hybrid Search Service
         
         Args:
             gemini_api_key: Gemini API key for embeddings
+            index_dir: Directory of the persistent vector index
+                (default: SEARCH_INDEX_DIR env var or ./search_index)
+            collection_name: Chroma collection / NumPy file prefix holding the description variants
+            vector_backend: "chroma" or "numpy" (default: VECTOR_STORE_BACKEND env var or chroma)
         """
         self.gemini_api_key = gemini_api_key or os.getenv("GEMINI_API_KEY")
         if not self.gemini_api_key:
             raise ValueError("GEMINI_API_KEY is required for hybrid search")
         
+        self.index_dir = index_dir or os.getenv("SEARCH_INDEX_DIR", DEFAULT_INDEX_DIR)
+        self.collection_name = collection_name
+        self.vector_backend = vector_backend or os.getenv("VECTOR_STORE_BACKEND", "chroma")
+        self.vector_dtype = os.getenv("VECTOR_STORE_DTYPE", "float32")
+        
         # Initialize embeddings with correct model name
-        self.embeddings = GoogleGenerativeAIEmbeddings(
-            model="models/text-embedding-004",
-            google_api_key=self.gemini_api_key
+        # Cached so repeated queries / unchanged documents skip the Gemini round-trip
+        self.embedding_model = EMBEDDING_MODEL
+        self.embeddings = CachedEmbeddings(
+            TimedEmbeddings(GoogleGenerativeAIEmbeddings(
+                model=self.embedding_model,
+                google_api_key=self.gemini_api_key
+            )),
+            model=self.embedding_model,
+            path=os.getenv("EMBEDDING_CACHE_PATH", os.path.join(self.index_dir, "embedding_cache.sqlite")),
+            memory_entries=int(os.getenv("EMBEDDING_CACHE_MEMORY_ENTRIES", "4096")),
+            max_entries=int(os.getenv("EMBEDDING_CACHE_MAX_ENTRIES", "100000")),
+            ttl_seconds=float(os.getenv("EMBEDDING_CACHE_TTL_SECONDS", str(30 * 24 * 3600)))
+        )
+        
+        # Index builds embed in paced, retried batches instead of one huge call
+        self.bulk_embedder = BulkEmbedder(
+            self.embeddings,
+            batch_size=int(os.getenv("EMBED_BATCH_SIZE", "100")),
+            max_in_flight=int(os.getenv("EMBED_MAX_IN_FLIGHT", "4")),
+            requests_per_minute=float(os.getenv("EMBED_REQUESTS_PER_MINUTE", "1500")),
+            max_retries=int(os.getenv("EMBED_MAX_RETRIES", "6")),
+            backoff_seconds=float(os.getenv("EMBED_BACKOFF_SECONDS", "1"))
+        )
+        
+        # Latency budgets for asearch(); the semantic leg includes a Gemini round-trip
+        self.semantic_timeout = float(os.getenv("SEARCH_SEMANTIC_TIMEOUT_SECONDS", "1.5"))
+        self.keyword_timeout = float(os.getenv("SEARCH_KEYWORD_TIMEOUT_SECONDS", "0.5"))
+        # Each leg has its own threads: stuck Gemini calls can only fill the semantic pool,
+        # which rejects further work, while BM25 keeps running on its own pool
+        self._semantic_pool = BoundedExecutor(int(os.getenv("SEARCH_SEMANTIC_WORKERS", "4")), "search-semantic")
+        self._keyword_pool = ThreadPoolExecutor(
+            max_workers=int(os.getenv("SEARCH_KEYWORD_WORKERS", "2")), thread_name_prefix="search-keyword"
         )
         
         self.vectorstore = None
         self.keyword_retriever = None
         self.is_initialized = False
+        
+        # document_id() -> Document for everything indexed; BM25 is rebuilt from it
+        self._documents = {}
+        # Serializes index writers (startup build, change feed); searches never take it
+        self._update_lock = threading.Lock()
     
     def _split_descriptions(self, description_text: str) -> List[str]:
         """
@@ -66,30 +183,9 @@ class HybridSearchService:
         
         # Create documents from units
         # Split each unit's description into multiple documents for better search accuracy
-        documents = []
+        documents = {}
         for unit in units:
-            if unit.get('description'):
-                # Split descriptions (e.g., "Mô tả 1: ..., Mô tả 2: ...")
-                descriptions = self._split_descriptions(unit['description'])
-                
-                # If no split happened, use original description
-                if not descriptions:
-                    descriptions = [unit['description']]
-                
-                # Create a document for each description variant
-                for desc in descriptions:
-                    doc = Document(
-                        page_content=desc,
-                        metadata={
-                            'unit_id': unit.get('id'),
-                            'text': unit.get('text', ''),
-                            'video_url': unit.get('video_url', ''),
-                            'image_url': unit.get('image_url', ''),
-                            'transcription': unit.get('transcription', ''),
-                            'full_description': unit.get('description', '')
-                        }
-                    )
-                    documents.append(doc)
+            documents.update(self._unit_documents(unit))
         
         if not documents:
             print("Warning: No valid descriptions found in units")
@@ -97,19 +193,175 @@ class HybridSearchService:
         
         print(f"Indexing {len(documents)} description variants from {len(units)} units...")
         
-        # Create vector store for semantic search
-        self.vectorstore = Chroma.from_documents(
-            documents=documents,
-            embedding=self.embeddings
-        )
-        
-        # Create BM25 retriever for keyword search
-        self.keyword_retriever = BM25Retriever.from_documents(documents)
-        self.keyword_retriever.k = 10  # Increased to account for multiple descriptions per unit
+        with self._update_lock:
+            # Persistent vector store for semantic search: only embed what changed
+            self._sync_vectorstore(documents)
+            
+            # Create BM25 retriever for keyword search
+            self._documents = documents
+            self._rebuild_keyword_index()
         
         self.is_initialized = True
         print("✅ Hybrid search initialized successfully")
     
+    def upsert_units(self, units: List[Dict[str, Any]]):
+        """
+        Re-index only the given units (new or edited)
+        
+        Variants whose text is unchanged keep their embeddings, edited or new
+        ones are embedded, and variants the unit no longer has are removed
+        from both the vector and keyword indexes.
+        
+        Args:
+            units: Unit dictionaries, same shape as for initialize_from_units()
+        """
+        if not self.is_initialized:
+            raise ValueError("Search service not initialized. Call initialize_from_units() first.")
+        
+        unit_ids = {unit.get('id') for unit in units}
+        documents = {}
+        for unit in units:
+            documents.update(self._unit_documents(unit))
+        self._replace_units(unit_ids, documents)
+    
+    def delete_units(self, unit_ids: List[Any]):
+        """
+        Remove every description variant of the given units from both indexes
+        
+        Args:
+            unit_ids: Ids of deleted units
+        """
+        if not self.is_initialized:
+            raise ValueError("Search service not initialized. Call initialize_from_units() first.")
+        
+        self._replace_units(set(unit_ids), {})
+    
+    def _replace_units(self, unit_ids: set, documents: Dict[str, Document]):
+        """Swap the indexed variants of `unit_ids` for `documents`"""
+        with self._update_lock:
+            stored = {
+                doc_id: metadata for doc_id, metadata in self.vectorstore.metadata_by_id().items()
+                if metadata.get('unit_id') in unit_ids
+            }
+            self._sync_vectorstore(documents, stored)
+            
+            remaining = {
+                doc_id: doc for doc_id, doc in self._documents.items()
+                if doc.metadata.get('unit_id') not in unit_ids
+            }
+            remaining.update(documents)
+            self._documents = remaining
+            self._rebuild_keyword_index()
+    
+    def _unit_documents(self, unit: Dict[str, Any]) -> Dict[str, Document]:
+        """
+        One Document per description variant of a unit
+        
+        Returns:
+            Mapping of document_id() -> Document; identical variants collapse into one
+        """
+        documents = {}
+        if unit.get('description'):
+            # Split descriptions (e.g., "Mô tả 1: ..., Mô tả 2: ...")
+            descriptions = self._split_descriptions(unit['description'])
+            
+            # If no split happened, use original description
+            if not descriptions:
+                descriptions = [unit['description']]
+            
+            # Create a document for each description variant
+            for desc in descriptions:
+                doc = Document(
+                    page_content=desc,
+                    metadata={
+                        'unit_id': unit.get('id'),
+                        'text': unit.get('text', ''),
+                        'video_url': unit.get('video_url', ''),
+                        'image_url': unit.get('image_url', ''),
+                        'transcription': unit.get('transcription', ''),
+                        'full_description': unit.get('description', '')
+                    }
+                )
+                documents[document_id(self.embedding_model, unit.get('id'), desc)] = doc
+        return documents
+    
+    def _rebuild_keyword_index(self):
+        """
+        Rebuild BM25 from self._documents and swap it in
+        
+        BM25 has no incremental update, but tokenizing a few thousand short
+        descriptions takes milliseconds; nothing is re-embedded.
+        """
+        if not self._documents:
+            self.keyword_retriever = None
+            return
+        retriever = BM25Retriever.from_documents(list(self._documents.values()))
+        retriever.k = 10  # Increased to account for multiple descriptions per unit
+        self.keyword_retriever = retriever
+    
+    def _sync_vectorstore(self, documents: Dict[str, Document], stored: Dict[str, Dict[str, Any]] = None):
+        """
+        Bring the persisted vector store in line with `documents`
+        
+        New ids are embedded and added, ids no longer present are deleted,
+        and ids whose metadata changed (e.g. a new video_url) get their
+        metadata rewritten without re-embedding. New documents are written
+        batch by batch as they are embedded, so an interrupted build resumes
+        from where it stopped on the next start.
+        
+        Args:
+            documents: Mapping of document_id() -> Document
+            stored: Stored ids (with metadata) that `documents` replaces;
+                default is the whole store
+        """
+        start = time.perf_counter()
+        if self.vectorstore is None:
+            self.vectorstore = create_vector_store(
+                self.vector_backend, self.index_dir, self.collection_name,
+                embedding_function=self.embeddings, dtype=self.vector_dtype
+            )
+        
+        if stored is None:
+            stored = self.vectorstore.metadata_by_id()
+        
+        new_ids = [doc_id for doc_id in documents if doc_id not in stored]
+        stale_ids = [doc_id for doc_id in stored if doc_id not in documents]
+        # Stores drop None values, so compare against the same view
+        changed_ids = [
+            doc_id for doc_id, metadata in stored.items()
+            if doc_id in documents and metadata != clean_metadata(documents[doc_id].metadata)
+        ]
+        
+        if stale_ids:
+            self.vectorstore.delete(stale_ids)
+        if changed_ids:
+            # Metadata-only update: stored embeddings are kept
+            self.vectorstore.update_metadata(changed_ids, [documents[doc_id].metadata for doc_id in changed_ids])
+        if new_ids:
+            def store_batch(start: int, vectors: List[List[float]]):
+                batch_ids = new_ids[start:start + len(vectors)]
+                self.vectorstore.upsert(
+                    batch_ids,
+                    vectors,
+                    [documents[doc_id].page_content for doc_id in batch_ids],
+                    [documents[doc_id].metadata for doc_id in batch_ids]
+                )
+            
+            try:
+                self.bulk_embedder.embed([documents[doc_id].page_content for doc_id in new_ids], on_batch=store_batch)
+            finally:
+                # Keep finished batches even if a later one failed
+                self.vectorstore.persist()
+        elif stale_ids or changed_ids:
+            self.vectorstore.persist()
+        
+        print(
+            f"Vector index {self.index_dir} ({self.vector_backend}): {len(new_ids)} embedded, {len(stale_ids)} removed, "
+            f"{len(changed_ids)} metadata updated, "
+            f"{len(documents) - len(new_ids) - len(changed_ids)} reused "
+            f"({time.perf_counter() - start:.2f}s)"
+        )
+    
     def search(self, query: str, top_k: int = 5, weights: List[float] = None) -> List[Dict[str, Any]]:
         """
         Perform hybrid search combining semantic and keyword search
@@ -128,14 +380,99 @@ class HybridSearchService:
         if weights is None:
             weights = [0.3, 0.7]  # Equal weights for balanced results
         
+        search_start = time.perf_counter()
+        
         # Search more results to account for multiple descriptions per unit
         search_k = top_k * 3
         
-        # Perform semantic search
-        semantic_results = self.vectorstore.similarity_search(query, k=search_k)
+        semantic_results = self._semantic_leg(query, search_k)
+        keyword_results = self._keyword_leg(query, search_k)
+        
+        results = self._fuse(semantic_results, keyword_results, top_k, weights)
+        metrics.SEARCH_TOTAL.observe(time.perf_counter() - search_start)
+        return results
+    
+    async def asearch(self, query: str, top_k: int = 5, weights: List[float] = None,
+                      semantic_timeout: float = None, keyword_timeout: float = None) -> Dict[str, Any]:
+        """
+        Async hybrid search: both legs run concurrently, each on its own threads
+        
+        A leg that errors, exceeds its timeout or finds its pool busy is dropped
+        and the other leg's results are returned alone (degraded). A timed-out
+        semantic leg keeps running in its thread (holding one semantic worker),
+        so its query embedding still lands in the cache.
+        
+        Args:
+            query: Search query (description of the sign)
+            top_k: Number of results to return
+            weights: Weights for [semantic_search, keyword_search], default [0.3, 0.7]
+            semantic_timeout: Seconds allowed for the semantic leg (default SEARCH_SEMANTIC_TIMEOUT_SECONDS)
+            keyword_timeout: Seconds allowed for the keyword leg (default SEARCH_KEYWORD_TIMEOUT_SECONDS)
+        
+        Returns:
+            {'results': [...], 'degraded': bool, 'legs': {'semantic': status, 'keyword': status}}
+            where status is "ok", "timeout", "busy" or "error"
+        """
+        if not self.is_initialized:
+            raise ValueError("Search service not initialized. Call initialize_from_units() first.")
+        
+        if weights is None:
+            weights = [0.3, 0.7]
+        
+        search_start = time.perf_counter()
+        search_k = top_k * 3
+        
+        (semantic_results, semantic_status), (keyword_results, keyword_status) = await asyncio.gather(
+            self._run_leg("semantic", self._semantic_pool.run(self._semantic_leg, query, search_k),
+                          semantic_timeout if semantic_timeout is not None else self.semantic_timeout),
+            self._run_leg("keyword", self._run_keyword(query, search_k),
+                          keyword_timeout if keyword_timeout is not None else self.keyword_timeout)
+        )
+        if semantic_results is None and keyword_results is None:
+            raise RuntimeError(f"Both search legs failed (semantic: {semantic_status}, keyword: {keyword_status})")
         
-        # Perform keyword search
-        keyword_results = self.keyword_retriever.invoke(query)[:search_k]
+        results = self._fuse(semantic_results or [], keyword_results or [], top_k, weights)
+        metrics.SEARCH_TOTAL.observe(time.perf_counter() - search_start)
+        return {
+            'results': results,
+            'degraded': semantic_results is None or keyword_results is None,
+            'legs': {'semantic': semantic_status, 'keyword': keyword_status}
+        }
+    
+    async def _run_keyword(self, query: str, k: int) -> List[Document]:
+        return await asyncio.get_running_loop().run_in_executor(self._keyword_pool, self._keyword_leg, query, k)
+    
+    async def _run_leg(self, name: str, leg, timeout: float):
+        """Await one search leg (a coroutine) within its budget. Returns (documents or None, status)"""
+        try:
+            return await asyncio.wait_for(leg, timeout), "ok"
+        except asyncio.TimeoutError:
+            status = "timeout"
+        except LegBusy:
+            status = "busy"
+        except Exception as e:
+            print(f"{name.capitalize()} search failed: {e!r}")
+            status = "error"
+        metrics.SEARCH_DEGRADED.labels(name, status).inc()
+        budget = f" (budget {timeout}s)" if status == "timeout" else ""
+        print(f"{name.capitalize()} search {status}{budget}, serving the other leg only")
+        return None, status
+    
+    def _semantic_leg(self, query: str, k: int) -> List[Document]:
+        with metrics.SEARCH_SEMANTIC.time():
+            return self.vectorstore.search([self.embeddings.embed_query(query)], k)[0]
+    
+    def _keyword_leg(self, query: str, k: int) -> List[Document]:
+        retriever = self.keyword_retriever
+        if retriever is None:
+            return []
+        with metrics.SEARCH_KEYWORD.time():
+            return retriever.invoke(query)[:k]
+    
+    def _fuse(self, semantic_results: List[Document], keyword_results: List[Document],
+              top_k: int, weights: List[float]) -> List[Dict[str, Any]]:
+        """Reciprocal-rank fusion of both legs, keeping the best description per unit"""
+        fusion_start = time.perf_counter()
         
         # Combine results with ensemble scoring, grouped by unit_id
         # For each unit, keep only the BEST matching description
@@ -205,6 +542,7 @@ class HybridSearchService:
             }
             results.append(result)
         
+        metrics.SEARCH_FUSION.observe(time.perf_counter() - fusion_start)
         return results
 
 
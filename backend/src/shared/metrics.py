@@ -0,0 +1,58 @@
+"""
+Prometheus metrics for the catalog API (exposed at GET /metrics)
+
+Hot paths only call observe()/inc() on pre-labelled children; nothing is
+computed unless /metrics is scraped. The request middleware and renderer are
+in shared.http_metrics.
+"""
+
+from prometheus_client import Counter, Histogram
+
+# Seconds: sub-millisecond BM25 lookups up to slow Gemini / Supabase round-trips
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+REQUEST_LATENCY = Histogram(
+    "catalog_http_request_duration_seconds",
+    "HTTP request latency by route template",
+    ["method", "route", "status"],
+    buckets=LATENCY_BUCKETS,
+)
+
+DB_REQUEST_LATENCY = Histogram(
+    "catalog_db_request_duration_seconds",
+    "Supabase REST round-trip latency (DatabaseManager._make_request)",
+    ["table", "outcome"],
+    buckets=LATENCY_BUCKETS,
+)
+
+EMBEDDING_LATENCY = Histogram(
+    "catalog_embedding_duration_seconds",
+    "Gemini embedding call latency",
+    ["kind"],
+    buckets=LATENCY_BUCKETS,
+)
+EMBEDDING_QUERY = EMBEDDING_LATENCY.labels("query")
+EMBEDDING_DOCUMENTS = EMBEDDING_LATENCY.labels("documents")
+EMBEDDED_TEXTS = Counter("catalog_embedded_texts", "Texts sent to the Gemini embedding API", ["kind"])
+EMBEDDING_CACHE_REQUESTS = Counter(
+    "catalog_embedding_cache_requests",
+    "Embedding cache lookups by result (memory / disk hit or miss)",
+    ["kind", "result"],
+)
+
+SEARCH_LATENCY = Histogram(
+    "catalog_search_duration_seconds",
+    "HybridSearchService.search latency per leg (semantic = Chroma, keyword = BM25)",
+    ["leg"],
+    buckets=LATENCY_BUCKETS,
+)
+SEARCH_SEMANTIC = SEARCH_LATENCY.labels("semantic")
+SEARCH_KEYWORD = SEARCH_LATENCY.labels("keyword")
+SEARCH_FUSION = SEARCH_LATENCY.labels("fusion")
+SEARCH_TOTAL = SEARCH_LATENCY.labels("total")
+SEARCH_DEGRADED = Counter(
+    "catalog_search_degraded",
+    "Search legs dropped by HybridSearchService.asearch (reason: timeout / busy / error)",
+    ["leg", "reason"],
+)
+
@@ -0,0 +1,80 @@
+"""
+Tests for UnitChangeFeed polling by change column
+"""
+
+import operator
+
+from shared.database import DatabaseManager
+from shared.unit_change_feed import UnitChangeFeed
+
+# PostgREST comparison operators used by DatabaseManager filters
+OPERATORS = {"gt": operator.gt, "gte": operator.ge, "lt": operator.lt, "lte": operator.le, "eq": operator.eq}
+
+
+class FakeDatabase(DatabaseManager):
+    """DatabaseManager whose REST calls are answered from an in-memory unit table"""
+    
+    def __init__(self, rows):
+        self.rows = {row["unit_id"]: row for row in rows}
+    
+    def _make_request(self, endpoint, params=None):
+        rows = list(self.rows.values())
+        for column, value in (params or {}).items():
+            if column in ("select", "order"):
+                continue
+            op, _, bound = value.partition(".")
+            rows = [row for row in rows if OPERATORS[op](row[column], bound)]
+        if "order" in (params or {}):
+            column = params["order"].split(".")[0]
+            rows.sort(key=lambda row: row[column])
+        return [dict(row) for row in rows]
+
+
+class FakeSearchService:
+    def __init__(self):
+        self.is_initialized = False
+        self.upserted = []
+        self.deleted = []
+    
+    def initialize_from_units(self, units):
+        self.is_initialized = True
+    
+    def upsert_units(self, units):
+        self.upserted.append([unit["id"] for unit in units])
+    
+    def delete_units(self, unit_ids):
+        self.deleted.append(list(unit_ids))
+
+
+def unit(unit_id, description, updated_at):
+    return {"unit_id": unit_id, "description": description, "updated_at": updated_at}
+
+
+def test_row_committed_late_with_same_timestamp_is_picked_up():
+    db = FakeDatabase([unit(1, "a", "2026-01-01T00:00:00"), unit(2, "b", "2026-01-02T00:00:00")])
+    search = FakeSearchService()
+    feed = UnitChangeFeed(db, search, change_column="updated_at")
+    feed.poll_once()
+    
+    # Committed after the previous poll but stamped with the last timestamp it saw
+    db.rows[3] = unit(3, "c", "2026-01-02T00:00:00")
+    
+    assert feed.poll_once()["changed"] == [3]
+    assert search.upserted == [[3]]
+
+
+def test_rows_at_the_cursor_are_not_re_upserted():
+    db = FakeDatabase([unit(1, "a", "2026-01-01T00:00:00"), unit(2, "b", "2026-01-02T00:00:00")])
+    search = FakeSearchService()
+    feed = UnitChangeFeed(db, search, change_column="updated_at")
+    feed.poll_once()
+    
+    assert feed.poll_once()["changed"] == []
+    
+    db.rows[1] = unit(1, "a2", "2026-01-03T00:00:00")
+    del db.rows[2]
+    poll = feed.poll_once()
+    
+    assert (poll["changed"], poll["deleted"]) == ([1], [2])
+    assert feed.poll_once()["changed"] == []
+    assert search.upserted == [[1]]
@@ -0,0 +1,121 @@
+"""
+Tests for NumpyVectorStore: save/load round-trip, delete and top-k ordering
+"""
+
+import json
+import os
+
+import numpy as np
+import pytest
+
+pytest.importorskip("langchain_community")
+
+from shared.vector_store import NumpyVectorStore, parity_check  # noqa: E402
+
+
+def make_store(n_docs=200, dim=32, seed=0, dtype="float32", path=None):
+    """Store filled with random vectors; returns (store, ids, L2-normalized vectors)"""
+    rng = np.random.default_rng(seed)
+    vectors = rng.normal(size=(n_docs, dim)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    ids = [f"doc-{i}" for i in range(n_docs)]
+    store = NumpyVectorStore(path, dtype=dtype)
+    store.upsert(ids, vectors, [f"text {i}" for i in range(n_docs)], [{"unit_id": i // 4} for i in range(n_docs)])
+    return store, ids, vectors
+
+
+def make_queries(n_queries=20, dim=32, seed=1):
+    return np.random.default_rng(seed).normal(size=(n_queries, dim)).astype(np.float32)
+
+
+def brute_force_top_k(ids, vectors, query, k):
+    scores = vectors @ (query / np.linalg.norm(query))
+    return [ids[row] for row in np.argsort(-scores, kind="stable")[:k]]
+
+
+def test_top_k_is_sorted_by_cosine_similarity():
+    store, ids, vectors = make_store()
+    
+    for query, docs in zip(make_queries(), store.search(make_queries(), k=10)):
+        assert [doc.id for doc in docs] == brute_force_top_k(ids, vectors, query, 10)
+
+
+def test_k_larger_than_store_returns_everything_sorted():
+    store, ids, vectors = make_store(n_docs=5)
+    query = make_queries(n_queries=1)[0]
+    
+    docs = store.search([query], k=50)[0]
+    
+    assert [doc.id for doc in docs] == brute_force_top_k(ids, vectors, query, 5)
+
+
+def test_delete_removes_documents_from_results():
+    store, ids, vectors = make_store()
+    deleted = set(ids[::3])
+    
+    store.delete(list(deleted))
+    
+    kept = [row for row, doc_id in enumerate(ids) if doc_id not in deleted]
+    assert store.count() == len(kept)
+    assert deleted.isdisjoint(store.metadata_by_id())
+    for query, docs in zip(make_queries(), store.search(make_queries(), k=10)):
+        assert [doc.id for doc in docs] == brute_force_top_k([ids[r] for r in kept], vectors[kept], query, 10)
+
+
+@pytest.mark.parametrize("dtype", ["float32", "float16"])
+def test_save_load_round_trip(tmp_path, dtype):
+    path = str(tmp_path / "index" / "units")
+    store, ids, _ = make_store(dtype=dtype, path=path)
+    store.persist()
+    
+    reloaded = NumpyVectorStore(path, dtype=dtype)
+    
+    assert reloaded.count() == store.count()
+    assert reloaded.metadata_by_id() == store.metadata_by_id()
+    parity = parity_check(store, reloaded, make_queries(), k=10)
+    assert parity["recall_min"] == 1.0
+    assert parity["top1_agreement"] == 1.0
+    doc = reloaded.search([make_queries(n_queries=1)[0]], k=1)[0][0]
+    assert doc.page_content == f"text {ids.index(doc.id)}"
+
+
+def test_interrupted_save_keeps_previous_build(tmp_path):
+    path = str(tmp_path / "units")
+    store, ids, _ = make_store(n_docs=20, path=path)
+    store.persist()
+    store.delete(ids[:5])
+    
+    # Crash after the new build's matrix is written but before current is repointed
+    build = tmp_path / "units" / "builds" / "9999999999999999999-crashed"
+    build.mkdir()
+    np.save(build / "vectors.npy", np.zeros((15, 32), dtype=np.float32))
+    
+    reloaded = NumpyVectorStore(path)
+    assert reloaded.count() == 20
+    
+    store.persist()
+    assert NumpyVectorStore(path).count() == 15
+
+
+def test_loads_legacy_flat_files(tmp_path):
+    path = str(tmp_path / "units")
+    store, ids, vectors = make_store(n_docs=10)
+    np.save(f"{path}.npy", vectors)
+    with open(f"{path}.json", "w", encoding="utf-8") as f:
+        json.dump({"ids": ids, "texts": [""] * 10, "metadatas": [{}] * 10}, f)
+    
+    legacy = NumpyVectorStore(path)
+    assert legacy.count() == 10
+    
+    legacy.persist()
+    assert not os.path.exists(f"{path}.npy")
+    assert NumpyVectorStore(path).metadata_by_id() == legacy.metadata_by_id()
+
+
+def test_float16_keeps_top_k_close_to_float32():
+    reference, _, _ = make_store()
+    half, _, _ = make_store(dtype="float16")
+    
+    parity = parity_check(reference, half, make_queries(), k=10)
+    
+    assert parity["recall_mean"] >= 0.95
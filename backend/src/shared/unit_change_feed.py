@@ -0,0 +1,143 @@
+"""
+Unit change feed for the search index
+
+Polls the Supabase `unit` table and pushes only changed units into
+HybridSearchService.upsert_units / delete_units, so edits show up in search
+without a restart or a full re-embed.
+
+Two ways to detect changes:
+
+- row hash (default): fetch all units, hash each row and diff against the
+  previous poll. Needs no schema change; one REST call per poll.
+- change column (UNIT_CHANGE_COLUMN, e.g. updated_at): fetch only rows with
+  column >= last value seen, plus the id list to catch deletions. The bound
+  is inclusive so rows committed later with the same timestamp are not
+  missed; rows already seen match their stored hash and are dropped.
+"""
+
+import hashlib
+import json
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+
+def unit_hash(unit: Dict[str, Any]) -> str:
+    """Stable hash of one unit row"""
+    raw = json.dumps(unit, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class UnitChangeFeed:
+    """Background poller that keeps the search index in step with the unit table"""
+    
+    def __init__(self, db_manager, search_service, interval: float = 30.0,
+                 change_column: Optional[str] = None):
+        """
+        Args:
+            db_manager: DatabaseManager used to read units
+            search_service: HybridSearchService to update
+            interval: Seconds between polls
+            change_column: Timestamp column for incremental polling; None = row-hash diff
+        """
+        self.db_manager = db_manager
+        self.search_service = search_service
+        self.interval = interval
+        self.change_column = change_column
+        
+        self._hashes = None  # unit id -> unit_hash(); None until primed
+        self._last_seen = None  # max change_column value seen
+        self._stop = threading.Event()
+        self._thread = None
+        self.last_poll = None
+    
+    def prime(self, units: List[Dict[str, Any]]):
+        """Record the units the index was just built from, so the first poll only sees later edits"""
+        self._hashes = {unit.get('id'): unit_hash(unit) for unit in units}
+        if self.change_column:
+            seen = [unit[self.change_column] for unit in units if unit.get(self.change_column)]
+            self._last_seen = max(seen) if seen else None
+    
+    def _fetch_all(self) -> List[Dict[str, Any]]:
+        if self.change_column:
+            return self.db_manager.get_units_changed_since(self.change_column)
+        return self.db_manager.get_all_units()
+    
+    def poll_once(self) -> Dict[str, Any]:
+        """
+        Detect changed / deleted units and apply them to the search index
+        
+        Returns:
+            Summary with the changed and deleted unit ids
+        """
+        start = time.perf_counter()
+        
+        if self._hashes is None or not self.search_service.is_initialized:
+            # Nothing to diff against yet: (re)build from every unit
+            units = self._fetch_all()
+            if units:
+                self.search_service.initialize_from_units(units)
+            self.prime(units)
+            changed, deleted = [u.get('id') for u in units], []
+        else:
+            changed_units, deleted, hashes, last_seen = self._diff()
+            if deleted:
+                self.search_service.delete_units(deleted)
+            if changed_units:
+                self.search_service.upsert_units(changed_units)
+            # Only remember the new state once the index took it; a failed update is retried next poll
+            self._hashes, self._last_seen = hashes, last_seen
+            changed = [u.get('id') for u in changed_units]
+        
+        self.last_poll = {
+            "at": time.time(),
+            "seconds": time.perf_counter() - start,
+            "changed": changed,
+            "deleted": deleted,
+        }
+        if changed or deleted:
+            print(f"Unit change feed: {len(changed)} changed, {len(deleted)} deleted "
+                  f"({self.last_poll['seconds']:.2f}s)")
+        return self.last_poll
+    
+    def _diff(self):
+        """(changed units, deleted unit ids, new hashes, new last seen) since the previous poll"""
+        if self.change_column:
+            candidates = self.db_manager.get_units_changed_since(self.change_column, self._last_seen)
+            current_ids = set(self.db_manager.get_unit_ids())
+        else:
+            candidates = self.db_manager.get_all_units()
+            current_ids = {unit.get('id') for unit in candidates}
+        
+        changed = []
+        hashes = dict(self._hashes)
+        last_seen = self._last_seen
+        for unit in candidates:
+            digest = unit_hash(unit)
+            if hashes.get(unit.get('id')) != digest:
+                changed.append(unit)
+                hashes[unit.get('id')] = digest
+            if self.change_column and unit.get(self.change_column):
+                last_seen = max(last_seen or unit[self.change_column], unit[self.change_column])
+        
+        deleted = [unit_id for unit_id in hashes if unit_id not in current_ids]
+        for unit_id in deleted:
+            del hashes[unit_id]
+        return changed, deleted, hashes, last_seen
+    
+    def start(self):
+        """Poll every `interval` seconds in a daemon thread; errors are logged and retried next tick"""
+        def loop():
+            while not self._stop.wait(self.interval):
+                try:
+                    self.poll_once()
+                except Exception as e:
+                    print(f"Unit change feed poll failed: {e!r}")
+        
+        self._thread = threading.Thread(target=loop, name="unit-change-feed", daemon=True)
+        self._thread.start()
+    
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.interval + 5)
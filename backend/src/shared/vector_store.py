@@ -0,0 +1,373 @@
+"""
+Vector stores behind HybridSearchService
+
+Both backends store precomputed embeddings keyed by document_id() and answer
+batched top-k queries by vector:
+
+- ChromaVectorStore: persistent Chroma collection (SQLite + HNSW)
+- NumpyVectorStore: exact search over one contiguous L2-normalized matrix;
+  cheaper than Chroma for a few thousand vectors
+"""
+
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+from abc import ABC, abstractmethod
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+from langchain_community.vectorstores import Chroma
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+
+VECTOR_STORE_BACKENDS = ("chroma", "numpy")
+
+# Rows converted to float32 per block when scoring a float16 matrix
+# (NumPy has no BLAS path for float16 matmul). The conversion dominates query
+# time, so float16 trades latency for half the memory; batch queries to amortize it.
+_FLOAT16_BLOCK = 4096
+
+# NumpyVectorStore layout under its path prefix
+_MATRIX_FILE = "vectors.npy"
+_DOCS_FILE = "docs.json"
+_CURRENT_LINK = "current"
+_BUILDS_DIR = "builds"
+# Builds kept on disk (the current one + the previous one for rollback)
+_KEEP_BUILDS = 2
+
+
+def clean_metadata(metadata: Dict[str, Any]) -> Dict[str, Any]:
+    """Drop None values, which Chroma does not store, so both backends round-trip the same dict"""
+    return {key: value for key, value in metadata.items() if value is not None}
+
+
+class VectorStore(ABC):
+    """Embeddings + document text + metadata keyed by id, searchable by vector"""
+    
+    @abstractmethod
+    def metadata_by_id(self) -> Dict[str, Dict[str, Any]]:
+        """All stored ids with their metadata"""
+    
+    @abstractmethod
+    def upsert(self, ids: List[str], embeddings: Sequence[Sequence[float]],
+               texts: List[str], metadatas: List[Dict[str, Any]]):
+        """Insert or replace documents"""
+    
+    @abstractmethod
+    def update_metadata(self, ids: List[str], metadatas: List[Dict[str, Any]]):
+        """Replace metadata of existing documents, keeping their embeddings"""
+    
+    @abstractmethod
+    def delete(self, ids: List[str]):
+        """Remove documents; unknown ids are ignored"""
+    
+    @abstractmethod
+    def search(self, query_embeddings: Sequence[Sequence[float]], k: int) -> List[List[Document]]:
+        """
+        Top-k documents for each query vector, best first
+        
+        Returns:
+            One list per query; Document.id is the stored id
+        """
+    
+    @abstractmethod
+    def count(self) -> int:
+        """Number of stored documents"""
+    
+    def persist(self):
+        """Flush to disk (no-op for stores that write through)"""
+
+
+class ChromaVectorStore(VectorStore):
+    """Persistent Chroma collection, written through on every call"""
+    
+    def __init__(self, persist_directory: str, collection_name: str, embedding_function: Embeddings = None):
+        self.vectorstore = Chroma(
+            collection_name=collection_name,
+            embedding_function=embedding_function,
+            persist_directory=persist_directory
+        )
+        self._collection = self.vectorstore._collection
+    
+    def metadata_by_id(self) -> Dict[str, Dict[str, Any]]:
+        existing = self._collection.get(include=["metadatas"])
+        return dict(zip(existing["ids"], existing["metadatas"]))
+    
+    def upsert(self, ids, embeddings, texts, metadatas):
+        self._collection.upsert(
+            ids=ids,
+            embeddings=[list(map(float, vector)) for vector in embeddings],
+            documents=texts,
+            metadatas=[clean_metadata(metadata) for metadata in metadatas]
+        )
+    
+    def update_metadata(self, ids, metadatas):
+        self._collection.update(ids=ids, metadatas=[clean_metadata(metadata) for metadata in metadatas])
+    
+    def delete(self, ids):
+        if ids:
+            self._collection.delete(ids=ids)
+    
+    def search(self, query_embeddings, k):
+        queries = np.atleast_2d(np.asarray(query_embeddings, dtype=np.float32))
+        if k <= 0 or not self._collection.count():
+            return [[] for _ in queries]
+        results = self._collection.query(
+            query_embeddings=queries.tolist(),
+            n_results=k,
+            include=["documents", "metadatas"]
+        )
+        return [
+            [
+                Document(page_content=text, metadata=metadata or {}, id=doc_id)
+                for doc_id, text, metadata in zip(ids, texts, metadatas)
+            ]
+            for ids, texts, metadatas in zip(results["ids"], results["documents"], results["metadatas"])
+        ]
+    
+    def count(self) -> int:
+        return self._collection.count()
+
+
+class NumpyVectorStore(VectorStore):
+    """
+    Exact cosine search over an in-process (n, d) matrix
+    
+    Rows are L2-normalized, so one matrix product scores every document and
+    argpartition picks the top k without sorting all n. Writers build a new
+    state tuple and swap it in with one assignment, so concurrent searches
+    never see a half-applied update.
+    
+    Files: each save writes a new <path>/builds/<id>/ holding vectors.npy
+    (loaded as a read-only memmap) and docs.json (ids, texts, metadata), then
+    repoints the <path>/current symlink with one rename, so a crash mid-save
+    never pairs the matrix of one save with the ids of another. A legacy flat
+    <path>.npy + <path>.json pair is still loaded.
+    """
+    
+    def __init__(self, path: Optional[str] = None, dtype: str = "float32"):
+        """
+        Args:
+            path: File prefix for save/load; None keeps the store in memory only
+            dtype: "float32" or "float16" (half the memory, scored in float32 blocks)
+        """
+        self.path = path
+        self.dtype = np.dtype(dtype)
+        if self.dtype not in (np.float32, np.float16):
+            raise ValueError(f"Unsupported vector dtype: {dtype}")
+        
+        self._lock = threading.Lock()
+        # (ids, matrix, texts, metadatas, {id: row})
+        self._state = ([], np.zeros((0, 0), dtype=self.dtype), [], [], {})
+        if path and self._files(path) is not None:
+            self.load()
+    
+    @staticmethod
+    def _normalize(vectors) -> np.ndarray:
+        vectors = np.atleast_2d(np.asarray(vectors, dtype=np.float32))
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.maximum(norms, 1e-12)
+    
+    def metadata_by_id(self) -> Dict[str, Dict[str, Any]]:
+        ids, _, _, metadatas, _ = self._state
+        return dict(zip(ids, metadatas))
+    
+    def upsert(self, ids, embeddings, texts, metadatas):
+        if not ids:
+            return
+        vectors = self._normalize(embeddings).astype(self.dtype)
+        with self._lock:
+            old_ids, matrix, old_texts, old_metadatas, index = self._state
+            if old_ids and vectors.shape[1] != matrix.shape[1]:
+                raise ValueError(f"Embedding dimension {vectors.shape[1]} != stored {matrix.shape[1]}")
+            
+            new_ids, new_texts, new_metadatas = list(old_ids), list(old_texts), list(old_metadatas)
+            new_index = dict(index)
+            replaced, appended = [], []
+            for j, doc_id in enumerate(ids):
+                row = new_index.get(doc_id)
+                if row is None:
+                    row = new_index[doc_id] = len(new_ids)
+                    new_ids.append(doc_id)
+                    new_texts.append(texts[j])
+                    new_metadatas.append(clean_metadata(metadatas[j]))
+                    appended.append(j)
+                else:
+                    new_texts[row] = texts[j]
+                    new_metadatas[row] = clean_metadata(metadatas[j])
+                    replaced.append((row, j))
+            
+            # vstack copies: the previous matrix (possibly a read-only memmap) stays untouched for readers
+            new_matrix = np.vstack([matrix, vectors[appended]]) if old_ids else vectors[appended]
+            for row, j in replaced:
+                new_matrix[row] = vectors[j]
+            self._state = (new_ids, np.ascontiguousarray(new_matrix), new_texts, new_metadatas, new_index)
+    
+    def update_metadata(self, ids, metadatas):
+        with self._lock:
+            old_ids, matrix, texts, old_metadatas, index = self._state
+            new_metadatas = list(old_metadatas)
+            for doc_id, metadata in zip(ids, metadatas):
+                if doc_id in index:
+                    new_metadatas[index[doc_id]] = clean_metadata(metadata)
+            self._state = (old_ids, matrix, texts, new_metadatas, index)
+    
+    def delete(self, ids):
+        with self._lock:
+            old_ids, matrix, texts, metadatas, index = self._state
+            drop = {index[doc_id] for doc_id in ids if doc_id in index}
+            if not drop:
+                return
+            keep = [row for row in range(len(old_ids)) if row not in drop]
+            new_ids = [old_ids[row] for row in keep]
+            self._state = (
+                new_ids,
+                np.ascontiguousarray(matrix[keep]),
+                [texts[row] for row in keep],
+                [metadatas[row] for row in keep],
+                {doc_id: row for row, doc_id in enumerate(new_ids)}
+            )
+    
+    def _scores(self, matrix: np.ndarray, queries: np.ndarray) -> np.ndarray:
+        """Cosine similarity (b, n) of normalized queries against every row"""
+        if matrix.dtype == np.float32:
+            return queries @ matrix.T
+        return np.concatenate([
+            queries @ matrix[start:start + _FLOAT16_BLOCK].astype(np.float32).T
+            for start in range(0, len(matrix), _FLOAT16_BLOCK)
+        ], axis=1)
+    
+    def search(self, query_embeddings, k):
+        ids, matrix, texts, metadatas, _ = self._state
+        queries = self._normalize(query_embeddings)
+        k = min(k, len(ids))
+        if k <= 0:
+            return [[] for _ in queries]
+        
+        scores = self._scores(matrix, queries)
+        if k < len(ids):
+            top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        else:
+            top = np.broadcast_to(np.arange(len(ids)), scores.shape)
+        # Only the k winners get sorted
+        order = np.argsort(-np.take_along_axis(scores, top, axis=1), axis=1)
+        top = np.take_along_axis(top, order, axis=1)
+        return [
+            [Document(page_content=texts[row], metadata=metadatas[row], id=ids[row]) for row in rows]
+            for rows in top.tolist()
+        ]
+    
+    def count(self) -> int:
+        return len(self._state[0])
+    
+    def persist(self):
+        if self.path:
+            self.save(self.path)
+    
+    @staticmethod
+    def _files(path: str) -> Optional[tuple]:
+        """
+        Returns:
+            (matrix file, docs file) of the current build, the legacy flat
+            pair, or None when nothing has been saved under path
+        """
+        current = os.path.join(path, _CURRENT_LINK)
+        if os.path.exists(current):
+            build = os.path.realpath(current)
+            return os.path.join(build, _MATRIX_FILE), os.path.join(build, _DOCS_FILE)
+        if os.path.exists(f"{path}.npy"):
+            return f"{path}.npy", f"{path}.json"
+        return None
+    
+    def save(self, path: str):
+        """Write a new build directory and repoint <path>/current to it (atomic rename)"""
+        ids, matrix, texts, metadatas, _ = self._state
+        builds = os.path.join(path, _BUILDS_DIR)
+        os.makedirs(builds, exist_ok=True)
+        
+        # Nothing reads the new build until the symlink points at it
+        build = tempfile.mkdtemp(prefix=f"{time.time_ns()}-", dir=builds)
+        with open(os.path.join(build, _MATRIX_FILE), "wb") as f:
+            np.save(f, np.ascontiguousarray(matrix))
+        with open(os.path.join(build, _DOCS_FILE), "w", encoding="utf-8") as f:
+            json.dump({"dtype": self.dtype.name, "ids": ids, "texts": texts, "metadatas": metadatas}, f, ensure_ascii=False)
+        
+        tmp_link = os.path.join(path, _CURRENT_LINK + ".tmp")
+        if os.path.lexists(tmp_link):
+            os.unlink(tmp_link)
+        os.symlink(os.path.join(_BUILDS_DIR, os.path.basename(build)), tmp_link, target_is_directory=True)
+        os.replace(tmp_link, os.path.join(path, _CURRENT_LINK))
+        
+        # The legacy flat pair is no longer read; stores still memory-mapping an
+        # old build keep reading its unlinked files
+        for legacy in (f"{path}.npy", f"{path}.json"):
+            if os.path.exists(legacy):
+                os.unlink(legacy)
+        old_builds = sorted(name for name in os.listdir(builds) if name != os.path.basename(build))
+        for name in old_builds[:len(old_builds) + 1 - _KEEP_BUILDS]:
+            shutil.rmtree(os.path.join(builds, name), ignore_errors=True)
+    
+    def load(self, path: Optional[str] = None):
+        """Load a saved store; the matrix is memory-mapped read-only"""
+        path = path or self.path
+        files = self._files(path)
+        if files is None:
+            raise FileNotFoundError(f"No saved vector store under {path}")
+        matrix_file, docs_file = files
+        with open(docs_file, encoding="utf-8") as f:
+            data = json.load(f)
+        matrix = np.load(matrix_file, mmap_mode="r")
+        if matrix.dtype != self.dtype:
+            matrix = matrix.astype(self.dtype)
+        ids = data["ids"]
+        if len(ids) != len(matrix):
+            raise ValueError(f"{path}: {len(ids)} ids for {len(matrix)} vectors")
+        with self._lock:
+            self._state = (ids, matrix, data["texts"], data["metadatas"], {doc_id: row for row, doc_id in enumerate(ids)})
+
+
+def create_vector_store(backend: str, index_dir: str, collection_name: str,
+                        embedding_function: Embeddings = None, dtype: str = "float32") -> VectorStore:
+    """
+    Args:
+        backend: "chroma" or "numpy"
+        index_dir: Directory holding the persisted index
+        collection_name: Chroma collection / NumPy file prefix
+        embedding_function: Passed to Chroma (unused by the NumPy backend)
+        dtype: NumPy matrix dtype
+    """
+    if backend == "chroma":
+        return ChromaVectorStore(index_dir, collection_name, embedding_function)
+    if backend == "numpy":
+        return NumpyVectorStore(os.path.join(index_dir, collection_name), dtype=dtype)
+    raise ValueError(f"Unknown vector store backend {backend!r}, expected one of {VECTOR_STORE_BACKENDS}")
+
+
+def parity_check(reference: VectorStore, candidate: VectorStore,
+                 query_embeddings: Sequence[Sequence[float]], k: int = 10) -> Dict[str, Any]:
+    """
+    Compare top-k ids of two stores holding the same vectors
+    
+    Returns:
+        Recall of the reference top-k in the candidate top-k (mean / min over
+        queries) and how often both agree on the top-1 id
+    """
+    expected = reference.search(query_embeddings, k)
+    actual = candidate.search(query_embeddings, k)
+    recalls, top1 = [], []
+    for want, got in zip(expected, actual):
+        want_ids = [doc.id for doc in want]
+        got_ids = {doc.id for doc in got}
+        if want_ids:
+            recalls.append(len(got_ids.intersection(want_ids)) / len(want_ids))
+            top1.append(bool(got) and got[0].id == want_ids[0])
+    return {
+        "queries": len(recalls),
+        "k": k,
+        "recall_mean": float(np.mean(recalls)) if recalls else 1.0,
+        "recall_min": float(np.min(recalls)) if recalls else 1.0,
+        "top1_agreement": float(np.mean(top1)) if top1 else 1.0,
+    }